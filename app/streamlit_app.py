@@ -6,6 +6,7 @@ from pathlib import Path
 import duckdb
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 
 # Ensure source packages are importable in all environments:
@@ -21,21 +22,15 @@ else:
     if str(_SRC_DIR) not in sys.path:
         sys.path.insert(0, str(_SRC_DIR))
 
-from faers_signal import _resources
+from faers_signal import _resources, generation, signal_store
+from faers_signal.abcd_query import prepare_abcd
 from faers_signal.metrics import (
-    ABCD,
     benjamini_hochberg_fdr,
     chi_square_p_value,
-    prr,
-    chi_square_1df,
-    ror,
-    ror_ci95,
-    ic_simple,
-    ic_simple_ci95,
-    signal_flags,
-    classify_signal,
+    compute_metrics_frame,
 )
 from faers_signal.analysis_spec import AnalysisSpec, Manifest
+from faers_signal.result_cache import ResultCache
 
 
 st.set_page_config(page_title="FAERS Mini Signal", layout="wide")
@@ -52,6 +47,11 @@ if not default_db.exists():
 db_path = Path(os.environ.get("FAERS_DB", str(default_db)))
 db_path.parent.mkdir(parents=True, exist_ok=True)
 
+# Shared with `build --cache` (same default location next to the DB)
+result_cache = ResultCache(
+    Path(os.environ.get("FAERS_RESULT_CACHE", str(db_path.parent / "result_cache")))
+)
+
 # ── Sidebar: Filters ─────────────────────────────────────────────
 st.sidebar.header("フィルタ")
 st.sidebar.caption(f"DB: `{db_path.name}`")
@@ -109,8 +109,9 @@ with dl_col1:
     dl_since = st.date_input("開始日", value=date(2023, 1, 1), key="dl_since")
 with dl_col2:
     dl_until = st.date_input("終了日", value=date.today(), key="dl_until")
-dl_max = st.sidebar.number_input("最大取得件数", min_value=100, max_value=26000,
-                                  value=5000, step=1000)
+dl_max = st.sidebar.number_input("最大取得件数", min_value=100, max_value=1_000_000,
+                                  value=5000, step=1000,
+                                  help="26,000件を超える場合は受付日で期間分割して取得")
 
 if st.sidebar.button("🔄 openFDA から取得", use_container_width=True):
     with st.spinner("openFDA API からデータを取得中..."):
@@ -136,6 +137,7 @@ if st.sidebar.button("🔄 openFDA から取得", use_container_width=True):
                 until=dl_until.strftime("%Y-%m-%d") if dl_until else None,
                 max_records=dl_max,
                 progress_callback=_on_progress,
+                cache_dir=db_path.parent / "openfda_cache",
             )
             dl_con.close()
             progress_bar.progress(1.0)
@@ -157,11 +159,36 @@ if report_count == 0:
     con.close()
     st.stop()
 
-sql = _resources.get_sql("abcd.sql")
-if not suspect_only:
-    sql = sql.replace("FROM drugs WHERE role = 1", "FROM drugs WHERE role in (1,2,3)")
+# Analysis settings; also recorded in the manifest below
+_spec = AnalysisSpec(
+    suspect_only=suspect_only,
+    min_a=int(min_a),
+    drug_filter=drug_filter or None,
+    pt_filter=pt_filter or None,
+    drug_normalization="rxnorm_ingredient",
+    signal_mode=signal_mode,
+    ranking_criterion=ranking_criterion,
+    top_n=int(top_n),
+)
 
-df = con.execute(sql).fetch_df()
+# Signal-only toggle from the previous run (the checkbox is drawn further down)
+signal_only = bool(st.session_state.get("signal_only", False))
+
+# Results stored by `build --store` for this spec and the current data are
+# filtered and ranked in SQL; then the result cache is tried, and only then
+# are A/B/C/D and the metrics computed
+use_store = signal_store.is_fresh(con, _spec)
+data_fingerprint = generation.fingerprint(con)
+cached = None if use_store else result_cache.get(_spec, data_fingerprint)
+if use_store:
+    stored_sql, stored_params = signal_store.select(_spec, signal_only=signal_only)
+    df = con.execute(stored_sql, stored_params).fetch_df()
+elif cached is not None:
+    df = pd.read_parquet(cached)
+else:
+    # A/B/C/D with role/prefix/min_a filters pushed into the query (cube-backed)
+    abcd_sql, abcd_params = prepare_abcd(con, _spec)
+    df = con.execute(abcd_sql, abcd_params).fetch_df()
 
 # Show DB stats
 drug_count = con.execute("SELECT COUNT(DISTINCT drug_name) FROM drugs").fetchone()[0]
@@ -172,46 +199,43 @@ col1.metric("レポート数", f"{report_count:,}")
 col2.metric("薬剤数", f"{drug_count:,}")
 col3.metric("副作用PT数", f"{pt_count:,}")
 
-if not df.empty:
-    if drug_filter:
-        df = df[df["drug"].str.startswith(drug_filter.lower())]
-    if pt_filter:
-        df = df[df["pt"].str.startswith(pt_filter.lower())]
+# Display names and rounding for the UI table
+_UI_COLUMNS = {
+    "PRR": ("PRR", 2),
+    "Chi2_1df": ("Chi2", 2),
+    "ROR": ("ROR", 2),
+    "ROR_CI_L": ("ROR_lo", 2),
+    "ROR_CI_U": ("ROR_hi", 2),
+    "IC": ("IC", 3),
+    "IC_CI_L": ("IC_lo", 3),
+    "IC_CI_U": ("IC_hi", 3),
+}
 
 if not df.empty:
-    def _metrics_row(row: pd.Series):
-        ab = ABCD(int(row.A), int(row.B), int(row.C), int(row.D), int(row.total_reports))
-        prr_v = prr(ab)
-        chi = chi_square_1df(ab)
-        ror_v = ror(ab)
-        ror_l, ror_u = ror_ci95(ab)
-        ic_v = ic_simple(ab)
-        ic_l, ic_u = ic_simple_ci95(ab)
-
-        # Signal detection with explicit flags
-        flags = signal_flags(ab, min_a=int(min_a))
-        is_signal = classify_signal(flags, mode=signal_mode)
-
-        return pd.Series(
-            {
-                "PRR": round(prr_v, 2) if not np.isnan(prr_v) else np.nan,
-                "Chi2": round(chi, 2) if not np.isnan(chi) else np.nan,
-                "ROR": round(ror_v, 2) if not np.isnan(ror_v) else np.nan,
-                "ROR_lo": round(ror_l, 2) if not np.isnan(ror_l) else np.nan,
-                "ROR_hi": round(ror_u, 2) if not np.isnan(ror_u) else np.nan,
-                "IC": round(ic_v, 3) if not np.isnan(ic_v) else np.nan,
-                "IC_lo": round(ic_l, 3) if not np.isnan(ic_l) else np.nan,
-                "IC_hi": round(ic_u, 3) if not np.isnan(ic_u) else np.nan,
-                "flag_evans": flags["flag_evans"],
-                "flag_ror025": flags["flag_ror025"],
-                "flag_ic025": flags["flag_ic025"],
-                "Signal": "⚠️" if is_signal else "",
-            }
+    if use_store or cached is not None:
+        metrics_df = df[list(signal_store.METRIC_COLUMNS)].copy()
+        df = df[list(signal_store.ABCD_COLUMNS)]
+    else:
+        df = df[df["A"] >= min_a].reset_index(drop=True)
+        metrics_df = compute_metrics_frame(
+            df["A"].to_numpy(),
+            df["B"].to_numpy(),
+            df["C"].to_numpy(),
+            df["D"].to_numpy(),
+            df["total_reports"].to_numpy(),
+            min_a=int(min_a),
+            mode=signal_mode,
         )
-
-    metrics_df = df.apply(_metrics_row, axis=1)
-    mdf = pd.concat([df.reset_index(drop=True), metrics_df.reset_index(drop=True)], axis=1)
-    mdf = mdf[mdf["A"] >= min_a]
+        result_cache.put(
+            _spec,
+            data_fingerprint,
+            pa.Table.from_pandas(pd.concat([df, metrics_df], axis=1), preserve_index=False),
+        )
+    for src, (_, ndigits) in _UI_COLUMNS.items():
+        metrics_df[src] = metrics_df[src].round(ndigits)
+    metrics_df = metrics_df.rename(columns={src: dst for src, (dst, _) in _UI_COLUMNS.items()})
+    metrics_df["Signal"] = np.where(metrics_df["Signal"], "⚠️", "")
+    mdf = pd.concat([df, metrics_df], axis=1)
 else:
     mdf = df
 
@@ -231,6 +255,10 @@ def _compute_rank_score(mdf: pd.DataFrame, criterion: str) -> pd.DataFrame:
 
 if not mdf.empty and "IC_lo" in mdf.columns:
     mdf = _compute_rank_score(mdf, ranking_criterion)
+    if not use_store:  # stored rows arrive ranked
+        mdf = mdf.sort_values(
+            ["_rank_score", "A", "drug", "pt"], ascending=[False, False, True, True]
+        ).reset_index(drop=True)
 
 # ── Signal filter toggle ─────────────────────────────────────────
 st.subheader("シグナル検出結果")
@@ -240,11 +268,14 @@ st.caption(
     f"判定モード: **{signal_mode_label}** | "
     f"ランキング: **{ranking_label}** | "
     f"TopN: **{top_n}**"
+    + (" | 事前計算結果 (`build --store`)" if use_store else "")
+    + (" | キャッシュ" if cached is not None else "")
 )
 
-if not mdf.empty and "Signal" in mdf.columns:
-    signal_only = st.checkbox("⚠️ シグナル検出のみ表示", value=False)
-    if signal_only:
+# Keep the toggle when a stored signal-only query returned nothing, so it can be cleared
+if signal_only or (not mdf.empty and "Signal" in mdf.columns):
+    signal_only = st.checkbox("⚠️ シグナル検出のみ表示", value=False, key="signal_only")
+    if signal_only and not use_store:
         mdf = mdf[mdf["Signal"] == "⚠️"]
 
     sig_count = (mdf["Signal"] == "⚠️").sum()
@@ -278,16 +309,6 @@ else:
     csv = b""
 
 # Build manifest
-_spec = AnalysisSpec(
-    suspect_only=suspect_only,
-    min_a=int(min_a),
-    drug_filter=drug_filter or None,
-    pt_filter=pt_filter or None,
-    drug_normalization="rxnorm_ingredient",
-    signal_mode=signal_mode,
-    ranking_criterion=ranking_criterion,
-    top_n=int(top_n),
-)
 _manifest = Manifest(spec=_spec)
 _manifest.populate_env()
 _manifest.populate_db_stats(con)
@@ -337,6 +358,8 @@ if not mdf.empty and "PRR" in mdf.columns:
         # ── TopN selection using unified ranking ──
         def _get_top_items(vdf: pd.DataFrame, col: str, n: int) -> list:
             """Get top-N unique items from *col* based on _rank_score."""
+            if use_store:
+                return signal_store.top_items(con, _spec, col, n, signal_only=signal_only)
             ranked = vdf.groupby(col)["_rank_score"].max().nlargest(n)
             return ranked.index.tolist()
 
@@ -64,6 +64,8 @@ a = Analysis(
         # SQL files used by faers_signal
         (str(SRC / "schema.sql"), "faers_signal"),
         (str(SRC / "abcd.sql"), "faers_signal"),
+        (str(SRC / "encode_dims.sql"), "faers_signal"),
+        (str(SRC / "rxnorm_index.sql"), "faers_signal"),
         # Python source of faers_signal package (needed for Streamlit subprocess)
         (str(SRC), "faers_signal"),
         # Streamlit app script
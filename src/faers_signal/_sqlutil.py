@@ -0,0 +1,30 @@
+"""Small DuckDB helpers shared by the ingest and aggregation modules."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+import duckdb
+import pandas as pd
+
+
+def sql_path(path: Path) -> str:
+    """*path* for a single-quoted SQL string literal (``'`` doubled)."""
+    return Path(path).as_posix().replace("'", "''")
+
+
+def temp_id_table(con: duckdb.DuckDBPyConnection, name: str, report_ids: Iterable[str]) -> int:
+    """Materialize distinct report IDs as ``TEMP TABLE name(safetyreportid)``.
+
+    Returns the number of distinct IDs.
+    """
+    ids = pd.DataFrame(
+        {"safetyreportid": pd.unique(pd.Series(list(report_ids), dtype=object))}
+    )
+    view = f"{name}_df"
+    con.register(view, ids)
+    try:
+        con.execute(f"CREATE OR REPLACE TEMP TABLE {name} AS SELECT * FROM {view}")
+    finally:
+        con.unregister(view)
+    return len(ids)
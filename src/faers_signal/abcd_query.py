@@ -0,0 +1,317 @@
+"""Parameterized ABCD query builder.
+
+``build_abcd_query`` turns an ``AnalysisSpec`` into a single prepared
+statement plus its parameters.  Every population filter is pushed into the
+scans instead of being applied to the finished table:
+
+  role set        – restricts the drug scan (``role IN (...)``)
+  since / until   – restricts reports, and through them drugs/reactions and N
+  drug prefix     – restricts the drug scan, so only that drug's reports are
+                    joined with reactions
+  PT prefix       – restricts the reaction scan
+  min_a           – applied in the A-count aggregation (``HAVING``)
+
+Marginals are only computed for the drugs/PTs that survive into the A counts.
+Prefix filters never change B/C/D: drug and PT totals are per-key, so a
+filtered row has exactly the values it has in the unfiltered table.
+
+When no date window is requested and the role set matches a cube scope, the
+same result is served from the persistent cube (see ``cube``).  With
+``lake_root`` the same query runs over the Parquet files of ``lake.export``
+instead of the database tables.
+
+Output columns are those of ``abcd.sql``: drug, pt, A, B, C, D,
+drug_reports, pt_reports, total_reports.
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Any, Optional
+
+import duckdb
+
+from . import cube
+from .analysis_spec import AnalysisSpec
+
+
+def _cube_scope(spec: AnalysisSpec) -> str | None:
+    roles = spec.roles()
+    for scope, scope_roles in cube.SCOPES.items():
+        if roles == scope_roles:
+            return scope
+    return None
+
+
+def cube_eligible(spec: AnalysisSpec) -> bool:
+    """Whether *spec* can be answered from the cube (no date window, known role set)."""
+    return not spec.since and not spec.until and _cube_scope(spec) is not None
+
+
+def _prefix_params(spec: AnalysisSpec, params: dict[str, Any]) -> tuple[str, str]:
+    """Register drug/PT prefix parameters; return the drug and PT conditions."""
+    drug_cond = pt_cond = ""
+    if spec.drug_filter:
+        params["drug_prefix"] = spec.drug_filter.strip().lower()
+        drug_cond = "starts_with(drug, $drug_prefix)"
+    if spec.pt_filter:
+        params["pt_prefix"] = spec.pt_filter.strip().lower()
+        pt_cond = "starts_with(pt, $pt_prefix)"
+    return drug_cond, pt_cond
+
+
+def _cube_query(spec: AnalysisSpec) -> tuple[str, dict[str, Any]]:
+    params: dict[str, Any] = {"min_a": int(spec.min_a)}
+    drug_cond, pt_cond = _prefix_params(spec, params)
+    conds = ["A >= $min_a"] + [c for c in (drug_cond, pt_cond) if c]
+    sql = (
+        f"SELECT * FROM ({cube.abcd_select(_cube_scope(spec) or 'suspect')}) abcd\n"
+        f"WHERE {' AND '.join(conds)}"
+    )
+    return sql, params
+
+
+# Database relations with the columns of the lake files: report and reaction
+# keys are kept in side tables (see dims)
+_DB_RELATIONS = {
+    "reports": "(SELECT * FROM reports JOIN report_keys USING (safetyreportid))",
+    "drugs": "drugs",
+    "reactions": "reaction_keys",
+    "drug_dim": "drug_dim",
+    "pt_dim": "pt_dim",
+}
+
+
+def _scans(
+    spec: AnalysisSpec, lake_root: Optional[Path], params: dict[str, Any]
+) -> dict[str, Any]:
+    """Relations and scan filters shared by the facts and marginals queries."""
+    t = dict(_DB_RELATIONS)
+    part = ""
+    if lake_root is not None:
+        from . import lake
+
+        t.update(lake.relations(lake_root))
+        bounds = lake.period_bounds(spec.since, spec.until)
+        params.update(bounds)
+        part = lake.period_condition(bounds)
+
+    date_conds = []
+    if spec.since:
+        params["since"] = spec.since
+        date_conds.append("(receivedate IS NULL OR receivedate >= $since::DATE)")
+    if spec.until:
+        params["until"] = spec.until
+        date_conds.append("(receivedate IS NULL OR receivedate <= $until::DATE)")
+    rep_conds = date_conds + ([part] if part else [])
+    rep_where = f"WHERE {' AND '.join(rep_conds)}" if rep_conds else ""
+
+    drug_cond, pt_cond = _prefix_params(spec, params)
+    return {
+        "t": t,
+        "rep": f"rep AS (\n  SELECT report_key FROM {t['reports']} {rep_where}\n)",
+        "in_window": "AND report_key IN (SELECT report_key FROM rep)" if date_conds else "",
+        # Lake scans also filter on the partition columns, so whole files are skipped
+        "in_part": f"AND {part}" if part else "",
+        "drug_sel": (
+            f"AND drug_id IN (SELECT drug_id FROM {t['drug_dim']} WHERE {drug_cond})"
+            if drug_cond
+            else ""
+        ),
+        "pt_sel": (
+            f"AND pt_id IN (SELECT pt_id FROM {t['pt_dim']} WHERE {pt_cond})" if pt_cond else ""
+        ),
+    }
+
+
+def _facts_query(
+    spec: AnalysisSpec,
+    lake_root: Optional[Path] = None,
+    bucket: Optional[tuple[int, int]] = None,
+    shared_marginals: bool = False,
+) -> tuple[str, dict[str, Any]]:
+    params: dict[str, Any] = {"min_a": int(spec.min_a)}
+    roles = ", ".join(str(r) for r in spec.roles())
+    sc = _scans(spec, lake_root, params)
+    t, in_window, in_part = sc["t"], sc["in_window"], sc["in_part"]
+    in_bucket = ""
+    if bucket is not None:
+        params["bucket"], params["n_buckets"] = bucket
+        in_bucket = "AND hash(drug_id) % $n_buckets::UBIGINT = $bucket::UBIGINT"
+
+    if shared_marginals:
+        # Materialized once for all buckets by prepare_partitioned
+        pt_tot = f"SELECT pt_id, Rtot FROM {_PT_TOT}"
+        rep_tot = f"SELECT N FROM {_REP_TOT}"
+    else:
+        pt_tot = f"""SELECT pt_id, COUNT(DISTINCT report_key) AS Rtot
+  FROM {t['reactions']}
+  WHERE pt_id IN (SELECT pt_id FROM a_counts) {in_part} {in_window}
+  GROUP BY 1"""
+        rep_tot = "SELECT COUNT(*) AS N FROM rep"
+
+    sql = f"""
+WITH
+{sc['rep']},
+suspect AS (
+  SELECT DISTINCT report_key, drug_id
+  FROM {t['drugs']}
+  WHERE role IN ({roles}) AND drug_id IS NOT NULL {sc['drug_sel']} {in_bucket} {in_part} {in_window}
+),
+rxn AS (
+  SELECT DISTINCT report_key, pt_id
+  FROM {t['reactions']}
+  WHERE pt_id IS NOT NULL {sc['pt_sel']} {in_part}
+    AND report_key IN (SELECT report_key FROM suspect)
+),
+a_counts AS (
+  SELECT s.drug_id, r.pt_id, COUNT(*) AS A
+  FROM suspect s
+  JOIN rxn r USING (report_key)
+  GROUP BY s.drug_id, r.pt_id
+  HAVING COUNT(*) >= $min_a
+),
+drug_tot AS (
+  SELECT drug_id, COUNT(*) AS Dtot
+  FROM suspect
+  WHERE drug_id IN (SELECT drug_id FROM a_counts)
+  GROUP BY 1
+),
+pt_tot AS (
+  {pt_tot}
+),
+rep_tot AS (
+  {rep_tot}
+)
+SELECT
+  dd.drug                                                AS drug,
+  pd.pt                                                  AS pt,
+  a.A                                                    AS A,
+  (d.Dtot - a.A)                                         AS B,
+  (r.Rtot - a.A)                                         AS C,
+  (rep_tot.N - d.Dtot - r.Rtot + a.A)                    AS D,
+  d.Dtot                                                 AS drug_reports,
+  r.Rtot                                                 AS pt_reports,
+  rep_tot.N                                              AS total_reports
+FROM a_counts a
+JOIN drug_tot d USING (drug_id)
+JOIN pt_tot r USING (pt_id)
+CROSS JOIN rep_tot
+JOIN {t['drug_dim']} dd ON dd.drug_id = a.drug_id
+JOIN {t['pt_dim']} pd ON pd.pt_id = a.pt_id
+"""
+    return sql, params
+
+
+def _used(params: dict[str, Any], sql: str) -> dict[str, Any]:
+    # Prepared statements reject parameters they do not reference
+    return {k: v for k, v in params.items() if re.search(rf"\${k}\b", sql)}
+
+
+_PT_TOT = "_abcd_pt_tot"
+_REP_TOT = "_abcd_rep_tot"
+
+
+def _materialize_marginals(
+    con: duckdb.DuckDBPyConnection, spec: AnalysisSpec, lake_root: Optional[Path]
+) -> None:
+    params: dict[str, Any] = {}
+    sc = _scans(spec, lake_root, params)
+    statements = [
+        f"CREATE OR REPLACE TEMP TABLE {_PT_TOT} AS WITH {sc['rep']} "
+        "SELECT pt_id, COUNT(DISTINCT report_key) AS Rtot "
+        f"FROM {sc['t']['reactions']} "
+        f"WHERE pt_id IS NOT NULL {sc['pt_sel']} {sc['in_part']} {sc['in_window']} GROUP BY 1",
+        f"CREATE OR REPLACE TEMP TABLE {_REP_TOT} AS WITH {sc['rep']} "
+        "SELECT COUNT(*) AS N FROM rep",
+    ]
+    for sql in statements:
+        con.execute(sql, _used(params, sql))
+
+
+def build_abcd_query(
+    spec: AnalysisSpec,
+    *,
+    use_cube: bool = False,
+    lake_root: Optional[Path] = None,
+    bucket: Optional[tuple[int, int]] = None,
+) -> tuple[str, dict[str, Any]]:
+    """Return ``(sql, params)`` computing the ABCD table for *spec*.
+
+    Args:
+        spec: Analysis settings (role set, since/until, drug/PT prefixes, min_a).
+        use_cube: Read from the persistent cube; only valid when
+            ``cube_eligible(spec)`` is true.
+        lake_root: Scan a Parquet lake written by ``lake.export`` instead of
+            the database tables; date windows prune its partitions.
+        bucket: ``(index, count)``: only the drugs whose ``hash(drug_id)``
+            falls in bucket *index* of *count* (see ``prepare_partitioned``).
+    """
+    if use_cube:
+        if lake_root is not None:
+            raise ValueError("A lake has no cube; build from its fact files")
+        if not cube_eligible(spec):
+            raise ValueError("Spec has a date window or role set the cube cannot serve")
+        return _cube_query(spec)
+    return _facts_query(spec, lake_root, bucket)
+
+
+def prepare_partitioned(
+    con: duckdb.DuckDBPyConnection,
+    spec: AnalysisSpec,
+    buckets: int,
+    *,
+    lake_root: Optional[Path] = None,
+) -> list[tuple[str, dict[str, Any]]]:
+    """Split the facts query for *spec* into *buckets* drug hash buckets.
+
+    PT totals and N do not depend on the drug set: they are computed once
+    into temp tables on *con*, which every bucket query joins.  Each query
+    then computes the pairs of its drugs only, so the ``suspect`` /
+    ``a_counts`` intermediates – the part that grows with the history – are
+    about 1/*buckets* of the full query's; a drug's own total is complete
+    within its bucket.  Running the queries one after another on *con* and
+    concatenating their rows gives exactly the unpartitioned result.
+    """
+    if buckets < 1:
+        raise ValueError("buckets must be >= 1")
+    if buckets == 1:
+        return [build_abcd_query(spec, lake_root=lake_root)]
+    _materialize_marginals(con, spec, lake_root)
+    parts = []
+    for i in range(buckets):
+        sql, params = _facts_query(spec, lake_root, (i, buckets), shared_marginals=True)
+        parts.append((sql, _used(params, sql)))
+    return parts
+
+
+def prepare_abcd(
+    con: duckdb.DuckDBPyConnection, spec: AnalysisSpec
+) -> tuple[str, dict[str, Any]]:
+    """Pick the cheapest source for *spec* and return ``(sql, params)``.
+
+    Uses the cube when possible (building it on first use); otherwise makes
+    sure every fact row is encoded and queries the fact tables.
+    """
+    from . import dims
+
+    if cube_eligible(spec):
+        cube.ensure(con)
+        return build_abcd_query(spec, use_cube=True)
+    dims.encode(con)
+    return build_abcd_query(spec)
+
+
+def prepare_abcd_parts(
+    con: duckdb.DuckDBPyConnection, spec: AnalysisSpec, *, buckets: int = 1
+) -> list[tuple[str, dict[str, Any]]]:
+    """``prepare_abcd`` split into *buckets* queries when it reads the fact tables.
+
+    Cube reads are already aggregated and stay a single query.
+    """
+    from . import dims
+
+    if buckets <= 1 or cube_eligible(spec):
+        return [prepare_abcd(con, spec)]
+    dims.encode(con)
+    return prepare_partitioned(con, spec, buckets)
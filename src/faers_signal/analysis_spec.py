@@ -36,6 +36,7 @@ class AnalysisSpec:
 
     # Population filters
     suspect_only: bool = True
+    role_set: Optional[list[int]] = None  # overrides suspect_only, e.g. [1, 3]
     min_a: int = 3
     drug_filter: Optional[str] = None
     pt_filter: Optional[str] = None
@@ -60,6 +61,12 @@ class AnalysisSpec:
     top_n: int = 15
     tie_breaker: str = "a_desc,drug,pt"
 
+    def roles(self) -> tuple[int, ...]:
+        """Drug roles counted as "drug present" (1: suspect, 2: concomitant, 3: interacting)."""
+        if self.role_set:
+            return tuple(sorted({int(r) for r in self.role_set}))
+        return (1,) if self.suspect_only else (1, 2, 3)
+
     def to_dict(self) -> dict[str, Any]:
         return asdict(self)
 
@@ -0,0 +1,278 @@
+"""Set-based loading of report batches into the fact tables.
+
+Ingest paths collect rows into a columnar ``ReportBatch`` and hand it to
+``apply_batch``, which replaces the batch's reports in one transaction:
+
+  1. stage the batch as Arrow tables (later duplicates of a report ID win,
+     exactly like the former row-by-row upsert),
+  2. retract the old cube contribution of the touched IDs,
+  3. delete their drugs/reactions with one semi-join DELETE per table,
+  4. upsert ``reports`` and bulk-insert ``drugs``/``reactions``,
+  5. encode the new rows, add them to the cube and bump the data generation.
+
+``ingest_duckdb`` builds the same staging relations in SQL and calls
+``apply_staged`` directly.
+
+``reports`` rows are upserted (``ON CONFLICT DO UPDATE``) rather than deleted
+and re-inserted: DuckDB does not allow deleting a row that is still
+referenced by a foreign key earlier in the same transaction, and updating in
+place also keeps the report's surrogate key stable.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from . import cube, dims, generation
+
+
+DEFAULT_BATCH_SIZE = 50_000
+
+_REPORTS_SCHEMA = pa.schema(
+    [
+        ("seq", pa.int64()),
+        ("safetyreportid", pa.string()),
+        ("receivedate", pa.string()),
+        ("primarysource_qualifier", pa.int32()),
+    ]
+)
+_DRUGS_SCHEMA = pa.schema(
+    [
+        ("seq", pa.int64()),
+        ("safetyreportid", pa.string()),
+        ("drug_name", pa.string()),
+        ("drug_name_normalized", pa.string()),
+        ("drug_norm_source", pa.string()),
+        ("role", pa.int32()),
+    ]
+)
+_REACTIONS_SCHEMA = pa.schema(
+    [
+        ("seq", pa.int64()),
+        ("safetyreportid", pa.string()),
+        ("meddra_pt", pa.string()),
+    ]
+)
+
+
+@dataclass
+class ReportBatch:
+    """Columnar buffer of reports with their drug and reaction rows.
+
+    ``seq`` numbers every added report so that rows belonging to an earlier
+    duplicate of the same report ID can be dropped when the batch is applied.
+    """
+
+    r_seq: list[int] = field(default_factory=list)
+    r_sid: list[str] = field(default_factory=list)
+    r_date: list[Optional[str]] = field(default_factory=list)
+    r_qual: list[Optional[int]] = field(default_factory=list)
+
+    d_seq: list[int] = field(default_factory=list)
+    d_sid: list[str] = field(default_factory=list)
+    d_name: list[str] = field(default_factory=list)
+    d_norm: list[Optional[str]] = field(default_factory=list)
+    d_src: list[Optional[str]] = field(default_factory=list)
+    d_role: list[Optional[int]] = field(default_factory=list)
+
+    x_seq: list[int] = field(default_factory=list)
+    x_sid: list[str] = field(default_factory=list)
+    x_pt: list[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.r_seq)
+
+    def add_report(self, sid: str, receivedate: Optional[str], qualifier: Optional[int]) -> int:
+        seq = len(self.r_seq)
+        self.r_seq.append(seq)
+        self.r_sid.append(sid)
+        self.r_date.append(receivedate)
+        self.r_qual.append(qualifier)
+        return seq
+
+    def add_drug(
+        self,
+        seq: int,
+        name: str,
+        normalized: Optional[str],
+        source: Optional[str],
+        role: Optional[int],
+    ) -> None:
+        self.d_seq.append(seq)
+        self.d_sid.append(self.r_sid[seq])
+        self.d_name.append(name)
+        self.d_norm.append(normalized)
+        self.d_src.append(source)
+        self.d_role.append(role)
+
+    def add_reaction(self, seq: int, pt: str) -> None:
+        self.x_seq.append(seq)
+        self.x_sid.append(self.r_sid[seq])
+        self.x_pt.append(pt)
+
+    def to_arrow(self) -> tuple[pa.Table, pa.Table, pa.Table]:
+        reports = pa.Table.from_arrays(
+            [
+                pa.array(self.r_seq, pa.int64()),
+                pa.array(self.r_sid, pa.string()),
+                pa.array(self.r_date, pa.string()),
+                pa.array(self.r_qual, pa.int32()),
+            ],
+            schema=_REPORTS_SCHEMA,
+        )
+        drugs = pa.Table.from_arrays(
+            [
+                pa.array(self.d_seq, pa.int64()),
+                pa.array(self.d_sid, pa.string()),
+                pa.array(self.d_name, pa.string()),
+                pa.array(self.d_norm, pa.string()),
+                pa.array(self.d_src, pa.string()),
+                pa.array(self.d_role, pa.int32()),
+            ],
+            schema=_DRUGS_SCHEMA,
+        )
+        reactions = pa.Table.from_arrays(
+            [
+                pa.array(self.x_seq, pa.int64()),
+                pa.array(self.x_sid, pa.string()),
+                pa.array(self.x_pt, pa.string()),
+            ],
+            schema=_REACTIONS_SCHEMA,
+        )
+        return reports, drugs, reactions
+
+
+def head(
+    tables: tuple[pa.Table, pa.Table, pa.Table], n: int
+) -> tuple[pa.Table, pa.Table, pa.Table]:
+    """Keep only the first *n* reports of a batch (with their drugs/reactions)."""
+    reports, drugs, reactions = tables
+    return (
+        reports.filter(pc.less(reports["seq"], n)),
+        drugs.filter(pc.less(drugs["seq"], n)),
+        reactions.filter(pc.less(reactions["seq"], n)),
+    )
+
+
+def apply_staged(
+    con: duckdb.DuckDBPyConnection,
+    *,
+    before_commit: Optional[Callable[[duckdb.DuckDBPyConnection], None]] = None,
+) -> int:
+    """Replace the reports staged in ``_bulk_reports`` / ``_bulk_drugs`` / ``_bulk_reactions``.
+
+    The three relations (registered Arrow tables or temp tables) follow the
+    ``ReportBatch.to_arrow`` schemas.  Everything happens in one transaction;
+    *before_commit* runs inside it, after the facts are written, so bookkeeping
+    that describes the load commits or rolls back with it.
+    Returns the number of distinct report IDs written.
+    """
+    con.execute("BEGIN TRANSACTION")
+    try:
+        # Keep only the last occurrence of each report ID (and its rows)
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _stg_reports AS "
+            "SELECT * FROM _bulk_reports "
+            "QUALIFY row_number() OVER (PARTITION BY safetyreportid ORDER BY seq DESC) = 1"
+        )
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _stg_drugs AS "
+            "SELECT d.* FROM _bulk_drugs d JOIN _stg_reports r USING (seq)"
+        )
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _stg_reactions AS "
+            "SELECT x.* FROM _bulk_reactions x JOIN _stg_reports r USING (seq)"
+        )
+        sids = [
+            s for (s,) in con.execute("SELECT safetyreportid FROM _stg_reports").fetchall()
+        ]
+
+        cube.retract(con, sids)
+        for table in ("reaction_keys", "reactions"):
+            con.execute(
+                f"DELETE FROM {table} WHERE safetyreportid IN "
+                "(SELECT safetyreportid FROM _stg_reports)"
+            )
+        con.execute(
+            "DELETE FROM drugs WHERE safetyreportid IN "
+            "(SELECT safetyreportid FROM _stg_reports)"
+        )
+        con.execute(
+            "INSERT INTO reports (safetyreportid, receivedate, primarysource_qualifier) "
+            "SELECT safetyreportid, CAST(receivedate AS DATE), primarysource_qualifier "
+            "FROM _stg_reports "
+            "ON CONFLICT (safetyreportid) DO UPDATE SET "
+            "receivedate = excluded.receivedate, "
+            "primarysource_qualifier = excluded.primarysource_qualifier"
+        )
+        con.execute(
+            "INSERT INTO drugs "
+            "(safetyreportid, drug_name, drug_name_normalized, drug_norm_source, role) "
+            "SELECT safetyreportid, drug_name, drug_name_normalized, drug_norm_source, role "
+            "FROM _stg_drugs ORDER BY seq"
+        )
+        con.execute(
+            "INSERT INTO reactions (safetyreportid, meddra_pt) "
+            "SELECT safetyreportid, meddra_pt FROM _stg_reactions ORDER BY seq"
+        )
+        dims.encode(con)
+        cube.apply(con, sids)
+        generation.bump(con)
+        if before_commit is not None:
+            before_commit(con)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        for name in ("_stg_reports", "_stg_drugs", "_stg_reactions"):
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+    return len(sids)
+
+
+def apply_tables(
+    con: duckdb.DuckDBPyConnection,
+    reports: pa.Table,
+    drugs: pa.Table,
+    reactions: pa.Table,
+) -> int:
+    """Replace the reports in *reports* (and their drugs/reactions) in one transaction.
+
+    The tables follow the ``ReportBatch.to_arrow`` schemas.  Returns the
+    number of distinct report IDs written.
+    """
+    if reports.num_rows == 0:
+        return 0
+    con.register("_bulk_reports", reports)
+    con.register("_bulk_drugs", drugs)
+    con.register("_bulk_reactions", reactions)
+    try:
+        return apply_staged(con)
+    finally:
+        for name in ("_bulk_reports", "_bulk_drugs", "_bulk_reactions"):
+            con.unregister(name)
+
+
+def apply_batch(con: duckdb.DuckDBPyConnection, batch: ReportBatch) -> int:
+    """Write a ``ReportBatch``; see ``apply_tables``."""
+    return apply_tables(con, *batch.to_arrow())
+
+
+def concat(
+    batches: list[tuple[pa.Table, pa.Table, pa.Table]],
+) -> tuple[pa.Table, pa.Table, pa.Table]:
+    """Stack ``to_arrow`` batches into one, renumbering ``seq`` to keep their order."""
+    if len(batches) == 1:
+        return batches[0]
+    parts: tuple[list[pa.Table], list[pa.Table], list[pa.Table]] = ([], [], [])
+    offset = 0
+    for tables in batches:
+        for acc, t in zip(parts, tables):
+            acc.append(t.set_column(0, "seq", pc.add(t["seq"], offset)))
+        offset += tables[0].num_rows
+    reports, drugs, reactions = (pa.concat_tables(p) for p in parts)
+    return reports, drugs, reactions
@@ -22,28 +22,99 @@ def _ensure_db(db_path: Path) -> duckdb.DuckDBPyConnection:
     return con
 
 
+def _dedup_rule(name: str) -> str | None:
+    from . import dedup
+
+    name = name.lower()
+    if name == "none":
+        return None
+    if name not in dedup.RULES:
+        typer.echo(f"Unknown dedup rule. Use {' | '.join(dedup.RULES)} | none.", err=True)
+        raise typer.Exit(code=2)
+    return name
+
+
 @app.command()
 def etl(
     source: str = typer.Option("openfda", help="openfda|qfiles|demo"),
     db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
-    input: Path | None = typer.Option(None, help="Path to openFDA JSON/ZIP or directory (for source=openfda)"),
+    input: Path | None = typer.Option(
+        None,
+        help="Path to openFDA JSON/ZIP or directory, e.g. a download page cache (source=openfda)",
+    ),
     since: str | None = typer.Option(None, help="YYYY-MM-DD start date filter (optional)"),
     until: str | None = typer.Option(None, help="YYYY-MM-DD end date filter (optional)"),
     limit: int = typer.Option(0, help="Row limit for ingest (0 = no limit)"),
+    workers: int = typer.Option(
+        1,
+        help="Parser processes for source=openfda (files/zip members in parallel); "
+        "python engine only",
+    ),
+    engine: str = typer.Option(
+        "python", help="Ingest engine: python | duckdb (read_json/read_csv + INSERT ... SELECT)"
+    ),
+    rxnorm_ttl_days: int | None = typer.Option(
+        None, help="Re-query cached RxNorm results older than this (default 90)"
+    ),
+    rxnorm_cache_size: int | None = typer.Option(
+        None, help="Max entries kept in the RxNorm cache, LRU-evicted (default 500000)"
+    ),
+    incremental: bool = typer.Option(
+        True,
+        "--incremental/--full",
+        help="Skip inputs the ingest ledger records as unchanged (python engine, no filters)",
+    ),
+    dedup: str = typer.Option(
+        "caseversion",
+        help="Quarterly case versions to keep: caseversion | fda (latest FDA_DT) | none",
+    ),
 ):
     """Ingest FAERS from openFDA (zipped JSON preferred) or quarterly files into DuckDB.
 
     This is a minimal scaffold. See docs for data acquisition details.
     """
+    engine = engine.lower()
+    if engine not in ("python", "duckdb"):
+        typer.echo("Unknown engine. Use 'python' or 'duckdb'.", err=True)
+        raise typer.Exit(code=2)
+    if engine == "duckdb" and workers > 1:
+        typer.echo("--workers applies to the python engine; duckdb parallelizes itself.", err=True)
+        raise typer.Exit(code=2)
+    from . import rxnorm_cache
+
+    rxnorm_cache.configure(ttl_days=rxnorm_ttl_days, max_entries=rxnorm_cache_size)
+    dedup_rule = _dedup_rule(dedup)
     con = _ensure_db(db)
-    if source.lower() == "openfda":
+    if engine == "duckdb" and source.lower() in ("openfda", "qfiles"):
+        from .ingest_duckdb import ingest_openfda_sql, ingest_qfiles_sql
+
+        if input is None or not Path(input).exists():
+            typer.echo(f"--input is required and must exist (got: {input})", err=True)
+            raise typer.Exit(code=2)
+        if source.lower() == "openfda":
+            total = ingest_openfda_sql(
+                con, input=Path(input), since=since, until=until, limit=limit
+            )
+        else:
+            total = ingest_qfiles_sql(
+                con, input=Path(input), since=since, until=until, limit=limit,
+                dedup_rule=dedup_rule,
+            )
+        typer.echo(f"Ingested {total} reports from {input}")
+    elif source.lower() == "openfda":
         from .ingest_openfda import ingest_openfda
 
-        ingest_openfda(con, input=input, since=since, until=until, limit=limit)
+        ingest_openfda(
+            con, input=input, since=since, until=until, limit=limit, workers=workers,
+            incremental=incremental,
+        )
     elif source.lower() == "qfiles":
         from .ingest_qfiles import ingest_qfiles
 
-        ingest_qfiles(con, input=input, since=since, until=until, limit=limit)
+        ingest_qfiles(
+            con, input=input, since=since, until=until, limit=limit, incremental=incremental,
+            dedup_rule=dedup_rule,
+        )
     elif source.lower() == "demo":
         from .ingest_demo import ingest_demo
 
@@ -54,113 +125,640 @@ def etl(
 
 
 @app.command()
-def build(
+def download(
     db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
-    suspect_only: bool = typer.Option(True, help="Use role=1 suspect drugs only"),
-    min_a: int = typer.Option(3, help="Minimum A count to keep"),
-    signal_mode: str = typer.Option("balanced", help="Signal mode: sensitive|balanced|specific"),
-    out: Path = typer.Option(Path("data/metrics.parquet"), help="Output Parquet/CSV path"),
+    drug: str | None = typer.Option(None, help="Drug name filter (optional)"),
+    since: str | None = typer.Option(None, help="YYYY-MM-DD receivedate lower bound"),
+    until: str | None = typer.Option(None, help="YYYY-MM-DD receivedate upper bound"),
+    max_records: int = typer.Option(5000, help="Max reports to fetch (0 = all)"),
+    cache_dir: Path = typer.Option(
+        Path("data/openfda_cache"), help="Page cache; reruns resume from it"
+    ),
+    refresh: bool = typer.Option(False, help="Ignore cached pages and fetch again"),
+    concurrency: int = typer.Option(4, help="Pages in flight at once"),
 ):
-    """Compute A/B/C/D and metrics (PRR/ROR/IC/chi-square) and write to Parquet/CSV."""
-    con = _ensure_db(db)
-    # Load packaged abcd.sql
-    sql = _resources.get_sql("abcd.sql")
-    # Toggle suspect-only by adjusting a temp view
-    if not suspect_only:
-        # When not suspect-only, we treat all drugs as candidates (role in (1,2,3))
-        sql = sql.replace("FROM drugs WHERE role = 1", "FROM drugs WHERE role in (1,2,3)")
-    abcd_df = con.execute(sql).fetch_df()
-
-    from .metrics import (
-        ABCD,
-        prr,
-        chi_square_1df,
-        ror,
-        ror_ci95,
-        ic_simple,
-        ic_simple_ci95,
-        signal_flags,
-        classify_signal,
+    """Fetch reports from the openFDA API into the database, caching every page.
+
+    An interrupted run resumes from the cache when rerun with the same query;
+    ``etl --source openfda --input <cache-dir>`` rebuilds from it offline.
+    """
+    from .download_openfda import fetch_and_ingest
+
+    total = fetch_and_ingest(
+        _ensure_db(db),
+        drug=drug,
+        since=since,
+        until=until,
+        max_records=max_records or None,
+        concurrency=concurrency,
+        cache_dir=cache_dir,
+        refresh=refresh,
     )
-    from .analysis_spec import AnalysisSpec, Manifest
-    import numpy as np
+    typer.echo(f"Ingested {total:,} reports (page cache: {cache_dir})")
+
+
+def _build_spec(
+    *,
+    since: str | None,
+    until: str | None,
+    suspect_only: bool,
+    roles: str | None,
+    min_a: int,
+    drug_filter: str | None,
+    pt_filter: str | None,
+    signal_mode: str,
+):
+    from .analysis_spec import AnalysisSpec
+    from .metrics_sql import SIGNAL_MODES
+
+    # Checked here so both metrics engines reject the same modes
+    if signal_mode not in SIGNAL_MODES:
+        typer.echo(f"Unknown signal mode. Use {' | '.join(SIGNAL_MODES)}.", err=True)
+        raise typer.Exit(code=2)
+    role_set = [r.strip() for r in roles.split(",") if r.strip()] if roles else []
+    if any(r not in ("1", "2", "3") for r in role_set):
+        typer.echo(
+            "Invalid --roles. Use a comma-separated list of 1 (suspect), "
+            "2 (concomitant), 3 (interacting).",
+            err=True,
+        )
+        raise typer.Exit(code=2)
+    return AnalysisSpec(
+        since=since,
+        until=until,
+        suspect_only=suspect_only,
+        role_set=[int(r) for r in role_set] or None,
+        min_a=min_a,
+        drug_filter=drug_filter,
+        pt_filter=pt_filter,
+        drug_normalization="rxnorm_ingredient",
+        signal_mode=signal_mode,
+    )
+
+
+def _scored_batches(con: duckdb.DuckDBPyConnection, spec, parts, *, engine: str):
+    """Yield the scored rows of the ABCD queries in *parts* as Arrow batches.
+
+    Each part starts with an empty table that carries its columns, so the
+    output is typed even when no pair passes the filters.
+    """
+    import pyarrow as pa
+
+    from .result_sink import BATCH_ROWS
+
+    min_a, signal_mode = spec.min_a, spec.signal_mode
+    if engine == "duckdb":
+        from .metrics_sql import metrics_select
+
+        # Metrics are computed by DuckDB; batches go straight to the writers
+        for sql, params in parts:
+            query = metrics_select(f"({sql})", min_a=min_a, mode=signal_mode)
+            reader = con.execute(query, params).to_arrow_reader(BATCH_ROWS)
+            yield reader.schema.empty_table()
+            yield from reader
+        return
+
+    from .metrics import compute_metrics_frame
     import pandas as pd
 
-    def _metrics_row(row: pd.Series):
-        ab = ABCD(int(row.A), int(row.B), int(row.C), int(row.D), int(row.total_reports))
-        prr_v = prr(ab)
-        chi = chi_square_1df(ab)
-        ror_v = ror(ab)
-        ror_l, ror_u = ror_ci95(ab)
-        ic_v = ic_simple(ab)
-        ic_l, ic_u = ic_simple_ci95(ab)
-
-        flags = signal_flags(ab, min_a=min_a)
-        is_signal = classify_signal(flags, mode=signal_mode)
-
-        return pd.Series(
-            {
-                "PRR": prr_v,
-                "Chi2_1df": chi,
-                "ROR": ror_v,
-                "ROR_CI_L": ror_l,
-                "ROR_CI_U": ror_u,
-                "IC": ic_v,
-                "IC_CI_L": ic_l,
-                "IC_CI_U": ic_u,
-                "flag_evans": flags["flag_evans"],
-                "flag_ror025": flags["flag_ror025"],
-                "flag_ic025": flags["flag_ic025"],
-                "Signal": is_signal,
-            }
+    def scored(batch: pa.RecordBatch | pa.Table) -> pa.Table:
+        abcd_df = batch.to_pandas()
+        mdf = abcd_df[abcd_df["A"] >= min_a].reset_index(drop=True)
+        metrics_df = compute_metrics_frame(
+            mdf["A"].to_numpy(),
+            mdf["B"].to_numpy(),
+            mdf["C"].to_numpy(),
+            mdf["D"].to_numpy(),
+            mdf["total_reports"].to_numpy(),
+            min_a=min_a,
+            mode=signal_mode,
         )
+        return pa.Table.from_pandas(pd.concat([mdf, metrics_df], axis=1), preserve_index=False)
 
-    if not abcd_df.empty:
-        mdf = abcd_df.join(abcd_df.apply(_metrics_row, axis=1))
-        mdf = mdf[mdf["A"] >= min_a]
-    else:
-        mdf = abcd_df
+    for sql, params in parts:
+        reader = con.execute(sql, params).to_arrow_reader(BATCH_ROWS)
+        yield scored(reader.schema.empty_table())
+        for batch in reader:
+            yield scored(batch)
+
+
+def _cached_batches(path: Path):
+    import pyarrow.parquet as pq
+
+    from .result_sink import BATCH_ROWS
+
+    f = pq.ParquetFile(path)
+    yield f.schema_arrow.empty_table()
+    yield from f.iter_batches(BATCH_ROWS)
 
-    out.parent.mkdir(parents=True, exist_ok=True)
-    if out.suffix.lower() == ".csv":
-        mdf.to_csv(out, index=False)
+
+def _metrics_engine(name: str) -> str:
+    name = name.lower()
+    if name not in ("python", "duckdb"):
+        typer.echo("Unknown engine. Use 'python' or 'duckdb'.", err=True)
+        raise typer.Exit(code=2)
+    return name
+
+
+def _write_metrics(
+    con: duckdb.DuckDBPyConnection,
+    spec,
+    parts: list[tuple[str, dict]],
+    *,
+    out: Path,
+    engine: str,
+    row_group_size: int | None = None,
+    compression: str | None = None,
+    store: bool = False,
+    cache=None,
+    cached: Path | None = None,
+) -> None:
+    """Score the ABCD queries in *parts*, write their rows to *out* and its manifest.
+
+    Rows are streamed from DuckDB as Arrow record batches and appended to
+    *out* as they are scored, so memory does not grow with the result; the
+    manifest counts are gathered from the same stream.  With *store* the
+    same batches also replace the spec's rows in ``signal_results``.
+
+    *cached* (a ``ResultCache`` hit) replaces the computation; otherwise a
+    *cache* receives the scored rows as a new entry.
+    """
+    import pyarrow.compute as pc
+
+    from . import generation
+    from .analysis_spec import Manifest
+
+    engine = _metrics_engine(engine)
+    sink = _open_sink(out, row_group_size=row_group_size, compression=compression)
+    writer = None
+    if store:
+        from . import signal_store
+
+        try:
+            writer = signal_store.Writer(con, spec)
+        except ValueError as e:
+            typer.echo(str(e), err=True)
+            raise typer.Exit(code=2)
+    entry = None
+    if cached is not None:
+        batches = _cached_batches(cached)
     else:
-        mdf.to_parquet(out, index=False)
+        batches = _scored_batches(con, spec, parts, engine=engine)
+        if cache is not None:
+            fingerprint = generation.fingerprint(con)
+            entry = cache.writer(spec, fingerprint)
+
+    signal_count = 0
+    try:
+        with sink:
+            for batch in batches:
+                signal_count += int(pc.sum(batch.column("Signal")).as_py() or 0)
+                sink.write(batch)
+                if writer is not None:
+                    writer.write(batch)
+                if entry is not None:
+                    entry.write(batch)
+    except BaseException:
+        if entry is not None:
+            cache.discard(entry)
+        raise
+    total_pairs = sink.rows
     typer.echo(f"Wrote metrics to {out}")
+    if entry is not None:
+        path = cache.commit(spec, fingerprint, entry, signals=signal_count)
+        if path is None:
+            typer.echo(
+                f"Result not cached: larger than the cache limit ({cache.max_bytes >> 20} MB)"
+            )
+        else:
+            typer.echo(f"Cached result as {path.name}")
+    if writer is not None:
+        writer.commit()
+        typer.echo(f"Stored {total_pairs:,} rows in signal_results ({writer.key})")
 
     # Write manifest
-    spec = AnalysisSpec(
-        suspect_only=suspect_only,
-        min_a=min_a,
-        drug_normalization="rxnorm_ingredient",
-        signal_mode=signal_mode,
-    )
     manifest = Manifest(spec=spec)
     manifest.populate_env()
     manifest.populate_db_stats(con)
-    manifest.total_pairs = len(mdf)
-    manifest.signal_count = int(mdf["Signal"].sum()) if not mdf.empty else 0
+    manifest.total_pairs = int(total_pairs)
+    manifest.signal_count = int(signal_count)
 
     manifest_path = out.with_suffix(".manifest.json")
     manifest.save(manifest_path)
     typer.echo(f"Wrote manifest to {manifest_path}")
 
 
+def _open_sink(out: Path, *, row_group_size: int | None, compression: str | None):
+    from .result_sink import ResultSink
+
+    try:
+        return ResultSink(out, row_group_size=row_group_size, compression=compression)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=2)
+
+
+def _result_cache(db: Path, cache_dir: Path | None, max_mb: int):
+    from .result_cache import ResultCache
+
+    try:
+        return ResultCache(cache_dir or db.parent / "result_cache", max_bytes=max_mb << 20)
+    except ValueError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=2)
+
+
+def _apply_resources(
+    con: duckdb.DuckDBPyConnection,
+    *,
+    memory_limit: str | None,
+    threads: int | None,
+    temp_directory: Path | None,
+    preserve_insertion_order: bool | None,
+) -> None:
+    from .db_resources import Resources
+
+    try:
+        Resources(
+            memory_limit=memory_limit,
+            threads=threads,
+            temp_directory=temp_directory,
+            preserve_insertion_order=preserve_insertion_order,
+        ).apply(con)
+    except duckdb.Error as e:
+        typer.echo(f"Invalid resource setting: {e}", err=True)
+        raise typer.Exit(code=2)
+
+
+@app.command()
+def build(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    suspect_only: bool = typer.Option(True, help="Use role=1 suspect drugs only"),
+    roles: str | None = typer.Option(
+        None, help="Comma-separated drug roles overriding --suspect-only (e.g. 1,3)"
+    ),
+    since: str | None = typer.Option(None, help="YYYY-MM-DD start of receivedate window"),
+    until: str | None = typer.Option(None, help="YYYY-MM-DD end of receivedate window"),
+    drug_filter: str | None = typer.Option(None, help="Drug name prefix (normalized, lowercase)"),
+    pt_filter: str | None = typer.Option(None, help="Reaction PT prefix"),
+    min_a: int = typer.Option(3, help="Minimum A count to keep"),
+    signal_mode: str = typer.Option("balanced", help="Signal mode: sensitive|balanced|specific"),
+    out: Path = typer.Option(Path("data/metrics.parquet"), help="Output Parquet/CSV path"),
+    engine: str = typer.Option(
+        "python", help="Metrics engine: python (vectorized NumPy) | duckdb (SQL push-down)"
+    ),
+    buckets: int = typer.Option(
+        1, help="Compute pairs in this many drug hash buckets, one at a time (bounds memory)"
+    ),
+    memory_limit: str | None = typer.Option(None, help="DuckDB memory_limit, e.g. 12GB"),
+    threads: int | None = typer.Option(None, help="DuckDB worker threads"),
+    temp_directory: Path | None = typer.Option(None, help="DuckDB spill directory"),
+    preserve_insertion_order: bool | None = typer.Option(
+        None,
+        "--preserve-insertion-order/--no-preserve-insertion-order",
+        help="DuckDB preserve_insertion_order (off lowers memory use)",
+    ),
+    row_group_size: int | None = typer.Option(None, help="Parquet rows per row group"),
+    compression: str | None = typer.Option(
+        None, help="Parquet codec: snappy | zstd | gzip | lz4 | brotli | none"
+    ),
+    store: bool = typer.Option(
+        False, help="Also keep the result in the signal_results table for the UI"
+    ),
+    cache: bool = typer.Option(
+        False, help="Reuse a cached result for this spec and data, or cache the new one"
+    ),
+    cache_dir: Path | None = typer.Option(
+        None, help="Result cache directory (default: result_cache next to --db)"
+    ),
+    cache_max_mb: int = typer.Option(2048, help="Result cache size limit (MB, LRU-evicted)"),
+):
+    """Compute A/B/C/D and metrics (PRR/ROR/IC/chi-square) and write to Parquet/CSV."""
+    from .abcd_query import prepare_abcd_parts
+
+    spec = _build_spec(
+        since=since,
+        until=until,
+        suspect_only=suspect_only,
+        roles=roles,
+        min_a=min_a,
+        drug_filter=drug_filter,
+        pt_filter=pt_filter,
+        signal_mode=signal_mode,
+    )
+    if buckets < 1:
+        typer.echo("--buckets must be >= 1", err=True)
+        raise typer.Exit(code=2)
+    # Before the cache lookup, so a cached result never hides a bad --engine
+    engine = _metrics_engine(engine)
+    con = _ensure_db(db)
+    _apply_resources(
+        con,
+        memory_limit=memory_limit,
+        threads=threads,
+        temp_directory=temp_directory,
+        preserve_insertion_order=preserve_insertion_order,
+    )
+    result_cache, cached = None, None
+    if cache:
+        from . import generation
+
+        result_cache = _result_cache(db, cache_dir, cache_max_mb)
+        cached = result_cache.get(spec, generation.fingerprint(con))
+        if cached is not None:
+            typer.echo(f"Result cache hit: {cached.name}")
+    # Filters are pushed into the query; unwindowed specs are served from the cube
+    parts = [] if cached is not None else prepare_abcd_parts(con, spec, buckets=buckets)
+    _write_metrics(
+        con,
+        spec,
+        parts,
+        out=out,
+        engine=engine,
+        row_group_size=row_group_size,
+        compression=compression,
+        store=store,
+        cache=result_cache,
+        cached=cached,
+    )
+
+
+lake_app = typer.Typer(help="Hive-partitioned Parquet copy of the fact tables")
+app.add_typer(lake_app, name="lake")
+
+
+@lake_app.command("export")
+def lake_export(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    root: Path = typer.Option(Path("data/lake"), help="Lake directory (replaced)"),
+):
+    """Write reports/drugs/reactions as Parquet partitioned by receive year/quarter."""
+    from . import lake
+
+    counts = lake.export(_ensure_db(db), root)
+    typer.echo(
+        f"Wrote {counts['reports']:,} reports, {counts['drugs']:,} drug rows and "
+        f"{counts['reactions']:,} reaction rows to {root}"
+    )
+
+
+@lake_app.command("build")
+def lake_build(
+    root: Path = typer.Option(Path("data/lake"), help="Lake directory written by `lake export`"),
+    suspect_only: bool = typer.Option(True, help="Use role=1 suspect drugs only"),
+    roles: str | None = typer.Option(
+        None, help="Comma-separated drug roles overriding --suspect-only (e.g. 1,3)"
+    ),
+    since: str | None = typer.Option(None, help="YYYY-MM-DD start of receivedate window"),
+    until: str | None = typer.Option(None, help="YYYY-MM-DD end of receivedate window"),
+    drug_filter: str | None = typer.Option(None, help="Drug name prefix (normalized, lowercase)"),
+    pt_filter: str | None = typer.Option(None, help="Reaction PT prefix"),
+    min_a: int = typer.Option(3, help="Minimum A count to keep"),
+    signal_mode: str = typer.Option("balanced", help="Signal mode: sensitive|balanced|specific"),
+    out: Path = typer.Option(Path("data/metrics.parquet"), help="Output Parquet/CSV path"),
+    engine: str = typer.Option(
+        "python", help="Metrics engine: python (vectorized NumPy) | duckdb (SQL push-down)"
+    ),
+    buckets: int = typer.Option(
+        1, help="Compute pairs in this many drug hash buckets, one at a time (bounds memory)"
+    ),
+    memory_limit: str | None = typer.Option(None, help="DuckDB memory_limit, e.g. 12GB"),
+    threads: int | None = typer.Option(None, help="DuckDB worker threads"),
+    temp_directory: Path | None = typer.Option(None, help="DuckDB spill directory"),
+    preserve_insertion_order: bool | None = typer.Option(
+        None,
+        "--preserve-insertion-order/--no-preserve-insertion-order",
+        help="DuckDB preserve_insertion_order (off lowers memory use)",
+    ),
+    row_group_size: int | None = typer.Option(None, help="Parquet rows per row group"),
+    compression: str | None = typer.Option(
+        None, help="Parquet codec: snappy | zstd | gzip | lz4 | brotli | none"
+    ),
+):
+    """Like `build`, reading the lake; date windows only scan their partitions."""
+    from . import lake
+    from .abcd_query import prepare_partitioned
+
+    spec = _build_spec(
+        since=since,
+        until=until,
+        suspect_only=suspect_only,
+        roles=roles,
+        min_a=min_a,
+        drug_filter=drug_filter,
+        pt_filter=pt_filter,
+        signal_mode=signal_mode,
+    )
+    if buckets < 1:
+        typer.echo("--buckets must be >= 1", err=True)
+        raise typer.Exit(code=2)
+    try:
+        con = lake.connect(root)
+    except FileNotFoundError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=2)
+    _apply_resources(
+        con,
+        memory_limit=memory_limit,
+        threads=threads,
+        temp_directory=temp_directory,
+        preserve_insertion_order=preserve_insertion_order,
+    )
+    parts = prepare_partitioned(con, spec, buckets, lake_root=root)
+    _write_metrics(
+        con,
+        spec,
+        parts,
+        out=out,
+        engine=engine,
+        row_group_size=row_group_size,
+        compression=compression,
+    )
+
+
+@app.command(name="dedup")
+def dedup_cmd(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    rule: str = typer.Option("caseversion", help="caseversion | fda (latest FDA_DT)"),
+):
+    """Keep one version per FAERS CASEID across everything loaded so far."""
+    from . import dedup
+
+    rule_name = _dedup_rule(rule)
+    if rule_name is None:
+        raise typer.Exit(code=0)
+    st = dedup.supersede(_ensure_db(db), rule=rule_name)
+    typer.echo(f"Ranked {st['cases']:,} cases; removed {st['superseded']:,} superseded reports")
+
+
+@app.command(name="cube")
+def cube_cmd(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+):
+    """Rebuild the persistent ABCD cube from the fact tables.
+
+    Ingest keeps the cube current incrementally; a rebuild is only needed after
+    the tables were modified outside the ingest commands.
+    """
+    from . import cube
+
+    con = _ensure_db(db)
+    cube.rebuild(con)
+    pairs = con.execute("SELECT COUNT(*) FROM cube_pair").fetchone()[0]
+    typer.echo(f"Rebuilt ABCD cube ({pairs:,} drug/PT pairs)")
+
+
+@app.command()
+def normalize(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    only_unmapped: bool = typer.Option(False, help="Only rewrite rows still 'unmapped'"),
+    overrides: Path | None = typer.Option(
+        None, help="CSV/Parquet of manual overrides (drug_name or name_key, normalized)"
+    ),
+    api: bool = typer.Option(
+        True, help="Query RxNav for names missing from the caches (ignored with an offline index)"
+    ),
+    rxnorm_workers: int = typer.Option(8, help="Concurrent RxNav lookups"),
+):
+    """Re-normalize drug names already in the database and refresh the ABCD cube."""
+    from .renormalize import renormalize
+
+    if overrides is not None and not overrides.exists():
+        typer.echo(f"Overrides file not found: {overrides}", err=True)
+        raise typer.Exit(code=2)
+    st = renormalize(
+        _ensure_db(db),
+        only_unmapped=only_unmapped,
+        overrides=overrides,
+        use_api=api,
+        max_workers=rxnorm_workers,
+    )
+    typer.echo(
+        f"Resolved {st['names']:,} distinct names; updated {st['rows']:,} drug rows, "
+        f"re-aggregated {st['reports']:,} reports"
+    )
+
+
+rxnorm_cache_app = typer.Typer(help="Manage the persistent RxNorm lookup cache")
+app.add_typer(rxnorm_cache_app, name="rxnorm-cache")
+
+
+@rxnorm_cache_app.command("stats")
+def rxnorm_cache_stats(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+):
+    """Show cache size, positive/negative entries and expired entries."""
+    from . import rxnorm_cache
+
+    st = rxnorm_cache.stats(_ensure_db(db))
+    typer.echo(
+        f"{st['entries']:,} entries ({st['positive']:,} positive, "
+        f"{st['negative']:,} negative, {st['expired']:,} expired)"
+    )
+
+
+@rxnorm_cache_app.command("export")
+def rxnorm_cache_export(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    out: Path = typer.Option(Path("data/rxnorm_cache.parquet"), help="Parquet/CSV output"),
+):
+    """Write the RxNorm cache to Parquet (or CSV)."""
+    from . import rxnorm_cache
+
+    n = rxnorm_cache.export(_ensure_db(db), out)
+    typer.echo(f"Wrote {n:,} cache entries to {out}")
+
+
+@rxnorm_cache_app.command("preload")
+def rxnorm_cache_preload(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    input: Path = typer.Option(..., help="Parquet/CSV with name_key, normalized[, source, fetched_at]"),
+    max_entries: int | None = typer.Option(None, help="Cache size cap (default 500000)"),
+):
+    """Merge an exported (or hand-made) mapping file into the RxNorm cache."""
+    from . import rxnorm_cache
+
+    if not input.exists():
+        typer.echo(f"Input not found: {input}", err=True)
+        raise typer.Exit(code=2)
+    rxnorm_cache.configure(max_entries=max_entries)
+    n = rxnorm_cache.preload(_ensure_db(db), input)
+    typer.echo(f"Loaded {n:,} cache entries from {input}")
+
+
+@app.command("rxnorm-load")
+def rxnorm_load(
+    db: Path = typer.Option(Path("data/faers.duckdb"), help="DuckDB file path"),
+    input: Path = typer.Option(
+        ..., help="RxNorm release zip or directory containing RXNCONSO.RRF and RXNREL.RRF"
+    ),
+):
+    """Import RxNorm RRF files for offline drug name normalization (replaces RxNav calls)."""
+    from . import rxnorm_local
+
+    if not input.exists():
+        typer.echo(f"Input not found: {input}", err=True)
+        raise typer.Exit(code=2)
+    try:
+        counts = rxnorm_local.load_rrf(_ensure_db(db), input)
+    except FileNotFoundError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=2)
+    typer.echo(
+        f"Loaded {counts['names']:,} names and {counts['relations']:,} relations; "
+        f"{counts['concepts']:,} concepts resolved to ingredients, "
+        f"{counts['lookup_keys']:,} lookup keys"
+    )
+
+
+result_cache_app = typer.Typer(help="Manage the on-disk cache of build/UI results")
+app.add_typer(result_cache_app, name="result-cache")
+
+
+@result_cache_app.command("stats")
+def result_cache_stats(
+    cache_dir: Path = typer.Option(Path("data/result_cache"), help="Result cache directory"),
+):
+    """Show cached entries, their size and the hit/miss/eviction counts."""
+    from .result_cache import ResultCache
+
+    st = ResultCache(cache_dir).stats()
+    lookups = st["hits"] + st["misses"]
+    rate = f", {st['hits'] / lookups:.0%} hit rate" if lookups else ""
+    typer.echo(
+        f"{st['entries']:,} entries ({st['bytes'] / (1 << 20):,.1f} MB); "
+        f"{st['hits']:,} hits, {st['misses']:,} misses{rate}, {st['evictions']:,} evictions"
+    )
+
+
+@result_cache_app.command("clear")
+def result_cache_clear(
+    cache_dir: Path = typer.Option(Path("data/result_cache"), help="Result cache directory"),
+):
+    """Delete every cached result."""
+    from .result_cache import ResultCache
+
+    n = ResultCache(cache_dir).clear()
+    typer.echo(f"Removed {n:,} cached results from {cache_dir}")
+
+
 @app.command()
 def export(
     db: Path = typer.Option(Path("data/faers.duckdb")),
     sql: str = typer.Option("SELECT * FROM reports LIMIT 10", help="SQL to run"),
     out: Path = typer.Option(Path("data/export.csv")),
+    row_group_size: int | None = typer.Option(None, help="Parquet rows per row group"),
+    compression: str | None = typer.Option(
+        None, help="Parquet codec: snappy | zstd | gzip | lz4 | brotli | none"
+    ),
 ):
-    """Run an arbitrary SELECT and export to CSV/Parquet."""
+    """Run an arbitrary SELECT and export to CSV/Parquet (streamed, constant memory)."""
+    from .result_sink import stream_query
+
     con = duckdb.connect(str(db))
-    df = con.execute(sql).fetch_df()
-    out.parent.mkdir(parents=True, exist_ok=True)
-    if out.suffix.lower() == ".csv":
-        df.to_csv(out, index=False)
-    else:
-        df.to_parquet(out, index=False)
-    typer.echo(f"Wrote {len(df):,} rows to {out}")
+    with _open_sink(out, row_group_size=row_group_size, compression=compression) as sink:
+        n = stream_query(con, sql, None, sink)
+    typer.echo(f"Wrote {n:,} rows to {out}")
 
 
 @app.command()
@@ -0,0 +1,191 @@
+"""Persistent, incrementally maintained ABCD aggregates.
+
+``abcd.sql`` derives A/B/C/D from the raw ``drugs``/``reactions`` tables on
+every run.  The cube keeps the marginals it needs in ordinary tables instead:
+
+  cube_drug(scope, drug_id, n_reports)   – distinct reports per drug
+  cube_pt(pt_id, n_reports)              – distinct reports per PT
+  cube_pair(scope, drug_id, pt_id, a)    – A per drug/PT pair
+  cube_total(n_reports)                  – N
+
+All keys are the integer IDs of ``drug_dim`` / ``pt_dim`` (see ``dims``);
+rows must be encoded before they are applied.
+
+Every report contributes independently to these counts, so ingest keeps them
+current by subtracting the contribution of the reports it is about to replace
+(``retract``) and adding the contribution of the rows it just wrote
+(``apply``).  Only the touched report IDs are aggregated.
+
+The cube is built lazily: until ``rebuild`` has run once, ``cube_total`` is
+empty, ``retract``/``apply`` are no-ops and ``ensure`` performs the first
+full build.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+import duckdb
+
+from . import dims
+from ._sqlutil import temp_id_table
+
+
+# Drug role sets for each scope (see schema.sql for role codes)
+SCOPES: dict[str, tuple[int, ...]] = {
+    "suspect": (1,),
+    "all": (1, 2, 3),
+}
+
+
+def is_built(con: duckdb.DuckDBPyConnection) -> bool:
+    row = con.execute("SELECT COUNT(*) FROM cube_total").fetchone()
+    return bool(row and row[0])
+
+
+def _scope_drugs_sql(report_filter: str) -> str:
+    """Distinct (scope, report_key, drug_id) rows, one block per scope."""
+    blocks = []
+    for scope, roles in SCOPES.items():
+        role_list = ", ".join(str(r) for r in roles)
+        blocks.append(
+            f"SELECT DISTINCT '{scope}' AS scope, report_key, drug_id "
+            f"FROM drugs WHERE role IN ({role_list}) AND drug_id IS NOT NULL{report_filter}"
+        )
+    return "\nUNION ALL\n".join(blocks)
+
+
+def _aggregate(con: duckdb.DuckDBPyConnection, report_filter: str, prefix: str) -> None:
+    """Aggregate the cube contribution of the selected reports into temp tables."""
+    where = f"WHERE {report_filter}" if report_filter else ""
+    and_filter = f" AND {report_filter}" if report_filter else ""
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {prefix}_s AS {_scope_drugs_sql(and_filter)}")
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {prefix}_r AS "
+        f"SELECT DISTINCT report_key, pt_id FROM reaction_keys {where}"
+    )
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {prefix}_drug AS "
+        f"SELECT scope, drug_id, COUNT(*) AS n FROM {prefix}_s GROUP BY 1, 2"
+    )
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {prefix}_pt AS "
+        f"SELECT pt_id, COUNT(*) AS n FROM {prefix}_r GROUP BY 1"
+    )
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {prefix}_pair AS "
+        f"SELECT s.scope, s.drug_id, r.pt_id, COUNT(*) AS n "
+        f"FROM {prefix}_s s JOIN {prefix}_r r USING (report_key) GROUP BY 1, 2, 3"
+    )
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {prefix}_total AS "
+        f"SELECT COUNT(*) AS n FROM reports {where}"
+    )
+
+
+def _drop_temp(con: duckdb.DuckDBPyConnection, prefix: str) -> None:
+    for suffix in ("s", "r", "drug", "pt", "pair", "total"):
+        con.execute(f"DROP TABLE IF EXISTS {prefix}_{suffix}")
+
+
+def rebuild(con: duckdb.DuckDBPyConnection) -> None:
+    """Recompute the whole cube from the fact tables."""
+    dims.encode(con)
+    _aggregate(con, "", "_cube_full")
+    con.execute("DELETE FROM cube_drug")
+    con.execute("DELETE FROM cube_pt")
+    con.execute("DELETE FROM cube_pair")
+    con.execute("DELETE FROM cube_total")
+    con.execute("INSERT INTO cube_drug SELECT scope, drug_id, n FROM _cube_full_drug")
+    con.execute("INSERT INTO cube_pt SELECT pt_id, n FROM _cube_full_pt")
+    con.execute("INSERT INTO cube_pair SELECT scope, drug_id, pt_id, n FROM _cube_full_pair")
+    con.execute("INSERT INTO cube_total SELECT n FROM _cube_full_total")
+    _drop_temp(con, "_cube_full")
+
+
+def ensure(con: duckdb.DuckDBPyConnection) -> None:
+    """Build the cube if it has never been built."""
+    if not is_built(con):
+        rebuild(con)
+
+
+def _merge_delta(con: duckdb.DuckDBPyConnection, sign: int) -> None:
+    """Add ``sign`` × the ``_cube_delta_*`` counts into the cube tables."""
+    merges = [
+        ("cube_drug", "n_reports", ("scope", "drug_id"), "_cube_delta_drug"),
+        ("cube_pt", "n_reports", ("pt_id",), "_cube_delta_pt"),
+        ("cube_pair", "a", ("scope", "drug_id", "pt_id"), "_cube_delta_pair"),
+    ]
+    for table, value, keys, delta in merges:
+        match = " AND ".join(f"{table}.{k} = d.{k}" for k in keys)
+        con.execute(
+            f"UPDATE {table} SET {value} = {table}.{value} + ({sign}) * d.n "
+            f"FROM {delta} d WHERE {match}"
+        )
+        if sign > 0:
+            key_cols = ", ".join(f"d.{k}" for k in keys)
+            match_c = " AND ".join(f"c.{k} = d.{k}" for k in keys)
+            con.execute(
+                f"INSERT INTO {table} SELECT {key_cols}, d.n FROM {delta} d "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} c WHERE {match_c})"
+            )
+        else:
+            con.execute(f"DELETE FROM {table} WHERE {value} <= 0")
+    con.execute(
+        f"UPDATE cube_total SET n_reports = n_reports + ({sign}) * "
+        f"(SELECT n FROM _cube_delta_total)"
+    )
+
+
+def _apply_delta_table(con: duckdb.DuckDBPyConnection, id_table: str, sign: int) -> None:
+    _aggregate(con, f"safetyreportid IN (SELECT safetyreportid FROM {id_table})", "_cube_delta")
+    _merge_delta(con, sign)
+    _drop_temp(con, "_cube_delta")
+
+
+def _apply_delta(con: duckdb.DuckDBPyConnection, report_ids: Iterable[str], sign: int) -> None:
+    if not is_built(con):
+        return
+    if temp_id_table(con, "_cube_ids", report_ids):
+        _apply_delta_table(con, "_cube_ids", sign)
+    con.execute("DROP TABLE IF EXISTS _cube_ids")
+
+
+def retract(con: duckdb.DuckDBPyConnection, report_ids: Iterable[str]) -> None:
+    """Subtract the current contribution of *report_ids* (call before deleting them)."""
+    _apply_delta(con, report_ids, -1)
+
+
+def retract_table(con: duckdb.DuckDBPyConnection, id_table: str) -> None:
+    """``retract`` for the IDs in table *id_table* (``safetyreportid`` column)."""
+    if is_built(con):
+        _apply_delta_table(con, id_table, -1)
+
+
+def apply(con: duckdb.DuckDBPyConnection, report_ids: Iterable[str]) -> None:
+    """Add the contribution of *report_ids* (call after inserting and encoding them)."""
+    _apply_delta(con, report_ids, +1)
+
+
+def abcd_select(scope: str = "suspect") -> str:
+    """ABCD rows for *scope* read from the cube; same columns as ``abcd.sql``."""
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown cube scope: {scope!r} (expected one of {tuple(SCOPES)})")
+    return f"""
+SELECT
+  dd.drug,
+  pd.pt,
+  p.a                                          AS A,
+  (d.n_reports - p.a)                          AS B,
+  (r.n_reports - p.a)                          AS C,
+  (t.n_reports - d.n_reports - r.n_reports + p.a) AS D,
+  d.n_reports                                  AS drug_reports,
+  r.n_reports                                  AS pt_reports,
+  t.n_reports                                  AS total_reports
+FROM cube_pair p
+JOIN cube_drug d ON d.scope = p.scope AND d.drug_id = p.drug_id
+JOIN cube_pt r ON r.pt_id = p.pt_id
+CROSS JOIN cube_total t
+JOIN drug_dim dd ON dd.drug_id = p.drug_id
+JOIN pt_dim pd ON pd.pt_id = p.pt_id
+WHERE p.scope = '{scope}'
+"""
@@ -0,0 +1,37 @@
+"""DuckDB resource settings for large builds.
+
+``Resources`` collects the knobs that decide whether a full-history ABCD
+build fits a node: ``memory_limit`` (e.g. ``"12GB"``), ``threads``,
+``temp_directory`` (where DuckDB spills operators that exceed the limit) and
+``preserve_insertion_order`` (``False`` lets DuckDB stream results without
+buffering them for ordering).  Unset fields keep DuckDB's defaults.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import duckdb
+
+
+@dataclass
+class Resources:
+    memory_limit: Optional[str] = None
+    threads: Optional[int] = None
+    temp_directory: Optional[Path] = None
+    preserve_insertion_order: Optional[bool] = None
+
+    def apply(self, con: duckdb.DuckDBPyConnection) -> None:
+        """``SET`` every configured option on *con*; invalid values raise ``duckdb.Error``."""
+        if self.memory_limit:
+            con.execute("SET memory_limit = ?", [self.memory_limit])
+        if self.threads:
+            con.execute("SET threads = ?", [int(self.threads)])
+        if self.temp_directory:
+            Path(self.temp_directory).mkdir(parents=True, exist_ok=True)
+            con.execute("SET temp_directory = ?", [str(self.temp_directory)])
+        if self.preserve_insertion_order is not None:
+            con.execute(
+                "SET preserve_insertion_order = ?", [bool(self.preserve_insertion_order)]
+            )
@@ -0,0 +1,191 @@
+"""Case-version deduplication for FAERS quarterly data.
+
+Every quarter re-publishes follow-up versions of a case under a new
+PRIMARYID with the same CASEID.  Quarterly ingest keys reports on PRIMARYID,
+so without this stage each version counts as a separate report and inflates
+A and N.
+
+``case_versions`` maps every loaded PRIMARYID to its CASEID, CASEVERSION and
+FDA_DT, and records the winning PRIMARYID of each losing version in
+``superseded_by``.  The versions of each case are ranked with one window
+function:
+
+* ``apply_staged`` ranks the staged versions together with the stored
+  versions of the same cases, drops the staged losers before the load is
+  applied – they never reach the fact tables – and removes the stored
+  versions that now lose.  ``case_versions`` is rewritten in the load's
+  transaction, so a failed load leaves no versions behind that were never
+  loaded;
+* ``supersede`` runs a full pass over every case.
+
+Losing versions are removed from the fact tables with their cube
+contribution.  The set-based passes stay cheap on tens of millions of rows;
+what costs is deleting stored reports (their key index), which is why staged
+losers are dropped before they are inserted.
+
+Rules:
+
+  caseversion  highest CASEVERSION, then latest FDA_DT, then highest PRIMARYID
+  fda          latest FDA_DT, then highest PRIMARYID (FDA's recommendation)
+
+Incremental loads rank only the cases they touched, so a later quarter
+supersedes the earlier versions of its cases without a full pass.  Removed
+versions are gone from the fact tables: switching rules needs a full
+reload without dedup (``etl --full --dedup none``) followed by ``supersede``.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import duckdb
+
+from . import bulk_load, cube, generation
+
+_PRIMARYID_DESC = "TRY_CAST(primaryid AS BIGINT) DESC NULLS LAST, primaryid DESC"
+
+RULES: dict[str, str] = {
+    "caseversion": f"caseversion DESC NULLS LAST, fda_dt DESC NULLS LAST, {_PRIMARYID_DESC}",
+    "fda": f"fda_dt DESC NULLS LAST, {_PRIMARYID_DESC}",
+}
+DEFAULT_RULE = "caseversion"
+
+
+def _staged_versions(con: duckdb.DuckDBPyConnection) -> None:
+    # The last staged row per PRIMARYID wins, as in bulk_load.apply_staged
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _dedup_staged AS "
+        "SELECT safetyreportid AS primaryid, caseid, "
+        "TRY_CAST(caseversion AS INTEGER) AS caseversion, "
+        "TRY_CAST(receivedate AS DATE) AS fda_dt "
+        "FROM _bulk_reports WHERE COALESCE(caseid, '') <> '' "
+        "QUALIFY row_number() OVER (PARTITION BY safetyreportid ORDER BY seq DESC) = 1"
+    )
+
+
+def _rank(con: duckdb.DuckDBPyConnection, rule: str, versions: str) -> None:
+    """``_dedup_rank``: the *versions* relation with ``superseded_by`` set by *rule*."""
+    if rule not in RULES:
+        raise ValueError(f"Unknown dedup rule {rule!r}; use one of {', '.join(RULES)}")
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _dedup_rank AS "
+        "SELECT primaryid, caseid, caseversion, fda_dt, "
+        "CASE WHEN winner <> primaryid THEN winner END AS superseded_by FROM ("
+        "SELECT primaryid, caseid, caseversion, fda_dt, first_value(primaryid) OVER "
+        f"(PARTITION BY caseid ORDER BY {RULES[rule]}) AS winner FROM {versions})"
+    )
+
+
+def _remove_losers(con: duckdb.DuckDBPyConnection) -> int:
+    """Delete the stored reports that ``_dedup_rank`` marks as superseded."""
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _dedup_losers AS "
+        "SELECT k.primaryid AS safetyreportid FROM _dedup_rank k "
+        "JOIN reports r ON r.safetyreportid = k.primaryid "
+        "WHERE k.superseded_by IS NOT NULL"
+    )
+    try:
+        n = con.execute("SELECT COUNT(*) FROM _dedup_losers").fetchone()[0]
+        if not n:
+            return 0
+        con.execute("BEGIN TRANSACTION")
+        try:
+            cube.retract_table(con, "_dedup_losers")
+            for table in ("reaction_keys", "reactions", "drugs"):
+                con.execute(
+                    f"DELETE FROM {table} WHERE safetyreportid IN "
+                    "(SELECT safetyreportid FROM _dedup_losers)"
+                )
+            generation.bump(con)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        # Separate statement: DuckDB rejects deleting a referenced report in
+        # the transaction that deleted its drugs/reactions (see bulk_load)
+        con.execute(
+            "DELETE FROM reports WHERE safetyreportid IN "
+            "(SELECT safetyreportid FROM _dedup_losers)"
+        )
+        return int(n)
+    finally:
+        con.execute("DROP TABLE IF EXISTS _dedup_losers")
+
+
+def _replace_versions(con: duckdb.DuckDBPyConnection, where: str, source: str) -> None:
+    """Rewrite the ``case_versions`` rows matching *where* from *source*; no transaction."""
+    con.execute(f"DELETE FROM case_versions WHERE {where}")
+    con.execute(
+        "INSERT INTO case_versions (primaryid, caseid, caseversion, fda_dt, superseded_by) "
+        f"SELECT primaryid, caseid, caseversion, fda_dt, superseded_by FROM {source}"
+    )
+
+
+def apply_staged(con: duckdb.DuckDBPyConnection, *, rule: Optional[str]) -> int:
+    """``bulk_load.apply_staged`` with case-version deduplication.
+
+    ``_bulk_reports`` carries ``caseid`` and ``caseversion`` columns.  Only
+    the cases it touches are ranked, so a later quarter supersedes the
+    earlier versions of its cases without a full pass.  With *rule* ``None``
+    the versions are recorded and every one of them is loaded.
+    Returns the number of reports written (staged losers excluded).
+    """
+    _staged_versions(con)
+    try:
+        if rule is None:
+            return bulk_load.apply_staged(
+                con,
+                before_commit=lambda c: _replace_versions(
+                    c,
+                    "primaryid IN (SELECT primaryid FROM _dedup_staged)",
+                    "(SELECT *, CAST(NULL AS VARCHAR) AS superseded_by FROM _dedup_staged)",
+                ),
+            )
+        _rank(
+            con,
+            rule,
+            "(SELECT primaryid, caseid, caseversion, fda_dt FROM case_versions "
+            " WHERE caseid IN (SELECT caseid FROM _dedup_staged) "
+            " AND primaryid NOT IN (SELECT primaryid FROM _dedup_staged) "
+            " UNION ALL SELECT primaryid, caseid, caseversion, fda_dt FROM _dedup_staged)",
+        )
+        # Drugs/reactions are applied by joining on the staged reports' seq,
+        # so dropping a report from _bulk_reports drops its rows too
+        con.execute(
+            "DELETE FROM _bulk_reports WHERE safetyreportid IN "
+            "(SELECT primaryid FROM _dedup_rank WHERE superseded_by IS NOT NULL)"
+        )
+        n = bulk_load.apply_staged(
+            con,
+            before_commit=lambda c: _replace_versions(
+                c,
+                "caseid IN (SELECT caseid FROM _dedup_staged) "
+                "OR primaryid IN (SELECT primaryid FROM _dedup_staged)",
+                "_dedup_rank",
+            ),
+        )
+        _remove_losers(con)
+        return n
+    finally:
+        for name in ("_dedup_staged", "_dedup_rank"):
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+
+
+def supersede(con: duckdb.DuckDBPyConnection, *, rule: str = DEFAULT_RULE) -> dict[str, int]:
+    """Re-rank every case by *rule* and remove the losing stored reports.
+
+    Returns counts: ``cases`` ranked and ``superseded`` reports removed.
+    """
+    try:
+        _rank(con, rule, "case_versions")
+        con.execute("BEGIN TRANSACTION")
+        try:
+            _replace_versions(con, "true", "_dedup_rank")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        n_cases = con.execute("SELECT COUNT(DISTINCT caseid) FROM _dedup_rank").fetchone()[0]
+        n_losers = _remove_losers(con)
+    finally:
+        con.execute("DROP TABLE IF EXISTS _dedup_rank")
+    return {"cases": int(n_cases), "superseded": n_losers}
@@ -0,0 +1,42 @@
+"""Dictionary-encoded drug / PT dimensions and report surrogate keys.
+
+The fact tables keep their original VARCHAR columns for provenance; the
+compact integer keys are stored next to them or, for reports and reactions
+(whose column lists stay unchanged), in side tables:
+
+  report_keys(safetyreportid, report_key)         – surrogate for safetyreportid
+  drugs.report_key, drugs.drug_id                 – drug_id → drug_dim.drug
+  reaction_keys(safetyreportid, report_key, pt_id) – distinct PTs per report,
+                                                     pt_id → pt_dim.pt
+
+Reaction keys are derived per report: whoever deletes a report's reactions
+deletes its ``reaction_keys`` rows too, and the next ``encode`` re-derives
+them from the rows written afterwards.
+
+``drug_dim.drug`` holds the precomputed ABCD drug key
+(``COALESCE(drug_name_normalized, lower(drug_name))``) and ``pt_dim.pt`` holds
+``lower(meddra_pt)``, so aggregation never has to lower-case or compare long
+strings.
+"""
+from __future__ import annotations
+
+import duckdb
+
+from . import _resources
+
+
+def encode(con: duckdb.DuckDBPyConnection) -> None:
+    """Assign integer keys to every fact row that does not have one yet.
+
+    Ingest calls this after writing a batch; only the new rows are touched.
+    """
+    con.execute(_resources.get_sql("encode_dims.sql"))
+
+
+def reset_drug_keys(con: duckdb.DuckDBPyConnection, report_filter: str = "") -> None:
+    """Clear ``drugs.drug_id`` so the next ``encode`` re-derives it.
+
+    Needed whenever ``drug_name_normalized`` is rewritten in place.
+    """
+    where = f"WHERE {report_filter}" if report_filter else ""
+    con.execute(f"UPDATE drugs SET drug_id = NULL {where}")
@@ -2,19 +2,38 @@
 
 This module handles pagination, rate-limit retries, and search-query construction.
 It reuses the normalisation logic from ``ingest_openfda`` for consistency.
+
+Pages are fetched over a small pool of keep-alive connections with several
+``skip`` offsets in flight at once; a shared token bucket keeps the request
+rate within the openFDA budget (``requests_per_minute``).  Fetching, JSON
+decoding and inserting overlap (``pipeline.run_pipeline``); pages are
+ingested in offset order by the calling thread, the only DuckDB writer.
+
+A single query can only be paged to ``skip`` 25,000.  Larger downloads are
+sharded by receive date: ``count=receivedate`` gives reports per day, and
+``plan_windows`` bisects the range until every window fits.
 """
 from __future__ import annotations
 
-import time
+import http.client
 import json
-import urllib.request
-import urllib.error
+import os
+import queue
+import time
 import urllib.parse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
 from typing import Any, Callable, Optional
 
 import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
 
-from .ingest_openfda import _normalize_and_insert
+from .ingest_openfda import _apply, _to_tables
+from .page_cache import PageCache
+from .pipeline import Stage, run_pipeline
+from .ratelimit import TokenBucket
 
 
 _BASE_URL = "https://api.fda.gov/drug/event.json"
@@ -23,6 +42,21 @@ _BASE_URL = "https://api.fda.gov/drug/event.json"
 _MAX_LIMIT = 1000
 _MAX_SKIP = 25000
 
+# Request budget (requests per minute). openFDA allows 240/min per IP without
+# a key; pass a larger ``requests_per_minute`` when your key allows more.
+DEFAULT_REQUESTS_PER_MINUTE = 240
+DEFAULT_CONCURRENCY = 4
+
+_API_KEY_ENV = "OPENFDA_API_KEY"
+
+# Raised by http.client when a kept-alive connection was closed by the server
+_STALE_CONNECTION = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
 
 def _build_search_query(
     *,
@@ -46,26 +80,437 @@ def _build_search_query(
     return " AND ".join(parts) if parts else None
 
 
-def _fetch_page(url: str, *, retries: int = 3, backoff: float = 2.0) -> dict[str, Any]:
-    """Fetch a single API page with retry on 429 / 5xx."""
-    for attempt in range(retries):
+class _ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, shared by worker threads.
+
+    Idle connections are reused most-recently-first; a connection the server
+    has closed in the meantime is reopened once transparently.
+    """
+
+    def __init__(self, base_url: str, *, timeout: float = 30.0) -> None:
+        parts = urllib.parse.urlsplit(base_url)
+        self._cls = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self._netloc = parts.netloc
+        self._timeout = timeout
+        self._idle: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+        self.opened = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.opened += 1
+        return self._cls(self._netloc, timeout=self._timeout)
+
+    def request(self, target: str) -> tuple[int, http.client.HTTPMessage, bytes]:
+        """GET *target* (path and query); return status, headers and body."""
         try:
-            req = urllib.request.Request(url, headers={"Accept": "application/json"})
-            with urllib.request.urlopen(req, timeout=30) as resp:
-                data = resp.read()
-                return json.loads(data)
-        except urllib.error.HTTPError as e:
-            if e.code == 429 or e.code >= 500:
-                wait = backoff * (attempt + 1)
-                time.sleep(wait)
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        for attempt in range(2):
+            try:
+                conn.request("GET", target, headers={"Accept": "application/json"})
+                resp = conn.getresponse()
+                body = resp.read()
+            except _STALE_CONNECTION:
+                conn.close()
+                if attempt:
+                    raise
+                conn = self._connect()
                 continue
-            raise
-        except (urllib.error.URLError, OSError):
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return resp.status, resp.headers, body
+        raise AssertionError("unreachable")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class OpenFDAError(RuntimeError):
+    """A page could not be fetched (non-retryable status or retries exhausted)."""
+
+
+def _fetch_raw(
+    pool: _ConnectionPool,
+    target: str,
+    limiter: TokenBucket,
+    *,
+    retries: int = 3,
+    backoff: float = 2.0,
+) -> Optional[bytes]:
+    """Fetch a single API page body with retry on 429 / 5xx and connection errors.
+
+    A 404 is openFDA's answer for "no matches" and yields ``None``.
+    """
+    for attempt in range(retries):
+        limiter.acquire()
+        try:
+            status, headers, body = pool.request(target)
+        except OSError:
             if attempt < retries - 1:
                 time.sleep(backoff)
                 continue
             raise
-    raise RuntimeError(f"Failed to fetch {url} after {retries} retries")
+        if status == 200:
+            return body
+        if status == 404:
+            return None
+        if status == 429 or status >= 500:
+            retry_after = headers.get("Retry-After")
+            wait = float(retry_after) if retry_after and retry_after.isdigit() else 0.0
+            time.sleep(max(wait, backoff * (attempt + 1)))
+            continue
+        raise OpenFDAError(f"openFDA returned HTTP {status} for {target}")
+    raise OpenFDAError(f"Failed to fetch {target} after {retries} retries")
+
+
+def _fetch_page(
+    pool: _ConnectionPool,
+    target: str,
+    limiter: TokenBucket,
+    *,
+    retries: int = 3,
+    backoff: float = 2.0,
+) -> dict[str, Any]:
+    """``_fetch_raw`` decoded; a 404 yields an empty page."""
+    body = _fetch_raw(pool, target, limiter, retries=retries, backoff=backoff)
+    return json.loads(body) if body is not None else {"results": []}
+
+
+def _page_target(path: str, params: dict[str, str]) -> str:
+    return path + "?" + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+
+
+class _Session:
+    """Connection pool, rate limiter, API key and page cache shared by one run."""
+
+    def __init__(
+        self,
+        *,
+        api_key: str | None,
+        concurrency: int,
+        requests_per_minute: float,
+        cache: PageCache | None = None,
+        refresh: bool = False,
+    ) -> None:
+        api_key = api_key or os.environ.get(_API_KEY_ENV) or None
+        self.base = {"api_key": api_key} if api_key else {}
+        self.concurrency = max(1, concurrency)
+        self.path = urllib.parse.urlsplit(_BASE_URL).path
+        self.pool = _ConnectionPool(_BASE_URL)
+        self.limiter = TokenBucket(requests_per_minute / 60.0, burst=self.concurrency)
+        self.cache = cache
+        self.refresh = refresh
+
+    def get(self, params: dict[str, str]) -> dict[str, Any]:
+        target = _page_target(self.path, {**self.base, **params})
+        return _fetch_page(self.pool, target, self.limiter)
+
+    def _page_target(self, search: str | None, skip: int, limit: int) -> str:
+        params = {"limit": str(limit), "skip": str(skip)}
+        if search:
+            params["search"] = search
+        return _page_target(self.path, {**self.base, **params})
+
+    def page(self, search: str | None, skip: int, limit: int) -> dict[str, Any]:
+        return _fetch_page(self.pool, self._page_target(search, skip, limit), self.limiter)
+
+    def page_raw(self, search: str | None, skip: int, limit: int) -> Optional[bytes]:
+        return _fetch_raw(self.pool, self._page_target(search, skip, limit), self.limiter)
+
+    def cached(self, search: str | None, skip: int, limit: int) -> list[dict[str, Any]] | None:
+        """Results of a page from the cache (``None``: fetch it)."""
+        if self.cache is None or self.refresh:
+            return None
+        return self.cache.get(search, skip, limit)
+
+    def cached_total(self, search: str | None) -> int | None:
+        return self.cache.total(search) if self.cache is not None else None
+
+    def store(
+        self,
+        search: str | None,
+        skip: int,
+        limit: int,
+        results: list[dict[str, Any]],
+        total: int | None = None,
+    ) -> None:
+        if self.cache is None:
+            return
+        self.cache.put(search, skip, limit, results)
+        if total is not None:
+            self.cache.set_total(search, total)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+# (search query, skip, limit)
+_Page = tuple[Optional[str], int, int]
+
+
+_Tables = tuple[pa.Table, pa.Table, pa.Table]
+# (page, cached results, fetched body); exactly one of the last two is set,
+# apart from a 404 body (None)
+_Fetched = tuple[_Page, Optional[list[dict[str, Any]]], Optional[bytes]]
+
+# API-side failures: they end a download gracefully with the pages ingested
+# so far.  Errors of the writer (DuckDB) propagate.
+_FETCH_ERRORS = (OpenFDAError, OSError, http.client.HTTPException, ValueError)
+
+
+def _run_pages(
+    session: _Session,
+    pages: list[_Page],
+    on_page: Callable[[_Tables, int, int], bool],
+    *,
+    since: str | None,
+    until: str | None,
+) -> None:
+    """Fetch, decode and normalize *pages* concurrently; hand them over in order.
+
+    Three stages overlap: ``session.concurrency`` fetch threads (reading
+    cached pages from disk when possible), one thread decoding JSON, storing
+    fetched pages in the cache and building the Arrow tables, and the calling
+    thread (the only DuckDB writer) running ``on_page(tables, n_results,
+    requested_limit)``, which returns False to stop.  At most
+    ``2 * session.concurrency`` pages are in flight.  A failing page stops the
+    run gracefully.
+    """
+
+    def fetch(page: _Page) -> Optional[_Fetched]:
+        try:
+            results = session.cached(*page)
+            if results is not None:
+                return page, results, None
+            return page, None, session.page_raw(*page)
+        except _FETCH_ERRORS:
+            return None
+
+    def decode(item: Optional[_Fetched]) -> Optional[tuple[_Tables, int, int]]:
+        if item is None:
+            return None
+        page, results, body = item
+        if results is None:
+            try:
+                results = json.loads(body).get("results", []) if body is not None else []
+            except ValueError:
+                return None
+            session.store(*page, results)
+        return _to_tables(results, since=since, until=until), len(results), page[2]
+
+    def write(item: Optional[tuple[_Tables, int, int]]) -> bool:
+        # None marks a failed page: stop with the pages ingested so far
+        return item is not None and on_page(*item)
+
+    run_pipeline(
+        iter(pages),
+        [
+            Stage(fetch, workers=session.concurrency, name="fetch"),
+            Stage(decode, name="decode"),
+        ],
+        write,
+        window=2 * session.concurrency,
+    )
+
+
+def _page_offsets(search: str | None, n: int) -> list[_Page]:
+    """Pages covering the first *n* (<= 26,000) records of one query."""
+    n = min(n, _MAX_SKIP + _MAX_LIMIT)
+    return [(search, skip, min(_MAX_LIMIT, n - skip)) for skip in range(0, n, _MAX_LIMIT)]
+
+
+@dataclass
+class Window:
+    """A receivedate range (``YYYY-MM-DD``, inclusive) and its report count."""
+
+    since: str
+    until: str
+    count: int
+
+
+_FIRST_DATE = date(2004, 1, 1)
+# openFDA returns at most this many buckets per count request
+_MAX_COUNT_BUCKETS = 1000
+
+
+def _day(s: str) -> date:
+    return datetime.strptime(s.replace("-", "")[:8], "%Y%m%d").date()
+
+
+def _daily_counts(
+    session: _Session, drug: str | None, since: date, until: date
+) -> dict[date, int]:
+    """Reports per receivedate via ``count=receivedate``, bisecting truncated answers."""
+    q = _build_search_query(drug=drug, since=since.isoformat(), until=until.isoformat())
+    params = {"count": "receivedate", "limit": str(_MAX_COUNT_BUCKETS)}
+    if q:
+        params["search"] = q
+    rows = session.get(params).get("results", [])
+    if len(rows) >= _MAX_COUNT_BUCKETS and since < until:
+        mid = since + (until - since) // 2
+        return {
+            **_daily_counts(session, drug, since, mid),
+            **_daily_counts(session, drug, mid + timedelta(days=1), until),
+        }
+    counts: dict[date, int] = {}
+    for row in rows:
+        d = _day(str(row["time"]))
+        counts[d] = counts.get(d, 0) + int(row["count"])
+    return counts
+
+
+def plan_windows(counts: dict[date, int], cap: int | None = None) -> list[Window]:
+    """Split daily counts into date windows of at most *cap* reports each.
+
+    Windows over *cap* are bisected at the day where the cumulative count
+    reaches half, recursively.  A single day above *cap* cannot be split
+    further and keeps its full count (only *cap* of it can be fetched).
+    *cap* defaults to the 26,000 records one query can be paged through.
+    """
+    cap = cap if cap is not None else _MAX_SKIP + _MAX_LIMIT
+    days = sorted(d for d, n in counts.items() if n > 0)
+
+    def split(lo: int, hi: int) -> list[Window]:
+        total = sum(counts[d] for d in days[lo:hi])
+        if total <= cap or hi - lo == 1:
+            return [Window(days[lo].isoformat(), days[hi - 1].isoformat(), total)]
+        acc = 0
+        cut = lo + 1
+        for i in range(lo, hi - 1):
+            acc += counts[days[i]]
+            cut = i + 1
+            if acc * 2 >= total:
+                break
+        return split(lo, cut) + split(cut, hi)
+
+    return split(0, len(days)) if days else []
+
+
+def _drop_seen(tables: _Tables, seen: set[str]) -> _Tables:
+    """Remove reports already in *seen* (and their rows); add the rest to it."""
+    reports = tables[0]
+    keep = []
+    for seq, sid in zip(
+        reports["seq"].to_pylist(), reports["safetyreportid"].to_pylist()
+    ):
+        if sid not in seen:
+            seen.add(sid)
+            keep.append(seq)
+    if len(keep) == reports.num_rows:
+        return tables
+    value_set = pa.array(keep, pa.int64())
+    reports, drugs, reactions = (
+        t.filter(pc.is_in(t["seq"], value_set=value_set)) for t in tables
+    )
+    return reports, drugs, reactions
+
+
+def _fetch_sharded(
+    con: duckdb.DuckDBPyConnection,
+    session: _Session,
+    *,
+    drug: str | None,
+    since: str | None,
+    until: str | None,
+    max_records: int | None,
+    progress_callback: Optional[Callable[[int, int], None]],
+) -> int:
+    start = _day(since) if since else _FIRST_DATE
+    end = _day(until) if until else date.today()
+    try:
+        windows = plan_windows(_daily_counts(session, drug, start, end))
+    except _FETCH_ERRORS:
+        # Count request failed: nothing planned, stop gracefully
+        return 0
+
+    pages: list[_Page] = []
+    planned = 0
+    for w in windows:
+        n = min(w.count, _MAX_SKIP + _MAX_LIMIT)
+        if max_records is not None:
+            n = min(n, max_records - planned)
+        if n <= 0:
+            break
+        pages += _page_offsets(_build_search_query(drug=drug, since=w.since, until=w.until), n)
+        planned += n
+
+    seen: set[str] = set()
+    total_ingested = 0
+
+    def on_page(tables: _Tables, n_results: int, limit: int) -> bool:
+        nonlocal total_ingested
+        # Windows are disjoint, but records can shift between pages while a
+        # window is paged through; each report is ingested once
+        tables = _drop_seen(tables, seen)
+        total_ingested += tables[0].num_rows
+        _apply(con, tables)
+        if progress_callback:
+            progress_callback(total_ingested, planned)
+        return max_records is None or total_ingested < max_records
+
+    _run_pages(session, pages, on_page, since=since, until=until)
+    return total_ingested
+
+
+def _fetch_single(
+    con: duckdb.DuckDBPyConnection,
+    session: _Session,
+    *,
+    drug: str | None,
+    since: str | None,
+    until: str | None,
+    max_records: int,
+    progress_callback: Optional[Callable[[int, int], None]],
+) -> int:
+    """Page through one query (at most 26,000 records)."""
+    search_q = _build_search_query(drug=drug, since=since, until=until)
+    pages = _page_offsets(search_q, max_records)
+    total_ingested = 0
+
+    def on_page(tables: _Tables, n_results: int, limit: int) -> bool:
+        nonlocal total_ingested
+        if not n_results:
+            return False
+        _apply(con, tables)
+        total_ingested += tables[0].num_rows
+        if progress_callback:
+            progress_callback(total_ingested, max_records)
+        # If we got fewer than requested, no more pages
+        return n_results >= limit
+
+    # The first page tells how many records match; later offsets are only
+    # requested when they exist
+    results = session.cached(*pages[0])
+    available = session.cached_total(search_q) if results is not None else None
+    if results is None:
+        try:
+            first = session.page(*pages[0])
+        except _FETCH_ERRORS:
+            # API error, stop gracefully
+            return 0
+        results = first.get("results", [])
+        available = (first.get("meta") or {}).get("results", {}).get("total")
+        session.store(
+            *pages[0], results, total=available if isinstance(available, int) else None
+        )
+    tables = _to_tables(results, since=since, until=until)
+    if not on_page(tables, len(results), pages[0][2]):
+        return total_ingested
+    if isinstance(available, int):
+        pages = [p for p in pages if p[1] < available]
+    _run_pages(session, pages[1:], on_page, since=since, until=until)
+    return total_ingested
 
 
 def fetch_and_ingest(
@@ -74,8 +519,13 @@ def fetch_and_ingest(
     drug: str | None = None,
     since: str | None = None,
     until: str | None = None,
-    max_records: int = 5000,
+    max_records: int | None = 5000,
     progress_callback: Optional[Callable[[int, int], None]] = None,
+    api_key: str | None = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+    cache_dir: Path | None = None,
+    refresh: bool = False,
 ) -> int:
     """Fetch reports from openFDA API and insert into DuckDB.
 
@@ -84,58 +534,43 @@ def fetch_and_ingest(
         drug: Optional drug name filter (e.g. ``"aspirin"``).
         since: Optional start date ``YYYY-MM-DD``.
         until: Optional end date ``YYYY-MM-DD``.
-        max_records: Maximum number of reports to fetch.
-            Capped at (_MAX_SKIP + _MAX_LIMIT) = 26,000.
+        max_records: Maximum number of reports to fetch (``None`` = all).
+            Up to (_MAX_SKIP + _MAX_LIMIT) = 26,000 a single query is paged
+            through; above that the date range is split into windows that
+            each stay under the skip limit (see ``plan_windows``).
         progress_callback: ``callback(fetched_so_far, total_target)`` called after
-            each page for progress reporting.
+            each page for progress reporting; for sharded downloads the target
+            is the planned total from the ``count=receivedate`` answers.
+        api_key: openFDA API key (default: ``$OPENFDA_API_KEY``).
+        concurrency: Pages in flight at once (one keep-alive connection each).
+        requests_per_minute: Request budget shared by all connections.
+        cache_dir: Page cache directory (see ``page_cache``).  Every fetched
+            page is kept there; a rerun of the same query replays the cached
+            pages from disk and only requests the missing offsets, so an
+            interrupted download resumes where it stopped.
+        refresh: Ignore cached pages and fetch (and re-cache) everything.
 
     Returns:
         Total number of reports ingested.
     """
-    max_records = min(max_records, _MAX_SKIP + _MAX_LIMIT)
-
-    search_q = _build_search_query(drug=drug, since=since, until=until)
-
-    total_ingested = 0
-    skip = 0
-
-    while total_ingested < max_records and skip <= _MAX_SKIP:
-        page_limit = min(_MAX_LIMIT, max_records - total_ingested)
-
-        # Build URL
-        params: dict[str, str] = {"limit": str(page_limit), "skip": str(skip)}
-        if search_q:
-            params["search"] = search_q
-
-        url = _BASE_URL + "?" + urllib.parse.urlencode(
-            params, quote_via=urllib.parse.quote
-        )
-
-        try:
-            data = _fetch_page(url)
-        except Exception:
-            # API error, stop gracefully
-            break
-
-        results = data.get("results", [])
-        if not results:
-            break
-
-        # Insert into DB
-        count = _normalize_and_insert(
-            con, results, since=since, until=until, limit=0
+    if max_records is not None and max_records <= 0:
+        return 0
+    session = _Session(
+        api_key=api_key,
+        concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        cache=PageCache(cache_dir) if cache_dir is not None else None,
+        refresh=refresh,
+    )
+    try:
+        if max_records is None or max_records > _MAX_SKIP + _MAX_LIMIT:
+            return _fetch_sharded(
+                con, session, drug=drug, since=since, until=until,
+                max_records=max_records, progress_callback=progress_callback,
+            )
+        return _fetch_single(
+            con, session, drug=drug, since=since, until=until,
+            max_records=max_records, progress_callback=progress_callback,
         )
-        total_ingested += count
-
-        if progress_callback:
-            progress_callback(total_ingested, max_records)
-
-        # If we got fewer than requested, no more pages
-        if len(results) < page_limit:
-            break
-
-        skip += page_limit
-        # Small delay to be polite to the API
-        time.sleep(0.3)
-
-    return total_ingested
+    finally:
+        session.close()
@@ -0,0 +1,53 @@
+-- Dictionary-encode fact rows that do not have integer keys yet.
+--
+-- Idempotent: every statement only touches rows whose key is still missing,
+-- so after an ingest it only sees the rows just written. Drug keys are NULL
+-- columns of drugs (DuckDB skips row groups without NULLs using column
+-- statistics); report and reaction keys are rows of report_keys /
+-- reaction_keys, and a report whose reactions have no reaction_keys rows yet
+-- is encoded as a whole.
+
+-- Report surrogate keys
+INSERT INTO report_keys (safetyreportid, report_key)
+SELECT r.safetyreportid, nextval('report_key_seq')
+FROM reports r
+WHERE NOT EXISTS (SELECT 1 FROM report_keys k WHERE k.safetyreportid = r.safetyreportid);
+
+-- New drug keys (normalized name, falling back to lower(drug_name))
+INSERT INTO drug_dim (drug_id, drug)
+SELECT nextval('drug_id_seq'), n.drug
+FROM (
+  SELECT DISTINCT COALESCE(drug_name_normalized, lower(drug_name)) AS drug
+  FROM drugs
+  WHERE drug_id IS NULL
+) n
+WHERE n.drug IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM drug_dim d WHERE d.drug = n.drug);
+
+UPDATE drugs
+SET drug_id = d.drug_id, report_key = k.report_key
+FROM drug_dim d, report_keys k
+WHERE drugs.drug_id IS NULL
+  AND d.drug = COALESCE(drugs.drug_name_normalized, lower(drugs.drug_name))
+  AND k.safetyreportid = drugs.safetyreportid;
+
+-- Reactions of reports that have no reaction keys yet
+CREATE OR REPLACE TEMP TABLE _encode_rxn AS
+SELECT DISTINCT x.safetyreportid, lower(x.meddra_pt) AS pt
+FROM reactions x
+WHERE x.meddra_pt IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM reaction_keys k WHERE k.safetyreportid = x.safetyreportid);
+
+-- New PT keys
+INSERT INTO pt_dim (pt_id, pt)
+SELECT nextval('pt_id_seq'), n.pt
+FROM (SELECT DISTINCT pt FROM _encode_rxn) n
+WHERE NOT EXISTS (SELECT 1 FROM pt_dim p WHERE p.pt = n.pt);
+
+INSERT INTO reaction_keys (safetyreportid, report_key, pt_id)
+SELECT e.safetyreportid, k.report_key, p.pt_id
+FROM _encode_rxn e
+JOIN report_keys k USING (safetyreportid)
+JOIN pt_dim p USING (pt);
+
+DROP TABLE _encode_rxn;
@@ -0,0 +1,23 @@
+"""Generation counter of the fact tables.
+
+``db_generation`` holds a single row: a random ``db_id`` assigned when the
+schema is first created and a ``generation`` counter.  Every path that
+writes ``reports``, ``drugs`` or ``reactions`` (``bulk_load``, case-version
+dedup, the ingest ledger, re-normalization, the demo seed) calls ``bump``
+inside its transaction, so ``fingerprint`` identifies the data an analysis
+reads without scanning it.  Cached and stored results are checked against it.
+"""
+from __future__ import annotations
+
+import duckdb
+
+
+def bump(con: duckdb.DuckDBPyConnection) -> None:
+    """Record that the fact tables changed."""
+    con.execute("UPDATE db_generation SET generation = generation + 1")
+
+
+def fingerprint(con: duckdb.DuckDBPyConnection) -> str:
+    """``<db_id>:<generation>``; the ID keeps databases apart in a shared cache."""
+    db_id, gen = con.execute("SELECT db_id, generation FROM db_generation").fetchone()
+    return f"{db_id}:{gen}"
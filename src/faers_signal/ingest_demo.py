@@ -5,6 +5,8 @@ from datetime import date
 import duckdb
 import typer
 
+from . import cube, dims, generation
+
 
 def ingest_demo(
     con: duckdb.DuckDBPyConnection,
@@ -21,6 +23,7 @@ def ingest_demo(
         reset: If True, clears existing tables before inserting demo rows.
     """
     if reset:
+        con.execute("DELETE FROM reaction_keys;")
         con.execute("DELETE FROM reactions;")
         con.execute("DELETE FROM drugs;")
         con.execute("DELETE FROM reports;")
@@ -59,5 +62,11 @@ def ingest_demo(
         """
     )
 
+    # Raw DELETE/INSERT above bypass incremental maintenance
+    dims.encode(con)
+    if cube.is_built(con):
+        cube.rebuild(con)
+    generation.bump(con)
+
     typer.echo("Seeded demo dataset into reports/drugs/reactions.")
 
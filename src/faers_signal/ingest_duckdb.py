@@ -0,0 +1,411 @@
+"""SQL-native ingest engine (``etl --engine duckdb``).
+
+Instead of decoding rows in Python, the input files are handed to DuckDB's
+``read_json`` / ``read_csv`` readers and mapped into the schema with
+``INSERT ... SELECT``.  The mapped rows are staged as ``_bulk_reports`` /
+``_bulk_drugs`` / ``_bulk_reactions`` temp tables and applied through
+``bulk_load.apply_staged``, so upsert semantics, encoding and cube maintenance
+are identical to the Python engine.
+
+Zip archives cannot be read by DuckDB directly; their members are extracted
+to a temporary directory first.
+
+Differences from the Python engine:
+  - openFDA drug names are normalized from ``openfda.substance_name`` /
+    ``generic_name`` only; names without harmonized fields are stored as
+    ``lower(name)`` with source ``unmapped`` (no RxNorm lookups).
+  - Invalid dates become NULL instead of failing the batch.
+"""
+from __future__ import annotations
+
+import gzip
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import duckdb
+import typer
+
+from . import bulk_load, dedup
+from .ingest_openfda import _iter_sources, _open_source
+from .ingest_qfiles import _group_quarters, _iter_qsources
+
+
+# Fields of one openFDA event that the schema needs; everything else in the
+# documents is skipped by the reader.
+_DRUG_TYPE = (
+    "STRUCT(medicinalproduct VARCHAR, drugcharacterization VARCHAR, "
+    "openfda STRUCT(substance_name VARCHAR[], generic_name VARCHAR[]))"
+)
+_PATIENT_TYPE = f"STRUCT(drug {_DRUG_TYPE}[], reaction STRUCT(reactionmeddrapt VARCHAR)[])"
+_EVENT_FIELDS = {
+    "safetyreportid": "VARCHAR",
+    "safetyreportid_s": "VARCHAR",
+    "receivedate": "VARCHAR",
+    "receiptdate": "VARCHAR",
+    "primarysource": "STRUCT(qualifier VARCHAR)",
+    "patient": _PATIENT_TYPE,
+}
+_EVENT_TYPE = "STRUCT(" + ", ".join(f"{k} {v}" for k, v in _EVENT_FIELDS.items()) + ")"
+
+# read_json's default object size limit; raised to the largest input when
+# needed, because an openFDA partition is a single envelope object
+_MIN_OBJECT_SIZE = 16 * 1024 * 1024
+
+# Deflate expands data at most ~1032:1, so below this compressed size the
+# gzip ISIZE trailer (uncompressed size mod 4 GiB) cannot have wrapped
+_ISIZE_EXACT_BELOW = (1 << 32) // 1032
+
+# ingest_qfiles._role_to_int in SQL
+_ROLE_SQL = (
+    "CASE upper(trim({col})) WHEN 'PS' THEN 1 WHEN 'SS' THEN 1 "
+    "WHEN 'C' THEN 2 WHEN 'I' THEN 3 END"
+)
+
+
+def _openfda_date_sql(col: str) -> str:
+    """ingest_openfda._parse_date_yyyymmdd in SQL (returns 'YYYY-MM-DD' or NULL)."""
+    return (
+        f"CASE WHEN regexp_full_match({col}, '[0-9]{{8}}') "
+        f"THEN substr({col}, 1, 4) || '-' || substr({col}, 5, 2) || '-' || substr({col}, 7, 2) "
+        f"WHEN length({col}) >= 10 AND substr({col}, 5, 1) = '-' AND substr({col}, 8, 1) = '-' "
+        f"THEN substr({col}, 1, 10) END"
+    )
+
+
+def _qfiles_date_sql(col: str) -> str:
+    """ingest_qfiles._parse_date_yyyymmdd in SQL."""
+    s = f"replace(replace(trim({col}), '/', ''), '-', '')"
+    return (
+        f"CASE WHEN regexp_full_match({s}, '[0-9]{{8}}') "
+        f"THEN substr({s}, 1, 4) || '-' || substr({s}, 5, 2) || '-' || substr({s}, 7, 2) END"
+    )
+
+
+def _window_sql() -> str:
+    return (
+        "($since IS NULL OR rcv IS NULL OR rcv >= $since) "
+        "AND ($until IS NULL OR rcv IS NULL OR rcv <= $until)"
+    )
+
+
+def _readable_files(
+    sources: Iterator[tuple[Path, Optional[str]]], tmp: Path
+) -> list[str]:
+    """Return paths DuckDB can read, extracting zip members into *tmp*."""
+    files: list[str] = []
+    for i, (path, member) in enumerate(sources):
+        if member is None:
+            files.append(str(path))
+            continue
+        # Members are stored decompressed; drop a trailing .gz from the name
+        name = Path(member).name
+        if name.lower().endswith(".gz"):
+            name = name[:-3]
+        target = tmp / f"{i:06d}_{name}"
+        with _open_source(path, member) as src, target.open("wb") as dst:
+            shutil.copyfileobj(src, dst)
+        files.append(str(target))
+    return files
+
+
+def _uncompressed_size(path: str) -> int:
+    """File size, or the uncompressed size of a ``.gz`` file.
+
+    The ISIZE trailer is read when the file is too small to have passed
+    4 GiB; larger files are decompressed once to count their bytes.
+    """
+    p = Path(path)
+    size = p.stat().st_size
+    if p.suffix.lower() != ".gz":
+        return size
+    if size < _ISIZE_EXACT_BELOW:
+        with p.open("rb") as f:
+            f.seek(-4, 2)
+            return int.from_bytes(f.read(4), "little")
+    n = 0
+    with gzip.open(p, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            n += len(block)
+    return n
+
+
+def _max_object_size(files: list[str]) -> int:
+    return max([_MIN_OBJECT_SIZE] + [_uncompressed_size(f) + 1 for f in files])
+
+
+def _drop_bulk(con: duckdb.DuckDBPyConnection, *extra: str) -> None:
+    for name in ("_bulk_reports", "_bulk_drugs", "_bulk_reactions", *extra):
+        con.execute(f"DROP TABLE IF EXISTS {name}")
+
+
+def _stage_openfda(
+    con: duckdb.DuckDBPyConnection, files: list[str], params: dict[str, Any]
+) -> None:
+    columns = dict(_EVENT_FIELDS, results=f"{_EVENT_TYPE}[]")
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _sql_raw AS "
+        "SELECT * FROM read_json($files, columns = $columns, format = 'auto', "
+        f"maximum_object_size = {_max_object_size(files)})",
+        {"files": files, "columns": columns},
+    )
+    fields = ", ".join(_EVENT_FIELDS)
+    ev_fields = ", ".join(f"ev.{f}" for f in _EVENT_FIELDS)
+    sid = "trim(COALESCE(NULLIF(safetyreportid, ''), safetyreportid_s, ''))"
+    rcv = _openfda_date_sql("COALESCE(NULLIF(receivedate, ''), receiptdate)")
+    # rowid follows read order; envelope members keep their list position
+    con.execute(
+        f"""
+CREATE OR REPLACE TEMP TABLE _sql_events AS
+WITH ev AS (
+  SELECT doc, pos, {ev_fields}
+  FROM (
+    SELECT rowid AS doc, unnest(results) AS ev, generate_subscripts(results, 1) AS pos
+    FROM _sql_raw WHERE results IS NOT NULL
+  )
+  UNION ALL
+  SELECT rowid, 0, {fields} FROM _sql_raw WHERE results IS NULL
+),
+mapped AS (
+  SELECT doc, pos, {sid} AS safetyreportid, {rcv} AS rcv,
+         TRY_CAST(primarysource.qualifier AS INTEGER) AS primarysource_qualifier,
+         patient
+  FROM ev
+),
+accepted AS (
+  SELECT row_number() OVER (ORDER BY doc, pos) AS seq, *
+  FROM mapped
+  WHERE safetyreportid <> '' AND {_window_sql()}
+)
+SELECT * FROM accepted WHERE $limit = 0 OR seq <= $limit
+""",
+        params,
+    )
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _bulk_reports AS "
+        "SELECT seq, safetyreportid, rcv AS receivedate, primarysource_qualifier "
+        "FROM _sql_events"
+    )
+    harmonized = (
+        "COALESCE(NULLIF(lower(trim(d.openfda.substance_name[1])), ''), "
+        "NULLIF(lower(trim(d.openfda.generic_name[1])), ''))"
+    )
+    con.execute(
+        f"""
+CREATE OR REPLACE TEMP TABLE _bulk_drugs AS
+SELECT seq, safetyreportid, trim(d.medicinalproduct) AS drug_name,
+       COALESCE({harmonized}, lower(trim(d.medicinalproduct))) AS drug_name_normalized,
+       CASE WHEN {harmonized} IS NOT NULL THEN 'openfda_harmonized' ELSE 'unmapped' END
+         AS drug_norm_source,
+       TRY_CAST(d.drugcharacterization AS INTEGER) AS role
+FROM (SELECT seq, safetyreportid, unnest(patient.drug) AS d FROM _sql_events)
+WHERE trim(d.medicinalproduct) <> ''
+"""
+    )
+    con.execute(
+        """
+CREATE OR REPLACE TEMP TABLE _bulk_reactions AS
+SELECT seq, safetyreportid, trim(x.reactionmeddrapt) AS meddra_pt
+FROM (SELECT seq, safetyreportid, unnest(patient.reaction) AS x FROM _sql_events)
+WHERE trim(x.reactionmeddrapt) <> ''
+"""
+    )
+
+
+def ingest_openfda_sql(
+    con: duckdb.DuckDBPyConnection,
+    *,
+    input: Path,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = 0,
+) -> int:
+    """Ingest openFDA JSON / NDJSON (optionally gzip / zip) with ``read_json``.
+
+    Same inputs and filter semantics as ``ingest_openfda.ingest_openfda``.
+    Returns the number of accepted events.
+    """
+    params = {"since": since, "until": until, "limit": int(limit or 0)}
+    with tempfile.TemporaryDirectory(prefix="faers_sql_") as tmp:
+        files = _readable_files(_iter_sources(input), Path(tmp))
+        if not files:
+            return 0
+        try:
+            _stage_openfda(con, files, params)
+            total = con.execute("SELECT COUNT(*) FROM _bulk_reports").fetchone()[0]
+            if total:
+                bulk_load.apply_staged(con)
+        finally:
+            _drop_bulk(con, "_sql_raw", "_sql_events")
+    return int(total)
+
+
+def _csv_header(path: str) -> tuple[str, dict[str, str]]:
+    """Detect the delimiter like ``ingest_qfiles._iter_chunks``; map UPPER -> column name."""
+    with open(path, encoding="utf-8") as f:
+        first = f.readline().rstrip("\r\n")
+    sep = "|" if "|" in first else ("\t" if "\t" in first else ",")
+    return sep, {c.strip().upper(): c.strip() for c in first.split(sep)}
+
+
+def _pick(header: dict[str, str], *cands: str) -> str:
+    for c in cands:
+        if c in header:
+            return '"' + header[c].replace('"', '""') + '"'
+    raise KeyError(f"Missing columns among: {cands}")
+
+
+# Columns that may be missing from a file; they read as NULL
+_OPTIONAL = frozenset({"caseid", "caseversion"})
+
+
+def _csv_select(path: str, select: list[tuple[str, tuple[str, ...]]]) -> str:
+    """``SELECT`` of *path* (bound as ``$path``) projected onto the *select* columns."""
+    sep, header = _csv_header(path)
+
+    def pick(alias: str, cands: tuple[str, ...]) -> str:
+        if alias in _OPTIONAL and not any(c in header for c in cands):
+            return "NULL"
+        return _pick(header, *cands)
+
+    cols = ", ".join(f"{pick(alias, cands)} AS {alias}" for alias, cands in select)
+    return (
+        f"SELECT {cols} FROM read_csv($path, delim = '{sep}', header = true, "
+        f"all_varchar = true)"
+    )
+
+
+def _load_csvs(
+    con: duckdb.DuckDBPyConnection,
+    table: str,
+    files: list[str],
+    select: list[tuple[str, tuple[str, ...]]],
+) -> None:
+    """Append *files* to TEMP TABLE *table* one by one; rowid then follows read order."""
+    cols = ", ".join(f"{alias} VARCHAR" for alias, _ in select)
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {table} ({cols})")
+    for f in files:
+        con.execute(f"INSERT INTO {table} {_csv_select(f, select)}", {"path": f})
+
+
+_ID_COLS = ("PRIMARYID", "PRIMARY_ID", "SAFETYREPORTID")
+
+
+def _stage_qfiles(
+    con: duckdb.DuckDBPyConnection, files: dict[str, list[str]], params: dict[str, Any]
+) -> None:
+    _load_csvs(
+        con, "_sql_demo", files["DEMO"],
+        [
+            ("id", _ID_COLS),
+            ("dt", ("FDA_DT", "RECEIPTDATE", "RECEIVEDATE")),
+            ("caseid", ("CASEID", "CASE")),
+            ("caseversion", ("CASEVERSION",)),
+        ],
+    )
+    _load_csvs(
+        con, "_sql_drug", files["DRUG"],
+        [
+            ("id", _ID_COLS),
+            ("name", ("DRUGNAME", "MEDICINALPRODUCT", "DRUG_NAME")),
+            ("role", ("ROLE_COD", "DRUGCHARACTERIZATION", "ROLE")),
+        ],
+    )
+    _load_csvs(
+        con, "_sql_reac", files["REAC"],
+        [("id", _ID_COLS), ("pt", ("PT", "REACTIONMEDDRAPT", "MEDDRA_PT"))],
+    )
+    # Like the Python engine: IDs keep their first-seen order (for --limit) and
+    # the values of their last DEMO row that passes the date window
+    con.execute(
+        f"""
+CREATE OR REPLACE TEMP TABLE _bulk_reports AS
+WITH mapped AS (
+  SELECT rowid AS row_no, trim(id) AS safetyreportid, {_qfiles_date_sql('dt')} AS rcv,
+         trim(caseid) AS caseid, TRY_CAST(trim(caseversion) AS INTEGER) AS caseversion
+  FROM _sql_demo
+),
+per_id AS (
+  SELECT safetyreportid, min(row_no) AS first_seen, arg_max(rcv, row_no) AS receivedate,
+         arg_max(caseid, row_no) AS caseid, arg_max(caseversion, row_no) AS caseversion
+  FROM mapped
+  WHERE COALESCE(safetyreportid, '') <> '' AND {_window_sql()}
+  GROUP BY safetyreportid
+),
+ordered AS (
+  SELECT row_number() OVER (ORDER BY first_seen) AS seq, safetyreportid, receivedate,
+         caseid, caseversion
+  FROM per_id
+)
+SELECT seq, safetyreportid, receivedate, CAST(NULL AS INTEGER) AS primarysource_qualifier,
+       caseid, caseversion
+FROM ordered WHERE $limit = 0 OR seq <= $limit
+""",
+        params,
+    )
+    con.execute(
+        f"""
+CREATE OR REPLACE TEMP TABLE _bulk_drugs AS
+SELECT r.seq, r.safetyreportid, trim(d.name) AS drug_name,
+       CAST(NULL AS VARCHAR) AS drug_name_normalized,
+       CAST(NULL AS VARCHAR) AS drug_norm_source,
+       {_ROLE_SQL.format(col='d.role')} AS role
+FROM _sql_drug d
+JOIN _bulk_reports r ON r.safetyreportid = trim(d.id)
+WHERE trim(d.name) <> ''
+"""
+    )
+    con.execute(
+        """
+CREATE OR REPLACE TEMP TABLE _bulk_reactions AS
+SELECT r.seq, r.safetyreportid, trim(x.pt) AS meddra_pt
+FROM _sql_reac x
+JOIN _bulk_reports r ON r.safetyreportid = trim(x.id)
+WHERE trim(x.pt) <> ''
+"""
+    )
+
+
+def ingest_qfiles_sql(
+    con: duckdb.DuckDBPyConnection,
+    *,
+    input: Path,
+    since: str | None = None,
+    until: str | None = None,
+    limit: int = 0,
+    dedup_rule: Optional[str] = dedup.DEFAULT_RULE,
+) -> int:
+    """Ingest FAERS quarterly DEMO/DRUG/REAC files with ``read_csv``.
+
+    Same inputs, filter and case-version semantics as
+    ``ingest_qfiles.ingest_qfiles``.
+    Returns the number of ingested reports.
+    """
+    with tempfile.TemporaryDirectory(prefix="faers_sql_") as tmp:
+        files: dict[str, list[str]] = {"DEMO": [], "DRUG": [], "REAC": []}
+        quarters = _group_quarters(_iter_qsources(input)).values()
+        members = [(k, src) for group in quarters for k, srcs in group.items() for src in srcs]
+        for i, (kind, (path, member)) in enumerate(members):
+            if member is None:
+                files[kind].append(str(path))
+                continue
+            target = Path(tmp) / f"{i:06d}_{Path(member).name}"
+            with zipfile.ZipFile(path) as zf, zf.open(member) as src, target.open("wb") as dst:
+                shutil.copyfileobj(src, dst)
+            files[kind].append(str(target))
+        if not all(files.values()):
+            typer.echo("Expected DEMO/DRUG/REAC files were not all found.", err=True)
+            raise typer.Exit(code=2)
+
+        params: dict[str, Any] = {"since": since, "until": until, "limit": int(limit or 0)}
+        try:
+            _stage_qfiles(con, files, params)
+            total = 0
+            if con.execute("SELECT COUNT(*) FROM _bulk_reports").fetchone()[0]:
+                # Counted after dedup: staged losers are never written
+                total = dedup.apply_staged(con, rule=dedup_rule)
+        finally:
+            _drop_bulk(con, "_sql_demo", "_sql_drug", "_sql_reac")
+    return int(total)
@@ -1,14 +1,25 @@
 from __future__ import annotations
 
-import json
 import gzip
+import io
+import multiprocessing
 import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterable, Iterator, Any, Optional
+from typing import IO, Iterable, Iterator, Any, Optional
 
 import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
 import typer
 
+from . import bulk_load, json_stream
+from .ledger import Ledger, Source, source_key
+from .pipeline import Stage, run_pipeline
+from .normalize_drug import normalize_drug_name, resolve_rxnorm
+
 
 def _parse_date_yyyymmdd(s: str | None) -> Optional[str]:
     if not s:
@@ -23,54 +34,21 @@ def _parse_date_yyyymmdd(s: str | None) -> Optional[str]:
     return None
 
 
-def _iter_events_from_json_bytes(data: bytes) -> Iterator[dict[str, Any]]:
-    # Decode robustly (handle UTF-8 and UTF-8 with BOM). JSON spec mandates UTF-8.
-    try:
-        text = data.decode("utf-8")
-    except UnicodeDecodeError:
-        try:
-            text = data.decode("utf-8-sig")
-        except UnicodeDecodeError as e:
-            raise ValueError(f"Failed to decode JSON as UTF-8: {e}") from e
-    # Try parse as one JSON value
-    try:
-        obj = json.loads(text)
-        if isinstance(obj, dict) and "results" in obj and isinstance(obj["results"], list):
-            for ev in obj["results"]:
-                if isinstance(ev, dict):
-                    yield ev
-        elif isinstance(obj, list):
-            for ev in obj:
-                if isinstance(ev, dict):
-                    yield ev
-        elif isinstance(obj, dict):
-            yield obj
-        return
-    except json.JSONDecodeError:
-        pass
-    # Fallback: NDJSON / JSONL
-    for line in text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            obj = json.loads(line)
-        except json.JSONDecodeError:
-            continue
-        if isinstance(obj, dict) and "results" in obj and isinstance(obj["results"], list):
-            for ev in obj["results"]:
-                if isinstance(ev, dict):
-                    yield ev
-        elif isinstance(obj, dict):
-            yield obj
-
-
 _JSON_EXTS = {".json", ".jsonl", ".ndjson"}
 _GZ_EXTS = {".gz"}
+_GZ_MAGIC = b"\x1f\x8b"
+
 
+def _maybe_gunzip(f: IO[bytes]) -> IO[bytes]:
+    """Wrap *f* in a gzip reader if it starts with the gzip magic bytes."""
+    buffered = f if hasattr(f, "peek") else io.BufferedReader(f)  # type: ignore[arg-type]
+    if buffered.peek(2)[:2] == _GZ_MAGIC:
+        return gzip.GzipFile(fileobj=buffered, mode="rb")
+    return buffered
 
-def _iter_files(input_path: Path) -> Iterator[tuple[str, bytes]]:
-    """Yield (name, bytes) for JSON/NDJSON files inside a file or directory.
+
+def _iter_sources(input_path: Path) -> Iterator[tuple[Path, Optional[str]]]:
+    """Yield (file, zip member or None) for every JSON/NDJSON source under *input_path*.
 
     - Supports plain `.json`/`.jsonl`/`.ndjson`
     - Supports gzip variants `*.json.gz`, `*.jsonl.gz`, `*.ndjson.gz`
@@ -80,14 +58,11 @@ def _iter_files(input_path: Path) -> Iterator[tuple[str, bytes]]:
     if input_path.is_dir():
         for p in input_path.rglob("*"):
             if p.is_file():
-                yield from _iter_files(p)
+                yield from _iter_sources(p)
         return
 
     suffixes = [s.lower() for s in input_path.suffixes]
-    name = input_path.name
-
     has_jsonlike = any(s in _JSON_EXTS for s in suffixes)
-    has_gz = any(s in _GZ_EXTS for s in suffixes)
     has_zip = ".zip" in suffixes or input_path.suffix.lower() == ".zip"
 
     # Handle .zip archives first (including *.json.zip)
@@ -96,120 +71,318 @@ def _iter_files(input_path: Path) -> Iterator[tuple[str, bytes]]:
             for info in zf.infolist():
                 if info.is_dir():
                     continue
-                inner_name = info.filename
-                inner_suffixes = [s.lower() for s in Path(inner_name).suffixes]
-                if not any(s in _JSON_EXTS for s in inner_suffixes):
-                    continue
-                with zf.open(info, "r") as f:
-                    raw = f.read()
-                # Handle gz members if present
-                if any(s in _GZ_EXTS for s in inner_suffixes):
-                    try:
-                        raw = gzip.decompress(raw)
-                    except OSError:
-                        # Not a valid gzip member despite extension; fall back to raw
-                        pass
-                yield inner_name, raw
+                inner_suffixes = [s.lower() for s in Path(info.filename).suffixes]
+                if any(s in _JSON_EXTS for s in inner_suffixes):
+                    yield input_path, info.filename
+        return
+
+    if has_jsonlike:
+        yield input_path, None
+
+
+@contextmanager
+def _open_source(path: Path, member: Optional[str]) -> Iterator[IO[bytes]]:
+    """Open one source from ``_iter_sources`` as a decompressed binary stream."""
+    if member is not None:
+        with zipfile.ZipFile(path) as zf, zf.open(member, "r") as f:
+            # gz members are detected by content; a member that only
+            # claims to be gzip is read as-is
+            if any(s.lower() in _GZ_EXTS for s in Path(member).suffixes):
+                yield _maybe_gunzip(f)
+            else:
+                yield f
         return
 
     # Handle gzip-compressed JSON (e.g., *.json.gz)
-    if has_jsonlike and has_gz:
-        with gzip.open(input_path, "rb") as f:
-            data = f.read()
-        yield name, data
+    if any(s.lower() in _GZ_EXTS for s in path.suffixes):
+        with gzip.open(path, "rb") as f:
+            yield f
         return
 
     # Handle plain JSON/NDJSON
-    if has_jsonlike:
-        data = input_path.read_bytes()
-        yield name, data
-        return
+    with path.open("rb") as f:
+        yield f
 
 
-def _normalize_and_insert(
-    con: duckdb.DuckDBPyConnection,
-    events: Iterable[dict[str, Any]],
+def _pending_sources(input_path: Path, ledger: Optional[Ledger]) -> list[Source]:
+    """Sources under *input_path*, minus those the ledger knows to be unchanged."""
+    sources = list(_iter_sources(input_path))
+    if ledger is None:
+        return sources
+    return [s for s in sources if not ledger.is_current(source_key(*s), [s])]
+
+
+def _event_into_batch(
+    batch: bulk_load.ReportBatch,
+    ev: dict[str, Any],
     *,
     since: Optional[str],
     until: Optional[str],
-    limit: int,
-) -> int:
-    count = 0
-    for ev in events:
-        sid = str(ev.get("safetyreportid") or ev.get("safetyreportid_s", "")).strip()
-        if not sid:
-            continue
-        # Dates: prefer receivedate, fallback to receiptdate
-        rcv = _parse_date_yyyymmdd(ev.get("receivedate") or ev.get("receiptdate"))
-        if since and rcv and rcv < since:
+) -> bool:
+    """Append one openFDA event to *batch*; return False if it was filtered out."""
+    sid = str(ev.get("safetyreportid") or ev.get("safetyreportid_s", "")).strip()
+    if not sid:
+        return False
+    # Dates: prefer receivedate, fallback to receiptdate
+    rcv = _parse_date_yyyymmdd(ev.get("receivedate") or ev.get("receiptdate"))
+    if since and rcv and rcv < since:
+        return False
+    if until and rcv and rcv > until:
+        return False
+
+    primary_qual = None
+    ps = ev.get("primarysource") or {}
+    if isinstance(ps, dict):
+        pq = ps.get("qualifier")
+        try:
+            primary_qual = int(pq) if pq is not None else None
+        except (TypeError, ValueError):
+            primary_qual = None
+
+    seq = batch.add_report(sid, rcv, primary_qual)
+
+    patient = ev.get("patient") or {}
+    # drugs
+    for d in patient.get("drug", []) or []:
+        if not isinstance(d, dict):
             continue
-        if until and rcv and rcv > until:
+        name = d.get("medicinalproduct")
+        if not name:
             continue
+        name = str(name).strip()
+        role = d.get("drugcharacterization")
+        try:
+            role_i = int(role) if role is not None else None
+        except (TypeError, ValueError):
+            role_i = None
 
-        primary_qual = None
-        ps = ev.get("primarysource") or {}
-        if isinstance(ps, dict):
-            pq = ps.get("qualifier")
-            try:
-                primary_qual = int(pq) if pq is not None else None
-            except (TypeError, ValueError):
-                primary_qual = None
-
-        # Idempotent upsert: delete existing rows for this report ID
-        con.execute("DELETE FROM reactions WHERE safetyreportid = ?", [sid])
-        con.execute("DELETE FROM drugs WHERE safetyreportid = ?", [sid])
-        con.execute("DELETE FROM reports WHERE safetyreportid = ?", [sid])
-
-        con.execute(
-            "INSERT INTO reports (safetyreportid, receivedate, primarysource_qualifier) VALUES (?, ?, ?)",
-            [sid, rcv, primary_qual],
+        # Drug name normalization (RxNorm runs later, once per batch)
+        norm_name, norm_source = normalize_drug_name(
+            name, drug_dict=d, use_rxnorm_api=False,
         )
+        batch.add_drug(seq, name, norm_name, norm_source, role_i)
 
-        patient = ev.get("patient") or {}
-        # drugs
-        for d in patient.get("drug", []) or []:
-            if not isinstance(d, dict):
-                continue
-            name = d.get("medicinalproduct")
-            if not name:
-                continue
-            name = str(name).strip()
-            role = d.get("drugcharacterization")
-            try:
-                role_i = int(role) if role is not None else None
-            except (TypeError, ValueError):
-                role_i = None
-
-            # Drug name normalization
-            from .normalize_drug import normalize_drug_name
-            norm_name, norm_source = normalize_drug_name(
-                name, drug_dict=d, use_rxnorm_api=True,
-            )
-
-            con.execute(
-                "INSERT INTO drugs (safetyreportid, drug_name, drug_name_normalized, drug_norm_source, role) "
-                "VALUES (?, ?, ?, ?, ?)",
-                [sid, name, norm_name, norm_source, role_i],
-            )
-
-        # reactions
-        for rx in patient.get("reaction", []) or []:
-            if not isinstance(rx, dict):
-                continue
-            pt = rx.get("reactionmeddrapt")
-            if not pt:
+    # reactions
+    for rx in patient.get("reaction", []) or []:
+        if not isinstance(rx, dict):
+            continue
+        pt = rx.get("reactionmeddrapt")
+        if not pt:
+            continue
+        batch.add_reaction(seq, str(pt).strip())
+    return True
+
+
+def _resolve_unmapped(
+    drugs: pa.Table, con: Optional[duckdb.DuckDBPyConnection] = None
+) -> pa.Table:
+    """RxNorm stage: resolve the batch's distinct unmapped names, then remap in bulk."""
+    unmapped = pc.equal(drugs["drug_norm_source"], "unmapped")
+    keys = pc.utf8_lower(pc.utf8_trim_whitespace(drugs["drug_name"]))
+    names = pc.unique(pc.filter(keys, unmapped)).to_pylist()
+    if not names:
+        return drugs
+    hits = {k: v for k, v in resolve_rxnorm(names, con=con).items() if v[0]}
+    if not hits:
+        return drugs
+    idx = pc.index_in(keys, value_set=pa.array(list(hits), pa.string()))
+    use = pc.and_(unmapped, pc.is_valid(idx))
+    resolved = pc.take(pa.array([v[0] for v in hits.values()], pa.string()), idx)
+    sources = pc.take(pa.array([v[1] for v in hits.values()], pa.string()), idx)
+    drugs = drugs.set_column(
+        drugs.schema.get_field_index("drug_name_normalized"),
+        "drug_name_normalized",
+        pc.if_else(use, resolved, drugs["drug_name_normalized"]),
+    )
+    return drugs.set_column(
+        drugs.schema.get_field_index("drug_norm_source"),
+        "drug_norm_source",
+        pc.if_else(use, sources, drugs["drug_norm_source"]),
+    )
+
+
+def _apply(
+    con: duckdb.DuckDBPyConnection, tables: tuple[pa.Table, pa.Table, pa.Table]
+) -> int:
+    reports, drugs, reactions = tables
+    return bulk_load.apply_tables(con, reports, _resolve_unmapped(drugs, con), reactions)
+
+
+def _to_tables(
+    events: Iterable[dict[str, Any]], *, since: Optional[str], until: Optional[str]
+) -> tuple[pa.Table, pa.Table, pa.Table]:
+    """Normalize *events* into one columnar batch (no RxNorm, no database access)."""
+    batch = bulk_load.ReportBatch()
+    for ev in events:
+        _event_into_batch(batch, ev, since=since, until=until)
+    return batch.to_arrow()
+
+
+# Events per chunk handed from the reader thread to the normalizer, and
+# chunks in flight between reader and writer
+_CHUNK_EVENTS = 5_000
+_PIPELINE_WINDOW = 4
+
+
+def _iter_event_chunks(
+    sources: list[Source], size: int
+) -> Iterator[tuple[Source, list[dict[str, Any]], bool]]:
+    """Yield ``(source, events, last)``; every source ends with a ``last`` chunk."""
+    for src in sources:
+        chunk: list[dict[str, Any]] = []
+        with _open_source(*src) as stream:
+            for ev in json_stream.iter_events(stream):
+                chunk.append(ev)
+                if len(chunk) >= size:
+                    yield src, chunk, False
+                    chunk = []
+        yield src, chunk, True
+
+
+def _ingest_pipelined(
+    con: duckdb.DuckDBPyConnection,
+    input: Path,
+    *,
+    since: Optional[str],
+    until: Optional[str],
+    limit: int,
+    ledger: Optional[Ledger] = None,
+    batch_size: int = bulk_load.DEFAULT_BATCH_SIZE,
+) -> int:
+    """Read, normalize and write concurrently in one process.
+
+    A reader thread decompresses and decodes the input into chunks of
+    events, a normalizer thread turns each chunk into Arrow tables, and this
+    thread – the only DuckDB writer – applies them in input order, merged
+    into batches of about *batch_size* reports.  At most
+    ``_PIPELINE_WINDOW`` chunks are in flight, so a slow writer throttles
+    the reader.  With a *ledger*, each source is recorded once all of its
+    reports are written.
+    """
+    total = 0
+    buffered: list[tuple[pa.Table, pa.Table, pa.Table]] = []
+    n_buffered = 0
+    produced: dict[Source, list[str]] = {}
+    finished: list[Source] = []
+
+    def flush() -> None:
+        nonlocal buffered, n_buffered
+        if buffered:
+            _apply(con, bulk_load.concat(buffered))
+        buffered, n_buffered = [], 0
+        if ledger is not None:
+            for src in finished:
+                ledger.record(source_key(*src), [src], produced.pop(src))
+        finished.clear()
+
+    def write(item: tuple[Source, tuple[pa.Table, pa.Table, pa.Table], bool]) -> bool:
+        nonlocal total, n_buffered
+        src, tables, last = item
+        n = tables[0].num_rows
+        if limit and total + n > limit:
+            tables = bulk_load.head(tables, limit - total)
+            n = limit - total
+        if n:
+            buffered.append(tables)
+            n_buffered += n
+            total += n
+        if ledger is not None:
+            produced.setdefault(src, []).extend(tables[0]["safetyreportid"].to_pylist())
+            if last:
+                finished.append(src)
+        if n_buffered >= batch_size:
+            flush()
+        return not (limit and total >= limit)
+
+    def normalize(
+        item: tuple[Source, list[dict[str, Any]], bool],
+    ) -> tuple[Source, tuple[pa.Table, pa.Table, pa.Table], bool]:
+        src, events, last = item
+        return src, _to_tables(events, since=since, until=until), last
+
+    run_pipeline(
+        _iter_event_chunks(_pending_sources(input, ledger), _CHUNK_EVENTS),
+        [Stage(normalize, name="normalize")],
+        write,
+        window=_PIPELINE_WINDOW,
+    )
+    flush()
+    return total
+
+
+def _parse_source(
+    path: Path,
+    member: Optional[str],
+    since: Optional[str],
+    until: Optional[str],
+    batch_size: int,
+) -> list[tuple[pa.Table, pa.Table, pa.Table]]:
+    """Parse and normalize one source into columnar batches (runs in a worker process)."""
+    out = []
+    batch = bulk_load.ReportBatch()
+    with _open_source(path, member) as f:
+        for ev in json_stream.iter_events(f):
+            if not _event_into_batch(batch, ev, since=since, until=until):
                 continue
-            pt = str(pt).strip()
-            con.execute(
-                "INSERT INTO reactions (safetyreportid, meddra_pt) VALUES (?, ?)",
-                [sid, pt],
-            )
+            if len(batch) >= batch_size:
+                out.append(batch.to_arrow())
+                batch = bulk_load.ReportBatch()
+    if len(batch):
+        out.append(batch.to_arrow())
+    return out
+
 
-        count += 1
-        if limit and count >= limit:
-            break
+def _ingest_parallel(
+    con: duckdb.DuckDBPyConnection,
+    input: Path,
+    *,
+    since: Optional[str],
+    until: Optional[str],
+    limit: int,
+    workers: int,
+    ledger: Optional[Ledger] = None,
+    batch_size: int = bulk_load.DEFAULT_BATCH_SIZE,
+) -> int:
+    """Parse sources in *workers* processes; apply their batches here, in input order.
 
-    return count
+    At most ``2 * workers`` sources are in flight, so finished batches waiting
+    for an earlier, slower source cannot pile up without bound.  ``limit``
+    counts accepted events in input order, exactly as the sequential path does.
+    """
+    total = 0
+    sources = iter(_pending_sources(input, ledger))
+    pending: deque[tuple[Source, Future]] = deque()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+
+        def submit_next() -> None:
+            src = next(sources, None)
+            if src is not None:
+                pending.append(
+                    (src, pool.submit(_parse_source, *src, since, until, batch_size))
+                )
+
+        for _ in range(2 * workers):
+            submit_next()
+        while pending:
+            src, fut = pending.popleft()
+            produced: list[str] = []
+            for tables in fut.result():
+                n = tables[0].num_rows
+                if limit and total + n > limit:
+                    tables = bulk_load.head(tables, limit - total)
+                    n = limit - total
+                _apply(con, tables)
+                total += n
+                if limit and total >= limit:
+                    for _, rest in pending:
+                        rest.cancel()
+                    return total
+                produced += tables[0]["safetyreportid"].to_pylist()
+            if ledger is not None:
+                ledger.record(source_key(*src), [src], produced)
+            submit_next()
+    return total
 
 
 def ingest_openfda(
@@ -219,6 +392,8 @@ def ingest_openfda(
     since: str | None = None,
     until: str | None = None,
     limit: int = 0,
+    workers: int = 1,
+    incremental: bool = True,
 ) -> None:
     """Ingest openFDA drug event JSON (local files) into DuckDB.
 
@@ -233,6 +408,13 @@ def ingest_openfda(
       since: Inclusive lower bound on receivedate (YYYY-MM-DD).
       until: Inclusive upper bound on receivedate (YYYY-MM-DD).
       limit: Optional max number of reports to ingest (0 = no limit).
+      workers: Number of parser processes; with more than one, sources (files
+        or zip members) are parsed in parallel and written by this process
+        in input order.  With one, reading, normalizing and writing still
+        overlap on threads (``_ingest_pipelined``).
+      incremental: Skip sources the ``ingest_ledger`` records as unchanged and
+        record the ones ingested (full loads only: ignored with
+        since/until/limit).
     """
     if input is None:
         typer.echo("--input is required for openfda ingest (path to json/zip)", err=True)
@@ -242,18 +424,18 @@ def ingest_openfda(
         typer.echo(f"Input not found: {input}", err=True)
         raise typer.Exit(code=2)
 
-    total = 0
+    ledger = None
+    if incremental and not (since or until or limit):
+        ledger = Ledger(con, "openfda")
+
     # Do not manage/close the caller-owned connection here.
-    for _, raw in _iter_files(input):
-        events = _iter_events_from_json_bytes(raw)
-        total += _normalize_and_insert(
-            con,
-            events,
-            since=since,
-            until=until,
-            limit=0 if not limit else max(0, limit - total),
+    if workers > 1:
+        total = _ingest_parallel(
+            con, input, since=since, until=until, limit=limit, workers=workers, ledger=ledger
         )
-        if limit and total >= limit:
-            break
-
-    typer.echo(f"Ingested {total} reports from {input}")
+    else:
+        total = _ingest_pipelined(
+            con, input, since=since, until=until, limit=limit, ledger=ledger
+        )
+    skipped = f" ({ledger.skipped} unchanged sources skipped)" if ledger and ledger.skipped else ""
+    typer.echo(f"Ingested {total} reports from {input}{skipped}")
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
 import io
+import re
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import IO, Iterable, Iterator, Optional
 
 import duckdb
 import pandas as pd
 import typer
 
+from . import dedup
+from .ledger import Ledger, source_key
+
+
+# Rows per CSV chunk; bounds Python-side memory independently of file size
+DEFAULT_CHUNK_ROWS = 200_000
+
 
 def _parse_date_yyyymmdd(s: str | None) -> Optional[str]:
     if not s:
@@ -24,53 +33,40 @@ def _parse_date_yyyymmdd(s: str | None) -> Optional[str]:
     return None
 
 
-def _read_table_from_bytes(name: str, data: bytes) -> pd.DataFrame:
-    """Read a small FAERS quarterly table from bytes.
+def _parse_dates(s: pd.Series) -> pd.Series:
+    """Vectorized ``_parse_date_yyyymmdd`` ('YYYY-MM-DD' or None)."""
+    digits = s.fillna("").astype(str).str.strip().str.replace("[/-]", "", regex=True)
+    ok = digits.str.fullmatch(r"\d{8}")
+    iso = digits.str[0:4] + "-" + digits.str[4:6] + "-" + digits.str[6:8]
+    return iso.where(ok, None)
 
-    Supports common delimiters: '|', tab, or comma. Assumes UTF-8.
-    Returns a DataFrame with uppercased column names for consistent access.
-    """
-    text = data.decode("utf-8")
-    # detect delimiter
-    if "|" in text.splitlines()[0]:
-        sep = "|"
-    elif "\t" in text.splitlines()[0]:
-        sep = "\t"
-    else:
-        sep = ","
-    df = pd.read_csv(io.StringIO(text), sep=sep, dtype=str)
-    df.columns = [c.upper() for c in df.columns]
-    return df
-
-
-def _iter_qfiles(input_path: Path):
-    """Yield (logical_name, DataFrame) for DEMO/DRUG/REAC tables.
-
-    - If `input_path` is a zip, extracts matching members.
-    - If a directory, recursively loads matching files.
+
+_KINDS = ("DEMO", "DRUG", "REAC")
+
+
+def _classify(p: str) -> str | None:
+    """Return DEMO/DRUG/REAC for a quarterly file name, or None."""
+    up = p.upper()
+    for key in _KINDS:
+        if key in up:
+            return key
+    return None
+
+
+def _iter_qsources(input_path: Path) -> Iterator[tuple[str, Path, Optional[str]]]:
+    """Yield (kind, file, zip member or None) for DEMO/DRUG/REAC tables.
+
+    - If `input_path` is a zip, yields its matching members.
+    - If a directory, recursively yields matching files.
     - If a single file, tries to classify by filename.
     """
-    patterns = {
-        "DEMO": ("DEMO", "DEMO"),
-        "DRUG": ("DRUG", "DRUG"),
-        "REAC": ("REAC", "REAC"),
-    }
-
-    def classify(p: str) -> str | None:
-        up = p.upper()
-        for key in patterns:
-            if key in up:
-                return key
-        return None
-
     if input_path.is_dir():
         for p in input_path.rglob("*"):
             if not p.is_file():
                 continue
-            kind = classify(p.name)
-            if not kind:
-                continue
-            yield kind, _read_table_from_bytes(p.name, p.read_bytes())
+            kind = _classify(p.name)
+            if kind:
+                yield kind, p, None
         return
 
     if input_path.suffix.lower() == ".zip":
@@ -78,32 +74,279 @@ def _iter_qfiles(input_path: Path):
             for info in zf.infolist():
                 if info.is_dir():
                     continue
-                kind = classify(info.filename)
-                if not kind:
-                    continue
-                with zf.open(info, "r") as f:
-                    data = f.read()
-                yield kind, _read_table_from_bytes(info.filename, data)
+                kind = _classify(info.filename)
+                if kind:
+                    yield kind, input_path, info.filename
         return
 
     # single file
-    kind = classify(input_path.name)
+    kind = _classify(input_path.name)
     if kind:
-        yield kind, _read_table_from_bytes(input_path.name, input_path.read_bytes())
+        yield kind, input_path, None
+
+
+@contextmanager
+def _open_qsource(path: Path, member: Optional[str]) -> Iterator[IO[bytes]]:
+    if member is None:
+        with path.open("rb") as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as zf, zf.open(member, "r") as f:
+        yield f
+
+
+def _iter_chunks(
+    path: Path, member: Optional[str], chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Stream one FAERS quarterly table as DataFrame chunks.
+
+    Supports common delimiters: '|', tab, or comma (detected from the header
+    line). Assumes UTF-8. Column names are uppercased for consistent access.
+    """
+    with _open_qsource(path, member) as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        header = text.readline().rstrip("\r\n")
+        if "|" in header:
+            sep = "|"
+        elif "\t" in header:
+            sep = "\t"
+        else:
+            sep = ","
+        names = [c.strip().upper() for c in header.split(sep)]
+        yield from pd.read_csv(
+            text, sep=sep, names=names, header=None, dtype=str,
+            keep_default_na=False, chunksize=chunk_rows,
+        )
+
+
+# FAERS role codes: PS/SS -> 1 (suspect), C -> 2, I -> 3
+_ROLE_CODES = {"PS": 1, "SS": 1, "C": 2, "I": 3}
 
 
 def _role_to_int(role_cod: str | None) -> Optional[int]:
     if not role_cod:
         return None
-    r = role_cod.strip().upper()
-    # Map FAERS role codes to integers: PS/SS -> 1 (suspect), C -> 2, I -> 3
-    if r in ("PS", "SS"):
-        return 1
-    if r == "C":
-        return 2
-    if r == "I":
-        return 3
-    return None
+    return _ROLE_CODES.get(role_cod.strip().upper())
+
+
+def _col(df: pd.DataFrame, *cands: str) -> str:
+    """Pick the first candidate column present (robust to small naming variants)."""
+    up = set(df.columns)
+    for c in cands:
+        cu = c.upper()
+        if cu in up:
+            return cu
+    raise KeyError(f"Missing columns among: {cands}")
+
+
+def _opt_values(df: pd.DataFrame, *cands: str) -> pd.Series:
+    """Stripped values of the first candidate column, or all-empty when none exists."""
+    try:
+        return df[_col(df, *cands)].fillna("").astype(str).str.strip()
+    except KeyError:
+        return pd.Series("", index=df.index)
+
+
+_ID_COLS = ("PRIMARYID", "PRIMARY_ID", "SAFETYREPORTID")
+# Case identity for version deduplication (see dedup.py); legacy AERS uses CASE
+_CASE_COLS = ("CASEID", "CASE")
+_VERSION_COLS = ("CASEVERSION",)
+
+
+def _select_reports(
+    chunks: Iterator[pd.DataFrame], *, since: str | None, until: str | None, limit: int
+) -> pd.DataFrame:
+    """Reduce DEMO chunks to one row per report passing the date window.
+
+    Report IDs keep their first-seen order (``limit`` takes the first IDs);
+    the receive date, CASEID and CASEVERSION come from the last matching
+    DEMO row of each ID.
+    """
+    parts = []
+    offset = 0
+    for df in chunks:
+        sid = df[_col(df, *_ID_COLS)].fillna("").astype(str).str.strip()
+        dt_col = _col(df, "FDA_DT", "RECEIPTDATE", "RECEIVEDATE")
+        rcv = _parse_dates(df[dt_col])
+        keep = sid.ne("")
+        if since:
+            keep &= rcv.isna() | (rcv >= since)
+        if until:
+            keep &= rcv.isna() | (rcv <= until)
+        parts.append(
+            pd.DataFrame(
+                {
+                    "ord": pd.RangeIndex(offset, offset + len(df))[keep.to_numpy()],
+                    "safetyreportid": sid[keep].to_numpy(),
+                    "receivedate": rcv[keep].to_numpy(),
+                    "caseid": _opt_values(df, *_CASE_COLS)[keep].to_numpy(),
+                    "caseversion": pd.to_numeric(
+                        _opt_values(df, *_VERSION_COLS)[keep], errors="coerce"
+                    ).to_numpy(),
+                }
+            )
+        )
+        offset += len(df)
+    if not parts:
+        return pd.DataFrame(
+            columns=["seq", "safetyreportid", "receivedate", "caseid", "caseversion"]
+        )
+    rows = pd.concat(parts, ignore_index=True)
+    first = rows.drop_duplicates("safetyreportid", keep="first")[["safetyreportid", "ord"]]
+    last = rows.drop_duplicates("safetyreportid", keep="last")[
+        ["safetyreportid", "receivedate", "caseid", "caseversion"]
+    ]
+    reports = first.merge(last, on="safetyreportid").sort_values("ord")
+    if limit:
+        reports = reports.head(limit)
+    reports = reports.drop(columns="ord").reset_index(drop=True)
+    reports.insert(0, "seq", range(len(reports)))
+    return reports
+
+
+def _stage_drugs(con: duckdb.DuckDBPyConnection, df: pd.DataFrame) -> None:
+    chunk = pd.DataFrame(
+        {
+            "safetyreportid": df[_col(df, *_ID_COLS)].fillna("").astype(str).str.strip(),
+            "drug_name": df[_col(df, "DRUGNAME", "MEDICINALPRODUCT", "DRUG_NAME")]
+            .fillna("")
+            .astype(str)
+            .str.strip(),
+            "role": df[_col(df, "ROLE_COD", "DRUGCHARACTERIZATION", "ROLE")]
+            .fillna("")
+            .astype(str)
+            .str.strip()
+            .str.upper()
+            .map(_ROLE_CODES)
+            .astype("Int32"),
+        }
+    )
+    chunk = chunk[chunk["drug_name"].ne("")]
+    con.register("_q_chunk", chunk)
+    # Semi-join to the selected reports happens here, inside DuckDB
+    con.execute(
+        "INSERT INTO _bulk_drugs "
+        "SELECT r.seq, r.safetyreportid, c.drug_name, NULL, NULL, c.role "
+        "FROM _q_chunk c JOIN _bulk_reports r USING (safetyreportid)"
+    )
+    con.unregister("_q_chunk")
+
+
+def _stage_reactions(con: duckdb.DuckDBPyConnection, df: pd.DataFrame) -> None:
+    chunk = pd.DataFrame(
+        {
+            "safetyreportid": df[_col(df, *_ID_COLS)].fillna("").astype(str).str.strip(),
+            "meddra_pt": df[_col(df, "PT", "REACTIONMEDDRAPT", "MEDDRA_PT")]
+            .fillna("")
+            .astype(str)
+            .str.strip(),
+        }
+    )
+    chunk = chunk[chunk["meddra_pt"].ne("")]
+    con.register("_q_chunk", chunk)
+    con.execute(
+        "INSERT INTO _bulk_reactions "
+        "SELECT r.seq, r.safetyreportid, c.meddra_pt "
+        "FROM _q_chunk c JOIN _bulk_reports r USING (safetyreportid)"
+    )
+    con.unregister("_q_chunk")
+
+
+def _quarter_key(path: Path, member: Optional[str], kind: str) -> str:
+    """Ledger key shared by the DEMO/DRUG/REAC files of one quarter.
+
+    The kind is cut out of the file name (``DEMO24Q1.txt`` -> ``24Q1.txt``),
+    so the three tables of a quarter in the same directory or zip share it.
+    """
+    key = source_key(path, member)
+    head, sep, name = key.rpartition("/")
+    return head + sep + re.sub(kind, "", name, count=1, flags=re.IGNORECASE)
+
+
+_QSources = dict[str, list[tuple[Path, Optional[str]]]]
+
+
+def _group_quarters(
+    qsources: Iterable[tuple[str, Path, Optional[str]]],
+) -> dict[str, _QSources]:
+    """Group DEMO/DRUG/REAC sources by quarter, keyed by ``_quarter_key``.
+
+    File names are matched case-insensitively (``demo24q1.txt`` pairs with
+    ``DRUG24Q1.txt``); the smallest member key is the ledger key.  A quarter
+    without all three kinds would replace its reports with no drugs or
+    reactions, so it is reported and left out.
+    """
+    groups: dict[str, tuple[list[str], _QSources]] = {}
+    for kind, path, member in qsources:
+        key = _quarter_key(path, member, kind)
+        keys, group = groups.setdefault(key.casefold(), ([], {k: [] for k in _KINDS}))
+        keys.append(key)
+        group[kind].append((path, member))
+    quarters: dict[str, _QSources] = {}
+    for keys, group in groups.values():
+        missing = [k for k in _KINDS if not group[k]]
+        if missing:
+            typer.echo(
+                f"Skipping quarter {min(keys)}: no {'/'.join(missing)} file", err=True
+            )
+            continue
+        quarters[min(keys)] = group
+    return quarters
+
+
+def _load_qsources(
+    con: duckdb.DuckDBPyConnection,
+    sources: _QSources,
+    *,
+    since: str | None,
+    until: str | None,
+    limit: int,
+    chunk_rows: int,
+    dedup_rule: Optional[str],
+) -> tuple[pd.DataFrame, int]:
+    """Ingest one set of DEMO/DRUG/REAC sources.
+
+    Returns the selected reports and the number written; with a *dedup_rule*
+    superseded versions are not written, and earlier versions of the loaded
+    cases are superseded.
+    """
+
+    def chunks(kind: str) -> Iterator[pd.DataFrame]:
+        for path, member in sources[kind]:
+            yield from _iter_chunks(path, member, chunk_rows)
+
+    reports = _select_reports(chunks("DEMO"), since=since, until=until, limit=limit)
+    if reports.empty:
+        return reports, 0
+
+    con.register("_q_reports", reports)
+    try:
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _bulk_reports AS "
+            "SELECT CAST(seq AS BIGINT) AS seq, safetyreportid, receivedate, "
+            "CAST(NULL AS INTEGER) AS primarysource_qualifier, caseid, caseversion "
+            "FROM _q_reports"
+        )
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _bulk_drugs (seq BIGINT, safetyreportid VARCHAR, "
+            "drug_name VARCHAR, drug_name_normalized VARCHAR, drug_norm_source VARCHAR, "
+            "role INTEGER)"
+        )
+        con.execute(
+            "CREATE OR REPLACE TEMP TABLE _bulk_reactions "
+            "(seq BIGINT, safetyreportid VARCHAR, meddra_pt VARCHAR)"
+        )
+        for df in chunks("DRUG"):
+            _stage_drugs(con, df)
+        for df in chunks("REAC"):
+            _stage_reactions(con, df)
+        # Idempotent upsert per safetyreportid
+        n = dedup.apply_staged(con, rule=dedup_rule)
+    finally:
+        con.unregister("_q_reports")
+        for name in ("_bulk_reports", "_bulk_drugs", "_bulk_reactions"):
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+    return reports, n
 
 
 def ingest_qfiles(
@@ -113,6 +356,9 @@ def ingest_qfiles(
     since: str | None = None,
     until: str | None = None,
     limit: int = 0,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    incremental: bool = True,
+    dedup_rule: Optional[str] = dedup.DEFAULT_RULE,
 ) -> None:
     """Ingest minimal FAERS quarterly files into DuckDB.
 
@@ -121,7 +367,7 @@ def ingest_qfiles(
       - Single DEMO/DRUG/REAC file.
 
     Minimal column expectations (case-insensitive):
-      - DEMO: PRIMARYID, FDA_DT (YYYYMMDD)
+      - DEMO: PRIMARYID, FDA_DT (YYYYMMDD); optional CASEID, CASEVERSION
       - DRUG: PRIMARYID, DRUGNAME, ROLE_COD (PS/SS/C/I)
       - REAC: PRIMARYID, PT
 
@@ -131,6 +377,19 @@ def ingest_qfiles(
       - drugs.drug_name       = DRUGNAME
       - drugs.role            = map ROLE_COD -> {PS/SS:1, C:2, I:3}
       - reactions.meddra_pt   = PT
+
+    Files are streamed in chunks of *chunk_rows* rows. DEMO files are read
+    first to select the reports; DRUG/REAC chunks are then semi-joined to
+    that selection in DuckDB staging tables and applied in one bulk load.
+
+    With *incremental* (and no since/until/limit), each quarter – the
+    DEMO/DRUG/REAC files sharing a name apart from the table kind – is
+    loaded on its own and recorded in the ``ingest_ledger``; unchanged
+    quarters are skipped.  A quarter missing one of the three files is
+    reported and not loaded.
+
+    *dedup_rule* (see ``dedup.RULES``; ``None`` keeps every version) removes
+    the superseded versions of the loaded CASEIDs after each load.
     """
     if input is None:
         typer.echo("--input is required for qfiles ingest (path to dir/zip/file)", err=True)
@@ -140,105 +399,38 @@ def ingest_qfiles(
         typer.echo(f"Input not found: {input}", err=True)
         raise typer.Exit(code=2)
 
-    demo_df = pd.DataFrame()
-    drug_df = pd.DataFrame()
-    reac_df = pd.DataFrame()
-    for kind, df in _iter_qfiles(input):
-        if kind == "DEMO":
-            demo_df = pd.concat([demo_df, df], ignore_index=True)
-        elif kind == "DRUG":
-            drug_df = pd.concat([drug_df, df], ignore_index=True)
-        elif kind == "REAC":
-            reac_df = pd.concat([reac_df, df], ignore_index=True)
-
-    if demo_df.empty or drug_df.empty or reac_df.empty:
+    quarters = _group_quarters(_iter_qsources(input))
+    if not quarters:
         typer.echo("Expected DEMO/DRUG/REAC files were not all found.", err=True)
         raise typer.Exit(code=2)
+    sources: _QSources = {k: [] for k in _KINDS}
+    for group in quarters.values():
+        for kind in _KINDS:
+            sources[kind] += group[kind]
 
-    # Normalize column names (robust to small naming variants)
-    def col(df: pd.DataFrame, *cands: str) -> str:
-        up = set(df.columns)
-        for c in cands:
-            cu = c.upper()
-            if cu in up:
-                return cu
-        raise KeyError(f"Missing columns among: {cands}")
-
-    DEMO_ID = col(demo_df, "PRIMARYID", "PRIMARY_ID", "SAFETYREPORTID")
-    DEMO_DT = col(demo_df, "FDA_DT", "RECEIPTDATE", "RECEIVEDATE")
-    DRUG_ID = col(drug_df, "PRIMARYID", "PRIMARY_ID", "SAFETYREPORTID")
-    DRUG_NM = col(drug_df, "DRUGNAME", "MEDICINALPRODUCT", "DRUG_NAME")
-    DRUG_RO = col(drug_df, "ROLE_COD", "DRUGCHARACTERIZATION", "ROLE")
-    REAC_ID = col(reac_df, "PRIMARYID", "PRIMARY_ID", "SAFETYREPORTID")
-    REAC_PT = col(reac_df, "PT", "REACTIONMEDDRAPT", "MEDDRA_PT")
-
-    # Build reports dict with date filters
-    reports = {}
-    for _, row in demo_df.iterrows():
-        sid = str(row[DEMO_ID]).strip()
-        if not sid:
-            continue
-        rcv = _parse_date_yyyymmdd(str(row.get(DEMO_DT, "") or ""))
-        if since and rcv and rcv < since:
-            continue
-        if until and rcv and rcv > until:
-            continue
-        reports[sid] = (sid, rcv, None)  # primarysource_qualifier unknown in quarterly -> None
-
-    # Early exit if nothing passes the filter
-    if not reports:
-        typer.echo("No reports matched filters.")
+    # Do not manage/close the caller-owned connection here.
+    if not incremental or since or until or limit:
+        reports, n = _load_qsources(
+            con, sources, since=since, until=until, limit=limit, chunk_rows=chunk_rows,
+            dedup_rule=dedup_rule,
+        )
+        if reports.empty:
+            typer.echo("No reports matched filters.")
+            return
+        typer.echo(f"Ingested {n} reports from {input}")
         return
 
-    # Prepare drug and reaction rows limited to selected reports
-    drugs_rows = []
-    for _, row in drug_df.iterrows():
-        sid = str(row[DRUG_ID]).strip()
-        if sid not in reports:
-            continue
-        name = str(row[DRUG_NM]).strip()
-        role = _role_to_int(str(row.get(DRUG_RO, "") or ""))
-        if not name:
-            continue
-        drugs_rows.append((sid, name, role))
-
-    reac_rows = []
-    for _, row in reac_df.iterrows():
-        sid = str(row[REAC_ID]).strip()
-        if sid not in reports:
+    ledger = Ledger(con, "qfiles")
+    total = 0
+    for key, group in quarters.items():
+        members = [src for kind in _KINDS for src in group[kind]]
+        if ledger.is_current(key, members):
             continue
-        pt = str(row[REAC_PT]).strip()
-        if not pt:
-            continue
-        reac_rows.append((sid, pt))
-
-    # Apply limit on unique reports
-    keep_ids = list(reports.keys())
-    if limit and len(keep_ids) > limit:
-        keep_ids = keep_ids[:limit]
-    keep_set = set(keep_ids)
-
-    # Do not manage/close the caller-owned connection here.
-    # Idempotent upsert per safetyreportid
-    for sid in keep_ids:
-        con.execute("DELETE FROM reactions WHERE safetyreportid = ?", [sid])
-        con.execute("DELETE FROM drugs WHERE safetyreportid = ?", [sid])
-        con.execute("DELETE FROM reports WHERE safetyreportid = ?", [sid])
-
-    # Insert reports
-    con.executemany(
-        "INSERT INTO reports (safetyreportid, receivedate, primarysource_qualifier) VALUES (?, ?, ?)",
-        [reports[sid] for sid in keep_ids],
-    )
-
-    # Insert drugs and reactions filtered by keep_set
-    con.executemany(
-        "INSERT INTO drugs (safetyreportid, drug_name, role) VALUES (?, ?, ?)",
-        [row for row in drugs_rows if row[0] in keep_set],
-    )
-    con.executemany(
-        "INSERT INTO reactions (safetyreportid, meddra_pt) VALUES (?, ?)",
-        [row for row in reac_rows if row[0] in keep_set],
-    )
-
-    typer.echo(f"Ingested {len(keep_ids)} reports from {input}")
+        reports, n = _load_qsources(
+            con, group, since=None, until=None, limit=0, chunk_rows=chunk_rows,
+            dedup_rule=dedup_rule,
+        )
+        ledger.record(key, members, reports["safetyreportid"])
+        total += n
+    skipped = f" ({ledger.skipped} unchanged quarters skipped)" if ledger.skipped else ""
+    typer.echo(f"Ingested {total} reports from {input}{skipped}")
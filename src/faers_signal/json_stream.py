@@ -0,0 +1,175 @@
+"""Incremental reader for openFDA event JSON.
+
+``iter_events`` yields event dicts from a binary stream while holding only a
+bounded window of text in memory (one read chunk plus the event being
+decoded), so a multi-GB partition file costs no more than a small one.
+
+Accepted layouts, matching what ``ingest_openfda`` has always accepted:
+
+  - the openFDA envelope ``{"meta": {...}, "results": [event, ...]}``
+  - a top-level array of events
+  - a single event object
+  - NDJSON / JSONL, one event (or one envelope) per line
+
+Each top-level object is walked key by key: the elements of a ``results``
+array are decoded and yielded one at a time, every other member is decoded
+whole.  An object without a ``results`` array is itself an event.  A
+malformed top-level value is skipped up to the next line break, as the old
+NDJSON fallback did.
+"""
+from __future__ import annotations
+
+import io
+import json
+from typing import Any, BinaryIO, Iterator
+
+
+_CHUNK_CHARS = 1 << 20
+_WS = " \t\r\n"
+# A number cut by the window end still decodes ("2." as 2, "1e+" as 1); a
+# value ending this close to the end is decoded again with more input
+_TAIL_CHARS = 4
+
+
+class _Buffer:
+    """Sliding text window over a character stream."""
+
+    def __init__(self, text: io.TextIOBase) -> None:
+        self._text = text
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self._text.read(_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            n = len(self.buf)
+            while self.pos < n and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < n:
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise json.JSONDecodeError(f"Expecting {ch!r}", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode one JSON value, reading more input until it is complete."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the window end is worth more input;
+                # a genuine syntax error must not pull in the rest of the file
+                truncated = e.pos >= len(self.buf) - 64 or e.msg.startswith("Unterminated")
+                if truncated and self._fill():
+                    continue
+                raise
+            # A bare number may continue past the end of the window
+            if len(self.buf) - end < _TAIL_CHARS and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def skip_line(self) -> None:
+        while True:
+            nl = self.buf.find("\n", self.pos)
+            if nl >= 0:
+                self.pos = nl + 1
+                return
+            self.pos = len(self.buf)
+            if not self._fill():
+                return
+
+
+def _iter_array(b: _Buffer) -> Iterator[dict[str, Any]]:
+    b.expect("[")
+    if b.peek() == "]":
+        b.pos += 1
+        return
+    while True:
+        ev = b.value()
+        if isinstance(ev, dict):
+            yield ev
+        ch = b.peek()
+        b.pos += 1
+        if ch == "]":
+            return
+        if ch != ",":
+            raise json.JSONDecodeError("Expecting ',' or ']'", b.buf, b.pos - 1)
+
+
+def _iter_object(b: _Buffer) -> Iterator[dict[str, Any]]:
+    b.expect("{")
+    members: dict[str, Any] = {}
+    envelope = False
+    if b.peek() == "}":
+        b.pos += 1
+    else:
+        while True:
+            key = b.value()
+            b.expect(":")
+            if key == "results" and b.peek() == "[":
+                envelope = True
+                yield from _iter_array(b)
+            else:
+                members[key] = b.value()
+            ch = b.peek()
+            b.pos += 1
+            if ch == "}":
+                break
+            if ch != ",":
+                raise json.JSONDecodeError("Expecting ',' or '}'", b.buf, b.pos - 1)
+    if not envelope:
+        yield members
+
+
+def iter_events(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    """Yield openFDA events from a binary JSON / NDJSON stream.
+
+    The stream must be UTF-8 (a BOM is accepted).  Invalid UTF-8 raises
+    ``ValueError``.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    b = _Buffer(text)
+    try:
+        while True:
+            ch = b.peek()
+            if not ch:
+                return
+            try:
+                if ch == "{":
+                    yield from _iter_object(b)
+                elif ch == "[":
+                    yield from _iter_array(b)
+                else:
+                    b.value()
+            except json.JSONDecodeError:
+                # Resume at the next line (NDJSON with a broken record)
+                b.skip_line()
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Failed to decode JSON as UTF-8: {e}") from e
+    finally:
+        # Leave the caller's stream open
+        try:
+            text.detach()
+        except ValueError:
+            pass
@@ -0,0 +1,182 @@
+"""Hive-partitioned Parquet export of the fact tables ("lake").
+
+Layout under *root*::
+
+    reports/year=2024/quarter=1/data_0.parquet
+    drugs/year=2024/quarter=1/data_0.parquet
+    reactions/year=2024/quarter=1/data_0.parquet
+    drug_dim.parquet, pt_dim.parquet
+    lake.json                                  source DB, row counts
+
+Fact rows are partitioned by the receive year/quarter of their report
+(``__HIVE_DEFAULT_PARTITION__`` when it is unknown) and sorted by
+``report_key`` within each file.  ``relations`` returns ``read_parquet``
+expressions the ABCD query builder scans directly: a date window becomes a
+filter on the partition columns, so DuckDB skips the files outside it, and
+any number of processes can read the lake at once without a database lock.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Optional
+
+import duckdb
+
+from . import dims
+from ._sqlutil import sql_path
+
+MANIFEST = "lake.json"
+FACTS = ("reports", "drugs", "reactions")
+DIMS = ("drug_dim", "pt_dim")
+
+# Partition columns; rows without a receivedate fall into the default partition
+_PERIOD = "year(r.receivedate) AS year, quarter(r.receivedate) AS quarter"
+
+_SELECTS = {
+    "reports": (
+        "SELECT k.report_key, r.safetyreportid, r.receivedate, r.primarysource_qualifier, "
+        f"{_PERIOD} FROM reports r JOIN report_keys k USING (safetyreportid)"
+    ),
+    "drugs": (
+        "SELECT d.report_key, d.drug_id, d.role, d.safetyreportid, d.drug_name, "
+        f"d.drug_name_normalized, d.drug_norm_source, {_PERIOD} "
+        "FROM drugs d JOIN reports r USING (safetyreportid)"
+    ),
+    "reactions": (
+        "SELECT k.report_key, p.pt_id, x.safetyreportid, x.meddra_pt, "
+        f"{_PERIOD} FROM reactions x JOIN reports r USING (safetyreportid) "
+        "JOIN report_keys k USING (safetyreportid) "
+        "LEFT JOIN pt_dim p ON p.pt = lower(x.meddra_pt)"
+    ),
+}
+_HIVE_TYPES = "hive_types={'year': BIGINT, 'quarter': BIGINT}"
+_DEFAULT_PARTITION = "year=__HIVE_DEFAULT_PARTITION__/quarter=__HIVE_DEFAULT_PARTITION__"
+
+
+def _copy_facts(con: duckdb.DuckDBPyConnection, table: str, target: Path) -> int:
+    select = _SELECTS[table]
+    con.execute(
+        f"COPY ({select} ORDER BY report_key) TO '{sql_path(target)}' "
+        "(FORMAT PARQUET, PARTITION_BY (year, quarter))"
+    )
+    if not any(target.glob("*/*/*.parquet")):
+        # An empty table writes no files; keep one so the glob still resolves
+        empty = target / _DEFAULT_PARTITION
+        empty.mkdir(parents=True, exist_ok=True)
+        con.execute(
+            f"COPY (SELECT * EXCLUDE (year, quarter) FROM ({select}) WHERE false) "
+            f"TO '{sql_path(empty / 'data_0.parquet')}' (FORMAT PARQUET)"
+        )
+    return int(con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+
+def export(con: duckdb.DuckDBPyConnection, root: Path) -> dict[str, int]:
+    """Write the fact tables and dimensions of *con* to *root*; return row counts.
+
+    The lake is written next to *root* and swapped in when complete, so
+    readers never see a half-written export.
+    """
+    root = Path(root)
+    dims.encode(con)
+    staging = root.with_name(root.name + ".partial")
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+
+    counts: dict[str, int] = {}
+    for table in FACTS:
+        counts[table] = _copy_facts(con, table, staging / table)
+    for table in DIMS:
+        con.execute(
+            f"COPY (SELECT * FROM {table} ORDER BY 1) "
+            f"TO '{sql_path(staging / f'{table}.parquet')}' (FORMAT PARQUET)"
+        )
+        counts[table] = int(con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+
+    db_file = con.execute(
+        "SELECT path FROM duckdb_databases() WHERE database_name = current_database()"
+    ).fetchone()
+    (staging / MANIFEST).write_text(
+        json.dumps(
+            {
+                "source_db": db_file[0] if db_file else None,
+                "exported_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "tables": counts,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+    old = root.with_name(root.name + ".old")
+    if root.exists():
+        if old.exists():
+            shutil.rmtree(old)
+        root.rename(old)
+    staging.rename(root)
+    if old.exists():
+        shutil.rmtree(old)
+    return counts
+
+
+def manifest(root: Path) -> dict[str, Any]:
+    """The ``lake.json`` written by ``export``."""
+    path = Path(root) / MANIFEST
+    if not path.exists():
+        raise FileNotFoundError(f"No lake at {root} (missing {MANIFEST}); run `lake export` first")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def relations(root: Path) -> dict[str, str]:
+    """``read_parquet`` expressions for every lake table, keyed by table name."""
+    root = Path(root).resolve()
+    rels = {
+        table: (
+            f"read_parquet('{sql_path(root / table)}/*/*/*.parquet', "
+            f"hive_partitioning = true, {_HIVE_TYPES})"
+        )
+        for table in FACTS
+    }
+    for table in DIMS:
+        rels[table] = f"read_parquet('{sql_path(root / f'{table}.parquet')}')"
+    return rels
+
+
+def connect(root: Path) -> duckdb.DuckDBPyConnection:
+    """In-memory connection with the lake tables as views (no file lock taken)."""
+    manifest(root)
+    con = duckdb.connect()
+    for table, rel in relations(root).items():
+        con.execute(f"CREATE VIEW {table} AS SELECT * FROM {rel}")
+    return con
+
+
+def _period(value: str) -> int:
+    d = datetime.date.fromisoformat(value[:10])
+    return d.year * 10 + (d.month - 1) // 3 + 1
+
+
+def period_bounds(since: Optional[str], until: Optional[str]) -> dict[str, int]:
+    """Parameters for ``period_condition``: ``year * 10 + quarter`` of the window ends."""
+    bounds = {}
+    if since:
+        bounds["since_period"] = _period(since)
+    if until:
+        bounds["until_period"] = _period(until)
+    return bounds
+
+
+def period_condition(bounds: dict[str, int]) -> str:
+    """Partition filter for a scan of a lake fact table; reports without a date are kept.
+
+    Written without ``OR`` so DuckDB evaluates it against the partition values.
+    """
+    conds = []
+    if "since_period" in bounds:
+        conds.append("COALESCE(year * 10 + quarter, 99999) >= $since_period")
+    if "until_period" in bounds:
+        conds.append("COALESCE(year * 10 + quarter, 0) <= $until_period")
+    return " AND ".join(conds)
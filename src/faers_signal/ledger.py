@@ -0,0 +1,204 @@
+"""Incremental ingest bookkeeping: which inputs are loaded, and what they produced.
+
+``ingest_ledger`` holds one row per ingested input – a file, a zip member,
+or (for quarterly files) the DEMO/DRUG/REAC group of one quarter – with its
+size, mtime and content hash; ``ingest_ledger_reports`` lists the report IDs
+it produced.
+
+``Ledger.is_current`` compares size and mtime against the recorded row, a
+dictionary lookup per input; the content hash (SHA-256 of a file, the CRC of
+a zip member) is only computed when they differ, so a file that was merely
+touched is still skipped.  ``Ledger.record`` runs after an input was
+(re)ingested: reports its previous version produced and the new one does not
+– and that no other input claims – are retracted from the cube and deleted.
+DuckDB only deletes a report in a later statement than its drugs/reactions,
+so the stale IDs are queued in ``ingest_ledger_pending`` in the same
+transaction; a report row whose delete failed is retried by the next
+``Ledger`` or ``record`` instead of being forgotten.
+
+Runs with ``--since``/``--until``/``--limit`` load only part of an input and
+bypass the ledger.
+"""
+from __future__ import annotations
+
+import hashlib
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+import duckdb
+
+from . import cube, generation
+from ._sqlutil import temp_id_table
+
+# (file, zip member or None), as yielded by the ingest source iterators
+Source = tuple[Path, Optional[str]]
+
+
+def source_key(path: Path, member: Optional[str] = None) -> str:
+    """Ledger key of a file or zip member: the absolute path (``zip!member``)."""
+    p = str(Path(path).resolve())
+    return f"{p}!{member}" if member is not None else p
+
+
+class Ledger:
+    """Fingerprints of the inputs of one *kind* (``openfda`` or ``qfiles``)."""
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, kind: str) -> None:
+        self.con = con
+        self.kind = kind
+        self._known = {
+            key: (size, mtime, digest)
+            for key, size, mtime, digest in con.execute(
+                "SELECT source_key, size, mtime, content_hash FROM ingest_ledger "
+                "WHERE kind = ?",
+                [kind],
+            ).fetchall()
+        }
+        self._members: dict[Path, dict[str, zipfile.ZipInfo]] = {}
+        self.skipped = 0
+        self._delete_pending()
+
+    def _delete_pending(self) -> None:
+        """Delete the queued stale report rows; their cube contribution is already gone."""
+        con = self.con
+        if not con.execute("SELECT COUNT(*) FROM ingest_ledger_pending").fetchone()[0]:
+            return
+        con.execute("BEGIN TRANSACTION")
+        try:
+            # A report re-claimed since it was queued stays
+            con.execute(
+                "DELETE FROM reports WHERE safetyreportid IN "
+                "(SELECT safetyreportid FROM ingest_ledger_pending) "
+                "AND safetyreportid NOT IN (SELECT safetyreportid FROM ingest_ledger_reports)"
+            )
+            con.execute("DELETE FROM ingest_ledger_pending")
+            generation.bump(con)
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def _member(self, path: Path, member: str) -> zipfile.ZipInfo:
+        infos = self._members.get(path)
+        if infos is None:
+            with zipfile.ZipFile(path) as zf:
+                infos = {i.filename: i for i in zf.infolist()}
+            self._members[path] = infos
+        return infos[member]
+
+    def _stat(self, path: Path, member: Optional[str]) -> tuple[int, float]:
+        if member is None:
+            st = path.stat()
+            return st.st_size, st.st_mtime
+        info = self._member(path, member)
+        return info.file_size, datetime(*info.date_time).timestamp()
+
+    def _hash(self, path: Path, member: Optional[str]) -> str:
+        if member is not None:
+            return f"crc32:{self._member(path, member).CRC:08x}"
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def _fingerprint(
+        self, sources: Sequence[Source], *, with_hash: bool
+    ) -> tuple[int, float, Optional[str]]:
+        size, mtime = 0, 0.0
+        for path, member in sources:
+            s, m = self._stat(path, member)
+            size += s
+            mtime = max(mtime, m)
+        if not with_hash:
+            return size, mtime, None
+        hashes = [self._hash(path, member) for path, member in sources]
+        if len(hashes) == 1:
+            return size, mtime, hashes[0]
+        return size, mtime, hashlib.sha256("\n".join(hashes).encode()).hexdigest()
+
+    def is_current(self, key: str, sources: Sequence[Source]) -> bool:
+        """True when *sources* are unchanged since they were recorded as *key*."""
+        known = self._known.get(key)
+        if known is None:
+            return False
+        size, mtime, _ = self._fingerprint(sources, with_hash=False)
+        if (size, mtime) != known[:2]:
+            if size != known[0]:
+                return False
+            _, _, digest = self._fingerprint(sources, with_hash=True)
+            if digest != known[2]:
+                return False
+            # Touched but identical: remember the new mtime
+            self.con.execute(
+                "UPDATE ingest_ledger SET mtime = ? WHERE source_key = ?", [mtime, key]
+            )
+            self._known[key] = (size, mtime, digest)
+        self.skipped += 1
+        return True
+
+    def record(self, key: str, sources: Sequence[Source], report_ids: Iterable[str]) -> int:
+        """Store *key*'s fingerprint and report IDs after it was ingested.
+
+        Returns the number of stale reports removed.
+        """
+        size, mtime, digest = self._fingerprint(sources, with_hash=True)
+        con = self.con
+        n = temp_id_table(con, "_ledger_ids", report_ids)
+        con.execute("BEGIN TRANSACTION")
+        try:
+            stale = [
+                s
+                for (s,) in con.execute(
+                    "SELECT l.safetyreportid FROM ingest_ledger_reports l "
+                    "WHERE l.source_key = ? "
+                    "AND l.safetyreportid NOT IN (SELECT safetyreportid FROM _ledger_ids) "
+                    "AND NOT EXISTS (SELECT 1 FROM ingest_ledger_reports o "
+                    "  WHERE o.safetyreportid = l.safetyreportid "
+                    "  AND o.source_key <> l.source_key)",
+                    [key],
+                ).fetchall()
+            ]
+            temp_id_table(con, "_ledger_stale", stale)
+            if stale:
+                cube.retract(con, stale)
+                for table in ("reaction_keys", "reactions", "drugs"):
+                    con.execute(
+                        f"DELETE FROM {table} WHERE safetyreportid IN "
+                        "(SELECT safetyreportid FROM _ledger_stale)"
+                    )
+                generation.bump(con)
+                con.execute(
+                    "INSERT INTO ingest_ledger_pending SELECT safetyreportid FROM _ledger_stale "
+                    "ON CONFLICT DO NOTHING"
+                )
+            con.execute("DELETE FROM ingest_ledger_reports WHERE source_key = ?", [key])
+            con.execute(
+                "INSERT INTO ingest_ledger_reports SELECT ?, safetyreportid FROM _ledger_ids",
+                [key],
+            )
+            con.execute(
+                "INSERT INTO ingest_ledger "
+                "(source_key, kind, size, mtime, content_hash, n_reports, loaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, now()::TIMESTAMP) "
+                "ON CONFLICT (source_key) DO UPDATE SET kind = excluded.kind, "
+                "size = excluded.size, mtime = excluded.mtime, "
+                "content_hash = excluded.content_hash, n_reports = excluded.n_reports, "
+                "loaded_at = excluded.loaded_at",
+                [key, self.kind, size, mtime, digest, n],
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            con.execute("DROP TABLE IF EXISTS _ledger_ids")
+            con.execute("DROP TABLE IF EXISTS _ledger_stale")
+        self._known[key] = (size, mtime, digest)
+        # DuckDB rejects deleting a referenced report in the transaction that
+        # deleted its drugs/reactions (see bulk_load)
+        if stale:
+            self._delete_pending()
+        return len(stale)
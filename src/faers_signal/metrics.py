@@ -28,6 +28,8 @@ from dataclasses import dataclass
 from typing import Tuple
 
 import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
 from scipy.stats import chi2
 
 
@@ -176,6 +178,111 @@ def classify_signal(flags: dict, mode: str = "balanced") -> bool:
         return true_count >= 2
 
 
+# ── Vectorized batch computation ─────────────────────────────────
+
+def compute_metrics_frame(
+    A: ArrayLike,
+    B: ArrayLike,
+    C: ArrayLike,
+    D: ArrayLike,
+    N: ArrayLike,
+    min_a: int = 3,
+    mode: str = "balanced",
+) -> pd.DataFrame:
+    """Compute every metric, flag and the signal class for many pairs at once.
+
+    Columnar equivalent of calling ``prr``, ``chi_square_1df``, ``ror``,
+    ``ror_ci95``, ``ic_simple``, ``ic_simple_ci95``, ``signal_flags`` and
+    ``classify_signal`` row by row.  The arithmetic is performed in the same
+    order as the scalar functions, so results are bit-identical to them.
+
+    Args:
+        A, B, C, D, N: Equal-length arrays of 2×2 cell counts and totals.
+        min_a: Minimum A for the Evans criterion.
+        mode: Signal-detection mode (see ``classify_signal``).
+
+    Returns:
+        DataFrame with columns ``PRR``, ``Chi2_1df``, ``ROR``, ``ROR_CI_L``,
+        ``ROR_CI_U``, ``IC``, ``IC_CI_L``, ``IC_CI_U``, ``flag_evans``,
+        ``flag_ror025``, ``flag_ic025`` and ``Signal`` (one row per input).
+    """
+    a_raw = np.asarray(A, dtype=float)
+    a = a_raw.copy()
+    b = np.asarray(B, dtype=float).copy()
+    c = np.asarray(C, dtype=float).copy()
+    d = np.asarray(D, dtype=float).copy()
+    n = np.asarray(N, dtype=float).copy()
+
+    # Haldane–Anscombe correction, applied only to rows with a zero cell
+    zero = (a == 0) | (b == 0) | (c == 0) | (d == 0)
+    a[zero] += _HALDANE
+    b[zero] += _HALDANE
+    c[zero] += _HALDANE
+    d[zero] += _HALDANE
+    n[zero] += 2.0
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        # PRR
+        denom1 = a + b
+        denom2 = c + d
+        ok = (denom1 > 0) & (denom2 > 0) & (c > 0)
+        prr_v = np.where(ok, (a / denom1) / (c / denom2), np.nan)
+
+        # Yates-corrected chi-square
+        denom = (a + b) * (c + d) * (a + c) * (b + d)
+        num = (np.abs(a * d - b * c) - n / 2.0) ** 2 * n
+        chi_v = np.where(denom > 0, num / denom, np.nan)
+
+        # ROR and Wald CI on the log scale
+        bc = b * c
+        ror_v = np.where(bc > 0, (a * d) / bc, np.nan)
+        ok = (a > 0) & (b > 0) & (c > 0) & (d > 0)
+        ln_ror = np.log((a * d) / (b * c))
+        se = np.sqrt(1.0 / a + 1.0 / b + 1.0 / c + 1.0 / d)
+        ror_l = np.where(ok, np.exp(ln_ror - 1.96 * se), np.nan)
+        ror_u = np.where(ok, np.exp(ln_ror + 1.96 * se), np.nan)
+
+        # IC and delta-method CI
+        ea = (a + b) * (a + c) / n
+        ok = (ea > 0) & (a > 0)
+        ic_v = np.where(ok, np.log2(a / ea), np.nan)
+        var_ln = np.maximum(1.0 / a - 1.0 / (a + b) - 1.0 / (a + c) + 1.0 / n, 0.0)
+        se_ic = np.sqrt(var_ln) / np.log(2.0)
+        ic_l = np.where(ok, ic_v - 1.96 * se_ic, np.nan)
+        ic_u = np.where(ok, ic_v + 1.96 * se_ic, np.nan)
+
+    # NaN compares False, matching the explicit isnan checks in signal_flags
+    flag_evans = (prr_v >= 2) & (chi_v >= 4) & (a_raw >= min_a)
+    flag_ror025 = ror_l > 1
+    flag_ic025 = ic_l > 0
+    true_count = (
+        flag_evans.astype(np.int8) + flag_ror025.astype(np.int8) + flag_ic025.astype(np.int8)
+    )
+    if mode == "sensitive":
+        is_signal = true_count >= 1
+    elif mode == "specific":
+        is_signal = true_count == 3
+    else:  # balanced (default)
+        is_signal = true_count >= 2
+
+    return pd.DataFrame(
+        {
+            "PRR": prr_v,
+            "Chi2_1df": chi_v,
+            "ROR": ror_v,
+            "ROR_CI_L": ror_l,
+            "ROR_CI_U": ror_u,
+            "IC": ic_v,
+            "IC_CI_L": ic_l,
+            "IC_CI_U": ic_u,
+            "flag_evans": flag_evans,
+            "flag_ror025": flag_ror025,
+            "flag_ic025": flag_ic025,
+            "Signal": is_signal,
+        }
+    )
+
+
 # ── Multiple testing correction ──────────────────────────────────
 
 def benjamini_hochberg_fdr(p_values: list[float], alpha: float = 0.05) -> list[float]:
@@ -0,0 +1,137 @@
+"""SQL push-down of the disproportionality metrics.
+
+``metrics_select`` renders the same computation as
+``metrics.compute_metrics_frame`` — Haldane–Anscombe correction, PRR, Yates
+chi-square, ROR with Wald CI, IC with delta-method CI, the three signal flags
+and the sensitive/balanced/specific classification — as DuckDB column
+expressions.  The ``min_a`` filter is applied first, so only the rows that
+are kept are ever scored, and nothing has to leave the engine: the result can
+be written with ``COPY ... TO`` directly.
+
+Values agree with the NumPy path to floating-point rounding (DuckDB and NumPy
+use different ``ln``/``exp`` implementations).  Where the scalar functions
+return ``NaN`` the SQL expressions return ``NULL``.
+"""
+from __future__ import annotations
+
+import duckdb
+
+
+SIGNAL_MODES = ("sensitive", "balanced", "specific")
+
+# Number of flags that must be set for each signal mode
+_MODE_THRESHOLD = {"sensitive": 1, "balanced": 2, "specific": 3}
+
+# Columns produced by abcd.sql, passed through unchanged
+_ABCD_COLUMNS = (
+    "drug",
+    "pt",
+    "A",
+    "B",
+    "C",
+    "D",
+    "drug_reports",
+    "pt_reports",
+    "total_reports",
+)
+
+
+def metrics_select(source: str, *, min_a: int = 3, mode: str = "balanced") -> str:
+    """Return a SELECT that scores every ABCD row of *source* inside DuckDB.
+
+    Args:
+        source: A table/view name or a parenthesized subquery producing the
+            ``abcd.sql`` columns (drug, pt, A, B, C, D, ..., total_reports).
+        min_a: Rows with ``A < min_a`` are dropped before any metric is
+            computed; also used for the Evans criterion.
+        mode: Signal-detection mode (``sensitive`` | ``balanced`` | ``specific``).
+
+    Returns:
+        SQL text with the ``abcd.sql`` columns followed by the columns of
+        ``compute_metrics_frame`` (``PRR`` … ``Signal``).
+    """
+    if mode not in _MODE_THRESHOLD:
+        raise ValueError(f"Unknown signal mode: {mode!r} (expected one of {SIGNAL_MODES})")
+    min_a = int(min_a)
+    passthrough = ", ".join(_ABCD_COLUMNS)
+    # DuckDB identifiers are case-insensitive, so corrected cells use a c* prefix
+    return f"""
+WITH
+abcd_in AS (
+  SELECT {passthrough},
+         CASE WHEN A = 0 OR B = 0 OR C = 0 OR D = 0 THEN 0.5 ELSE 0.0 END AS _h
+  FROM {source}
+  WHERE A >= {min_a}
+),
+cells AS (
+  SELECT *,
+         A::DOUBLE + _h                   AS ca,
+         B::DOUBLE + _h                   AS cb,
+         C::DOUBLE + _h                   AS cc,
+         D::DOUBLE + _h                   AS cd,
+         total_reports::DOUBLE + 4 * _h   AS cn
+  FROM abcd_in
+),
+stats AS (
+  SELECT *,
+         (ca + cb) * (cc + cd) * (ca + cc) * (cb + cd)                       AS chi_denom,
+         (ca + cb) * (ca + cc) / cn                                         AS ea,
+         sqrt(1.0 / ca + 1.0 / cb + 1.0 / cc + 1.0 / cd)                    AS se_ror,
+         sqrt(greatest(1.0 / ca - 1.0 / (ca + cb) - 1.0 / (ca + cc) + 1.0 / cn, 0.0))
+           / ln(2.0)                                                        AS se_ic
+  FROM cells
+),
+scored AS (
+  SELECT {passthrough},
+         CASE WHEN ca + cb > 0 AND cc + cd > 0 AND cc > 0
+              THEN (ca / (ca + cb)) / (cc / (cc + cd)) END                  AS PRR,
+         CASE WHEN chi_denom > 0
+              THEN pow(abs(ca * cd - cb * cc) - cn / 2.0, 2) * cn / chi_denom END
+                                                                            AS Chi2_1df,
+         CASE WHEN cb * cc > 0 THEN (ca * cd) / (cb * cc) END               AS ROR,
+         CASE WHEN ca > 0 AND cb > 0 AND cc > 0 AND cd > 0
+              THEN exp(ln((ca * cd) / (cb * cc)) - 1.96 * se_ror) END       AS ROR_CI_L,
+         CASE WHEN ca > 0 AND cb > 0 AND cc > 0 AND cd > 0
+              THEN exp(ln((ca * cd) / (cb * cc)) + 1.96 * se_ror) END       AS ROR_CI_U,
+         CASE WHEN ea > 0 AND ca > 0 THEN log2(ca / ea) END                 AS IC,
+         CASE WHEN ea > 0 AND ca > 0 THEN log2(ca / ea) - 1.96 * se_ic END  AS IC_CI_L,
+         CASE WHEN ea > 0 AND ca > 0 THEN log2(ca / ea) + 1.96 * se_ic END  AS IC_CI_U
+  FROM stats
+),
+flagged AS (
+  SELECT *,
+         COALESCE(PRR >= 2 AND Chi2_1df >= 4 AND A >= {min_a}, false)       AS flag_evans,
+         COALESCE(ROR_CI_L > 1, false)                                      AS flag_ror025,
+         COALESCE(IC_CI_L > 0, false)                                       AS flag_ic025
+  FROM scored
+)
+SELECT *,
+       (flag_evans::INTEGER + flag_ror025::INTEGER + flag_ic025::INTEGER)
+         >= {_MODE_THRESHOLD[mode]}                                          AS Signal
+FROM flagged
+"""
+
+
+def split_script(con: duckdb.DuckDBPyConnection, sql: str) -> tuple[list[str], str]:
+    """Split a multi-statement script into (setup statements, final query)."""
+    statements = [s.query.strip().rstrip(";").strip() for s in con.extract_statements(sql)]
+    statements = [s for s in statements if s]
+    if not statements:
+        raise ValueError("Empty SQL script")
+    return statements[:-1], statements[-1]
+
+
+def metrics_script(
+    con: duckdb.DuckDBPyConnection,
+    abcd_sql: str,
+    *,
+    min_a: int = 3,
+    mode: str = "balanced",
+) -> tuple[list[str], str]:
+    """Wrap an ABCD script (e.g. ``abcd.sql``) so its final SELECT is scored in SQL.
+
+    Returns ``(setup, query)``: run every *setup* statement first, then
+    *query* (or ``COPY (query) TO ...``).
+    """
+    setup, final = split_script(con, abcd_sql)
+    return setup, metrics_select(f"({final})", min_a=min_a, mode=mode)
@@ -2,25 +2,50 @@
 
 Strategy (in order of preference):
   1. openFDA harmonized ``openfda.substance_name`` — exact, high quality
-  2. RxNorm ``getApproximateMatch`` API — fuzzy match to ingredient
+  2. RxNorm — the offline index from local RRF files when one is active
+     (``rxnorm_local``), otherwise the ``getApproximateMatch`` API
   3. Fallback: ``lower(raw_name)``
 
 The RxNorm REST API is free and requires no API key for public RxNorm data.
-Rate limit: ~20 requests/second — we add a small sleep between calls.
+Rate limit: ~20 requests/second — every call goes through one shared token
+bucket, so concurrent lookups (``resolve_rxnorm``) stay within that budget.
 """
 from __future__ import annotations
 
 import json
-import time
+import urllib.parse
 import urllib.request
 import urllib.error
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Tuple
+
+from . import rxnorm_cache, rxnorm_local
+from .ratelimit import TokenBucket
+
+if TYPE_CHECKING:
+    import duckdb
 
 # In-memory cache to avoid repeated API calls for the same raw name
 _rxnorm_cache: dict[str, Tuple[Optional[str], str]] = {}
+# Keys whose lookup failed on a request error (not a genuine "no match")
+_rxnorm_failed: set[str] = set()
 
 _RXNAV_BASE = "https://rxnav.nlm.nih.gov/REST"
 
+# Shared by all threads of this process
+_RXNAV_RATE = 20.0
+_limiter = TokenBucket(_RXNAV_RATE)
+
+DEFAULT_RXNORM_WORKERS = 8
+
+
+def _get_json(url: str) -> Any:
+    """GET an RxNav URL as JSON, after taking a token from the rate limiter."""
+    _limiter.acquire()
+    req = urllib.request.Request(url, headers={"Accept": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
 
 def _normalize_from_openfda(drug_dict: dict) -> Optional[str]:
     """Extract ingredient name from openFDA harmonized fields.
@@ -54,10 +79,7 @@ def _normalize_via_rxnorm(raw_name: str) -> Tuple[Optional[str], str]:
 
     try:
         encoded = urllib.parse.quote(key)
-        url = f"{_RXNAV_BASE}/approximateTerm.json?term={encoded}&maxEntries=1"
-        req = urllib.request.Request(url, headers={"Accept": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read())
+        data = _get_json(f"{_RXNAV_BASE}/approximateTerm.json?term={encoded}&maxEntries=1")
 
         candidates = (
             data.get("approximateGroup", {})
@@ -71,11 +93,11 @@ def _normalize_via_rxnorm(raw_name: str) -> Tuple[Optional[str], str]:
                 if name:
                     result = (name.lower(), "rxnorm_api")
                     _rxnorm_cache[key] = result
-                    time.sleep(0.05)  # rate limiting
                     return result
 
     except (urllib.error.URLError, OSError, json.JSONDecodeError, KeyError):
-        pass
+        # Remembered for this process only; never persisted as a negative result
+        _rxnorm_failed.add(key)
 
     result = (None, "unmapped")
     _rxnorm_cache[key] = result
@@ -83,29 +105,72 @@ def _normalize_via_rxnorm(raw_name: str) -> Tuple[Optional[str], str]:
 
 
 def _rxcui_to_ingredient(rxcui: str) -> Optional[str]:
-    """Resolve an RxCUI to its ingredient-level name."""
-    try:
-        url = f"{_RXNAV_BASE}/rxcui/{rxcui}/related.json?tty=IN"
-        req = urllib.request.Request(url, headers={"Accept": "application/json"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json.loads(resp.read())
-
-        groups = data.get("relatedGroup", {}).get("conceptGroup", [])
-        for group in groups:
-            props = group.get("conceptProperties", [])
-            if props:
-                return props[0].get("name")
-
-        # If no ingredient relation, use the original concept name
-        url2 = f"{_RXNAV_BASE}/rxcui/{rxcui}/properties.json"
-        req2 = urllib.request.Request(url2, headers={"Accept": "application/json"})
-        with urllib.request.urlopen(req2, timeout=10) as resp2:
-            data2 = json.loads(resp2.read())
-        props = data2.get("properties", {})
-        return props.get("name")
+    """Resolve an RxCUI to its ingredient-level name.
 
-    except (urllib.error.URLError, OSError, json.JSONDecodeError, KeyError):
-        return None
+    Request errors propagate to ``_normalize_via_rxnorm``.
+    """
+    data = _get_json(f"{_RXNAV_BASE}/rxcui/{rxcui}/related.json?tty=IN")
+
+    groups = data.get("relatedGroup", {}).get("conceptGroup", [])
+    for group in groups:
+        props = group.get("conceptProperties", [])
+        if props:
+            return props[0].get("name")
+
+    # If no ingredient relation, use the original concept name
+    data2 = _get_json(f"{_RXNAV_BASE}/rxcui/{rxcui}/properties.json")
+    props = data2.get("properties", {})
+    return props.get("name")
+
+
+def _from_local(
+    index: rxnorm_local.RxNormIndex, raw_name: str
+) -> Tuple[Optional[str], str]:
+    name = index.lookup(raw_name)
+    return (name, "rxnorm_local") if name else (None, "unmapped")
+
+
+def resolve_rxnorm(
+    names: Iterable[str],
+    *,
+    max_workers: int = DEFAULT_RXNORM_WORKERS,
+    con: Optional["duckdb.DuckDBPyConnection"] = None,
+    use_api: bool = True,
+) -> dict[str, Tuple[Optional[str], str]]:
+    """Resolve many raw names through RxNorm concurrently.
+
+    When *con* holds an offline RxNorm index (``faers-signal rxnorm-load``),
+    every key is answered from it with source ``rxnorm_local`` and RxNav is
+    not contacted.  Otherwise distinct keys (``lower(strip(name))``) are
+    answered from the in-memory cache, then from the persistent
+    ``rxnorm_cache`` table when *con* is given; the rest are looked up by a
+    pool of *max_workers* threads sharing the process-wide rate limiter, and
+    stored back to the table (with ``use_api=False`` they stay unmapped).
+    Returns ``{key: (normalized_name or None, source)}`` for every non-empty
+    key.
+    """
+    keys = {n.lower().strip() for n in names if n and n.strip()}
+    index = rxnorm_local.ensure_loaded(con) if con is not None else rxnorm_local.active()
+    if index is not None:
+        return {k: _from_local(index, k) for k in keys}
+    out = {k: _rxnorm_cache[k] for k in keys if k in _rxnorm_cache}
+    todo = [k for k in keys if k not in out]
+    if todo and con is not None:
+        cached = rxnorm_cache.lookup(con, todo)
+        _rxnorm_cache.update(cached)
+        out.update(cached)
+        todo = [k for k in todo if k not in cached]
+    if todo and not use_api:
+        out.update((k, (None, "unmapped")) for k in todo)
+    elif todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(todo)))) as pool:
+            fetched = dict(zip(todo, pool.map(_normalize_via_rxnorm, todo)))
+        out.update(fetched)
+        if con is not None:
+            rxnorm_cache.store(
+                con, {k: v for k, v in fetched.items() if k not in _rxnorm_failed}
+            )
+    return out
 
 
 def normalize_drug_name(
@@ -118,11 +183,12 @@ def normalize_drug_name(
     Args:
         raw_name: Original drug name from the report.
         drug_dict: The full drug dict from openFDA (contains ``openfda`` sub-dict).
-        use_rxnorm_api: Whether to call the RxNorm API for unmatched names.
+        use_rxnorm_api: Whether to try RxNorm for unmatched names (the offline
+            index when active, otherwise the API).
 
     Returns:
         (normalized_name, source) where source is one of:
-        'openfda_harmonized', 'rxnorm_api', or 'unmapped'.
+        'openfda_harmonized', 'rxnorm_local', 'rxnorm_api', or 'unmapped'.
     """
     # Step 1: Try openFDA harmonized
     if drug_dict:
@@ -130,9 +196,13 @@ def normalize_drug_name(
         if harmonized:
             return (harmonized, "openfda_harmonized")
 
-    # Step 2: Try RxNorm API
+    # Step 2: Try RxNorm (offline index, else API)
     if use_rxnorm_api and raw_name.strip():
-        rx_name, rx_source = _normalize_via_rxnorm(raw_name)
+        index = rxnorm_local.active()
+        if index is not None:
+            rx_name, rx_source = _from_local(index, raw_name)
+        else:
+            rx_name, rx_source = _normalize_via_rxnorm(raw_name)
         if rx_name:
             return (rx_name, rx_source)
 
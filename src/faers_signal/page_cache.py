@@ -0,0 +1,122 @@
+"""On-disk cache of raw openFDA API pages, for resumable downloads and offline replay.
+
+Layout, one directory per search query::
+
+    <root>/<key>/query.checkpoint          JSON: search, total, pages fetched
+    <root>/<key>/skip-0000000.ndjson.gz    one event per line
+
+``key`` is derived from the ``search`` string alone (the API key is never
+part of it).  A page file is written to a temporary name and renamed before
+the checkpoint records it, so an interrupted run leaves at most an orphaned
+temporary file and the next run resumes after the last recorded page.
+
+The page files are plain gzipped NDJSON: ``etl --source openfda --input
+<root>`` ingests a whole cache without network access.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+CHECKPOINT = "query.checkpoint"
+
+
+def _key(search: Optional[str]) -> str:
+    return hashlib.sha256((search or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # The temporary name must not look like JSON to ``etl --input <root>``
+    tmp = path.with_name(path.name.split(".")[0] + ".partial")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class PageCache:
+    """Pages of openFDA queries under *root*, keyed by search query and ``skip``.
+
+    ``get`` may be called from several fetch threads; ``put`` and
+    ``set_total`` from one writer at a time per query.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._checkpoints: dict[str, dict[str, Any]] = {}
+
+    def _dir(self, search: Optional[str]) -> Path:
+        return self.root / _key(search)
+
+    def _page_path(self, search: Optional[str], skip: int) -> Path:
+        return self._dir(search) / f"skip-{skip:07d}.ndjson.gz"
+
+    def checkpoint(self, search: Optional[str]) -> dict[str, Any]:
+        """The query's progress: ``{"search", "total", "pages": {skip: [limit, n]}}``."""
+        key = _key(search)
+        with self._lock:
+            state = self._checkpoints.get(key)
+            if state is None:
+                path = self._dir(search) / CHECKPOINT
+                try:
+                    state = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    state = {"search": search, "total": None, "pages": {}}
+                self._checkpoints[key] = state
+            return state
+
+    def _save(self, search: Optional[str], state: dict[str, Any]) -> None:
+        folder = self._dir(search)
+        folder.mkdir(parents=True, exist_ok=True)
+        _write_atomic(folder / CHECKPOINT, json.dumps(state, sort_keys=True).encode("utf-8"))
+
+    def total(self, search: Optional[str]) -> Optional[int]:
+        """``meta.results.total`` recorded for the query, if known."""
+        return self.checkpoint(search).get("total")
+
+    def set_total(self, search: Optional[str], total: int) -> None:
+        state = self.checkpoint(search)
+        with self._lock:
+            state["total"] = int(total)
+            self._save(search, state)
+
+    def get(
+        self, search: Optional[str], skip: int, limit: int
+    ) -> Optional[list[dict[str, Any]]]:
+        """Cached results for the page, or ``None`` when it has to be fetched.
+
+        A page cached with a smaller ``limit`` only answers a larger request
+        when it was short, i.e. it already reached the end of the results.
+        """
+        entry = self.checkpoint(search)["pages"].get(str(skip))
+        if entry is None:
+            return None
+        cached_limit, n = entry
+        if n < limit and n >= cached_limit:
+            return None
+        try:
+            with gzip.open(self._page_path(search, skip), "rb") as f:
+                results = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return None
+        return results[:limit]
+
+    def put(
+        self, search: Optional[str], skip: int, limit: int, results: list[dict[str, Any]]
+    ) -> None:
+        """Store one fetched page and record it in the checkpoint."""
+        folder = self._dir(search)
+        folder.mkdir(parents=True, exist_ok=True)
+        body = b"".join(
+            json.dumps(ev, separators=(",", ":")).encode("utf-8") + b"\n" for ev in results
+        )
+        _write_atomic(self._page_path(search, skip), gzip.compress(body, compresslevel=6))
+        state = self.checkpoint(search)
+        with self._lock:
+            state["search"] = search
+            state["pages"][str(skip)] = [limit, len(results)]
+            self._save(search, state)
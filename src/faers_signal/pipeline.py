@@ -0,0 +1,154 @@
+"""Ordered, bounded producer/consumer pipeline on threads.
+
+``run_pipeline`` connects a source iterator, any number of worker stages and
+a sink that runs in the calling thread (the single DuckDB writer):
+
+    source ──q0──> stage 1 (n threads) ──q1──> stage 2 (m threads) ──q──> sink
+
+* Backpressure: at most ``window`` items are between the source and the sink
+  at any time, so queues and the reorder buffer stay bounded and a slow sink
+  throttles the source.
+* Order: items reach the sink in source order, whatever the stage
+  parallelism.
+* Errors: an exception in the source or a stage travels with its item and is
+  raised in the calling thread when the sink reaches that item, after every
+  earlier item has been consumed.  An exception from the sink, or a sink
+  returning ``False``, stops the pipeline.  Either way all threads are
+  joined before ``run_pipeline`` returns or raises.
+
+Stages spend most of their time in I/O, zlib or DuckDB, which release the
+GIL, so the overall wall-clock time tends to the slowest stage.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """A pipeline step: ``fn`` applied to every item by ``workers`` threads."""
+
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    name: str = ""
+
+
+class _Failed:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+
+def run_pipeline(
+    source: Iterable[Any],
+    stages: Sequence[Stage],
+    sink: Callable[[Any], Optional[bool]],
+    *,
+    window: int = 8,
+) -> None:
+    """Feed *source* through *stages* into *sink*; see the module docstring."""
+    window = max(1, window)
+    tickets = threading.Semaphore(window)
+    stop = threading.Event()
+    queues: list[queue.Queue] = [queue.Queue() for _ in range(len(stages) + 1)]
+    threads: list[threading.Thread] = []
+
+    counts = [max(1, s.workers) for s in stages]
+
+    def feed() -> None:
+        n_next = counts[0] if stages else 1
+        seq = 0
+        try:
+            for item in source:
+                while not tickets.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                queues[0].put((seq, item))
+                seq += 1
+        except BaseException as e:  # noqa: BLE001 - delivered to the caller in order
+            queues[0].put((seq, _Failed(e)))
+        finally:
+            for _ in range(n_next):
+                queues[0].put(_DONE)
+
+    def work(i: int, stage: Stage, remaining: list[int], lock: threading.Lock) -> None:
+        inq, outq = queues[i], queues[i + 1]
+        n_next = counts[i + 1] if i + 1 < len(stages) else 1
+        while True:
+            msg = inq.get()
+            if msg is _DONE:
+                break
+            seq, item = msg
+            if not isinstance(item, _Failed) and not stop.is_set():
+                try:
+                    item = stage.fn(item)
+                except BaseException as e:  # noqa: BLE001
+                    item = _Failed(e)
+            outq.put((seq, item))
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(n_next):
+                outq.put(_DONE)
+
+    threads.append(threading.Thread(target=feed, name="pipeline-source", daemon=True))
+    for i, stage in enumerate(stages):
+        remaining, lock = [counts[i]], threading.Lock()
+        for w in range(counts[i]):
+            threads.append(
+                threading.Thread(
+                    target=work,
+                    args=(i, stage, remaining, lock),
+                    name=f"pipeline-{stage.name or i}-{w}",
+                    daemon=True,
+                )
+            )
+    for t in threads:
+        t.start()
+
+    error: Optional[BaseException] = None
+    pending: dict[int, Any] = {}
+    expected = 0
+    out = queues[-1]
+    try:
+        while True:
+            msg = out.get()
+            if msg is _DONE:
+                break
+            seq, item = msg
+            pending[seq] = item
+            while expected in pending:
+                item = pending.pop(expected)
+                expected += 1
+                if stop.is_set():
+                    continue
+                if isinstance(item, _Failed):
+                    error = item.exc
+                    stop.set()
+                    continue
+                try:
+                    if sink(item) is False:
+                        stop.set()
+                except BaseException as e:  # noqa: BLE001
+                    error = e
+                    stop.set()
+                finally:
+                    # The ticket is returned once the sink is done with the item
+                    tickets.release()
+    finally:
+        # Stages skip their work once stopped, so the threads wind down quickly
+        stop.set()
+        tickets.release(window)  # a source waiting for a ticket sees the stop
+        for t in threads:
+            t.join()
+    if error is not None:
+        raise error
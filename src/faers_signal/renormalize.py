@@ -0,0 +1,154 @@
+"""Re-apply drug name normalization to rows already in the database.
+
+Normalization is frozen into ``drugs.drug_name_normalized`` /
+``drug_norm_source`` at ingest.  ``renormalize`` brings existing rows up to
+date with the current mapping (RxNorm cache, offline RRF index, manual
+overrides) without re-ingesting:
+
+  1. the distinct ``lower(trim(drug_name))`` keys of the eligible rows are
+     resolved once through ``normalize_drug.resolve_rxnorm``
+  2. optional manual overrides (``drug_name``/``name_key``, ``normalized``)
+     take precedence, with source ``manual``
+  3. one set-based ``UPDATE ... FROM`` rewrites only the rows whose result
+     changed
+
+``openfda_harmonized`` rows came from fields that are not stored, so only
+manual overrides touch them; ``manual`` rows are never re-resolved by the
+chain, and a name the chain cannot resolve keeps its current mapping.
+
+Reports whose drug key (``COALESCE(drug_name_normalized, lower(drug_name))``)
+changes are retracted from the cube before the update, re-encoded and
+applied again after it, in one transaction.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import duckdb
+import pandas as pd
+
+from . import cube, dims, generation
+from .normalize_drug import DEFAULT_RXNORM_WORKERS, resolve_rxnorm
+
+_SOURCE = "COALESCE(d.drug_norm_source, 'unmapped')"
+
+
+def _chain_filter(only_unmapped: bool) -> str:
+    """Rows the normalization chain may rewrite."""
+    if only_unmapped:
+        return f"{_SOURCE} = 'unmapped'"
+    return f"{_SOURCE} NOT IN ('openfda_harmonized', 'manual')"
+
+
+def _load_overrides(con: duckdb.DuckDBPyConnection, path: Path) -> None:
+    """Materialize ``_renorm_manual(name_key, normalized)`` from a CSV/Parquet file."""
+    reader = "read_csv_auto" if path.suffix.lower() == ".csv" else "read_parquet"
+    rel = con.execute(f"SELECT * FROM {reader}($src) LIMIT 0", {"src": str(path)})
+    cols = {d[0] for d in rel.description}
+    key = next((c for c in ("name_key", "drug_name") if c in cols), None)
+    if key is None or "normalized" not in cols:
+        raise ValueError(f"{path} needs a drug_name (or name_key) and a normalized column")
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE _renorm_manual AS "
+        f"SELECT lower(trim({key})) AS name_key, lower(trim(normalized)) AS normalized "
+        f"FROM {reader}($src) "
+        f"WHERE COALESCE(trim({key}), '') <> '' AND COALESCE(trim(normalized), '') <> '' "
+        f"QUALIFY row_number() OVER (PARTITION BY lower(trim({key}))) = 1",
+        {"src": str(path)},
+    )
+
+
+def renormalize(
+    con: duckdb.DuckDBPyConnection,
+    *,
+    only_unmapped: bool = False,
+    overrides: Optional[Path] = None,
+    use_api: bool = True,
+    max_workers: int = DEFAULT_RXNORM_WORKERS,
+) -> dict[str, int]:
+    """Rewrite the normalized drug columns from the current mapping.
+
+    Returns counts: distinct ``names`` resolved, ``rows`` updated and
+    ``reports`` whose ABCD contribution was recomputed.
+    """
+    chain = _chain_filter(only_unmapped)
+    names = [
+        k
+        for (k,) in con.execute(
+            f"SELECT DISTINCT lower(trim(d.drug_name)) FROM drugs d "
+            f"WHERE COALESCE(trim(d.drug_name), '') <> '' AND {chain}"
+        ).fetchall()
+    ]
+    resolved = resolve_rxnorm(names, con=con, max_workers=max_workers, use_api=use_api)
+    frame = pd.DataFrame(
+        {
+            "name_key": names,
+            "normalized": [resolved[k][0] or k for k in names],
+            "source": [resolved[k][1] for k in names],
+        }
+    )
+
+    manual_filter = f"{_SOURCE} = 'unmapped'" if only_unmapped else "TRUE"
+    con.register("_renorm_chain", frame)
+    try:
+        if overrides is not None:
+            _load_overrides(con, overrides)
+        else:
+            con.execute(
+                "CREATE OR REPLACE TEMP TABLE _renorm_manual "
+                "(name_key VARCHAR, normalized VARCHAR)"
+            )
+        con.execute(
+            f"""
+CREATE OR REPLACE TEMP TABLE _renorm_rows AS
+WITH m AS (
+  SELECT name_key, normalized, 'manual' AS source, TRUE AS manual FROM _renorm_manual
+  UNION ALL
+  SELECT name_key, normalized, source, FALSE FROM _renorm_chain c
+  WHERE NOT EXISTS (SELECT 1 FROM _renorm_manual o WHERE o.name_key = c.name_key)
+)
+SELECT d.rowid AS rid, d.safetyreportid, m.normalized, m.source,
+       COALESCE(d.drug_name_normalized, lower(d.drug_name)) IS DISTINCT FROM m.normalized
+         AS key_changed
+FROM drugs d
+JOIN m ON m.name_key = lower(trim(d.drug_name))
+WHERE CASE WHEN m.manual THEN {manual_filter} ELSE {chain} END
+  -- A missing answer never demotes an existing mapping
+  AND (m.source <> 'unmapped' OR {_SOURCE} = 'unmapped')
+  AND (d.drug_name_normalized IS DISTINCT FROM m.normalized
+       OR d.drug_norm_source IS DISTINCT FROM m.source)
+"""
+        )
+    finally:
+        con.unregister("_renorm_chain")
+
+    try:
+        n_rows = con.execute("SELECT COUNT(*) FROM _renorm_rows").fetchone()[0]
+        sids = [
+            s
+            for (s,) in con.execute(
+                "SELECT DISTINCT safetyreportid FROM _renorm_rows WHERE key_changed"
+            ).fetchall()
+        ]
+        if n_rows:
+            con.execute("BEGIN TRANSACTION")
+            try:
+                cube.retract(con, sids)
+                con.execute(
+                    "UPDATE drugs SET drug_name_normalized = r.normalized, "
+                    "drug_norm_source = r.source, "
+                    "drug_id = CASE WHEN r.key_changed THEN NULL ELSE drugs.drug_id END "
+                    "FROM _renorm_rows r WHERE drugs.rowid = r.rid"
+                )
+                dims.encode(con)
+                cube.apply(con, sids)
+                generation.bump(con)
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+    finally:
+        for name in ("_renorm_rows", "_renorm_manual"):
+            con.execute(f"DROP TABLE IF EXISTS {name}")
+    return {"names": len(names), "rows": int(n_rows), "reports": len(sids)}
@@ -0,0 +1,206 @@
+"""Content-addressed on-disk cache of scored results.
+
+Layout under *root*::
+
+    <key>.parquet       scored rows (the columns ``build`` writes)
+    <key>.json          spec, data fingerprint, row and signal counts
+    stats.json          cumulative hits, misses and evictions
+
+``key`` hashes the canonical ``AnalysisSpec`` JSON together with the data
+fingerprint (``generation.fingerprint``), so any write to the fact tables
+makes older entries unreachable; they age out of the cache instead of being
+invalidated.  Presentation settings (ranking, TopN, volcano axis) do not
+change the rows and are left out of the key, and the role set is hashed in
+its resolved form, so ``build`` and the UI share entries for the same
+analysis.
+
+A hit refreshes the entry's modification time; after every new entry the least
+recently used other entries are deleted until the cache fits ``max_bytes``.
+A result larger than ``max_bytes`` on its own is not cached at all.
+Several processes may share one directory: entries are written to a
+temporary name and renamed, and at worst a concurrent update of the
+statistics is lost.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .analysis_spec import AnalysisSpec
+from .result_sink import ResultSink
+
+DEFAULT_MAX_BYTES = 2 << 30
+STATS = "stats.json"
+
+# AnalysisSpec fields that only affect how results are shown
+_PRESENTATION = ("volcano_y_axis", "fdr_test_set", "ranking_criterion", "top_n", "tie_breaker")
+
+
+def canonical_spec(spec: AnalysisSpec) -> str:
+    """``AnalysisSpec.to_json`` with sorted keys, roles resolved and presentation fields removed."""
+    d = spec.to_dict()
+    for name in _PRESENTATION:
+        d.pop(name, None)
+    d.pop("suspect_only", None)
+    d["role_set"] = list(spec.roles())
+    return json.dumps(d, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def cache_key(spec: AnalysisSpec, fingerprint: str) -> str:
+    payload = f"{canonical_spec(spec)}\n{fingerprint}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".partial")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class ResultCache:
+    """Scored results under *root*, at most *max_bytes* of Parquet in total.
+
+    ``hits`` and ``misses`` count this instance's lookups; ``stats`` also
+    reports the totals of every process using the directory.
+    """
+
+    def __init__(self, root: Path, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be >= 0")
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.parquet"
+
+    def _count(self, **deltas: int) -> None:
+        totals = self._totals()
+        for name, n in deltas.items():
+            totals[name] = totals.get(name, 0) + n
+        self.root.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.root / STATS, json.dumps(totals))
+
+    def _totals(self) -> dict[str, int]:
+        try:
+            return json.loads((self.root / STATS).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, spec: AnalysisSpec, fingerprint: str) -> Optional[Path]:
+        """Parquet file of a cached result, or ``None``; counts a hit or a miss."""
+        path = self._path(cache_key(spec, fingerprint))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            self._count(misses=1)
+            return None
+        self.hits += 1
+        self._count(hits=1)
+        return path
+
+    def writer(self, spec: AnalysisSpec, fingerprint: str, **sink_options: Any) -> ResultSink:
+        """A ``ResultSink`` for a new entry; pass it to ``commit`` or ``discard`` when done."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        key = cache_key(spec, fingerprint)
+        return ResultSink(self.root / f"{key}.{os.getpid()}.partial", **sink_options)
+
+    def commit(
+        self, spec: AnalysisSpec, fingerprint: str, sink: ResultSink, *, signals: int = 0
+    ) -> Optional[Path]:
+        """Close *sink* and publish it as the entry for *spec* on *fingerprint*.
+
+        Returns ``None`` (and discards *sink*) when the result alone exceeds
+        ``max_bytes``.
+        """
+        sink.close()
+        if sink.out.stat().st_size > self.max_bytes:
+            sink.out.unlink(missing_ok=True)
+            return None
+        key = cache_key(spec, fingerprint)
+        path = self._path(key)
+        info = {
+            "spec": json.loads(canonical_spec(spec)),
+            "fingerprint": fingerprint,
+            "rows": sink.rows,
+            "signals": int(signals),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        _write_atomic(self.root / f"{key}.json", json.dumps(info, indent=2))
+        os.replace(sink.out, path)
+        self.evict(keep=path)
+        return path
+
+    def discard(self, sink: ResultSink) -> None:
+        sink.close()
+        sink.out.unlink(missing_ok=True)
+
+    def put(
+        self, spec: AnalysisSpec, fingerprint: str, data: Union[pa.Table, pa.RecordBatch]
+    ) -> Optional[Path]:
+        """Cache an in-memory result; ``None`` if it exceeds ``max_bytes``."""
+        sink = self.writer(spec, fingerprint)
+        sink.write(data)
+        signals = int(pc.sum(data.column("Signal")).as_py() or 0)
+        return self.commit(spec, fingerprint, sink, signals=signals)
+
+    def info(self, path: Path) -> dict[str, Any]:
+        """The ``<key>.json`` written next to the cached file *path*."""
+        return json.loads(Path(path).with_suffix(".json").read_text(encoding="utf-8"))
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.root.glob("*.parquet"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self, *, keep: Optional[Path] = None) -> int:
+        """Delete least recently used entries until the cache fits; return how many.
+
+        The entry *keep* is never deleted.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        n = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+            n += 1
+        if n:
+            self._count(evictions=n)
+        return n
+
+    def clear(self) -> int:
+        """Delete every entry; the statistics are kept."""
+        entries = self._entries()
+        for _, _, path in entries:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+        return len(entries)
+
+    def stats(self) -> dict[str, int]:
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            **self._totals(),
+        }
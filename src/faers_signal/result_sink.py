@@ -0,0 +1,145 @@
+"""Stream Arrow data into one Parquet or CSV file.
+
+Results are written as they are produced – record batch by record batch
+from a DuckDB query (``stream_query``), or part by part when a result is
+computed in pieces (e.g. one ABCD query per drug bucket) – so memory use
+is bounded by one Parquet row group, whatever the size of the result.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import duckdb
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# Rows fetched from DuckDB per record batch
+BATCH_ROWS = 1 << 17
+
+
+class ResultSink:
+    """Parquet (default) or CSV writer whose schema is fixed by the first write.
+
+    Empty parts do not fix the schema (an empty pandas frame converts to null
+    columns); the file is still created on ``close`` when every part was empty.
+
+    Args:
+        out: Target path; ``.csv`` writes CSV with a header, anything else Parquet.
+        row_group_size: Rows per Parquet row group.  Batches are buffered up
+            to this size; ``None`` writes every batch as its own row group.
+        compression: Parquet codec (``snappy``, ``zstd``, ``gzip``, ``lz4``,
+            ``brotli`` or ``none``); ``None`` keeps pyarrow's default.
+    """
+
+    def __init__(
+        self,
+        out: Path,
+        *,
+        row_group_size: Optional[int] = None,
+        compression: Optional[str] = None,
+    ) -> None:
+        self.out = Path(out)
+        self.is_csv = self.out.suffix.lower() == ".csv"
+        if row_group_size is not None and row_group_size < 1:
+            raise ValueError("row_group_size must be >= 1")
+        if compression and self.is_csv:
+            raise ValueError("compression applies to Parquet output only")
+        if compression and compression.lower() != "none" and not pa.Codec.is_available(
+            compression
+        ):
+            raise ValueError(f"Unknown or unavailable Parquet codec: {compression!r}")
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows = 0
+        self.schema: Optional[pa.Schema] = None
+        self._empty_schema: Optional[pa.Schema] = None
+        self._pending: list[pa.RecordBatch] = []
+        self._pending_rows = 0
+        self._writer: Optional[Union[pq.ParquetWriter, pacsv.CSVWriter]] = None
+
+    def open(self, schema: pa.Schema) -> None:
+        if self._writer is not None:
+            return
+        self.out.parent.mkdir(parents=True, exist_ok=True)
+        self.schema = schema
+        if self.is_csv:
+            self._writer = pacsv.CSVWriter(str(self.out), schema)
+        else:
+            kwargs: dict[str, Any] = {}
+            if self.compression:
+                kwargs["compression"] = self.compression
+            self._writer = pq.ParquetWriter(str(self.out), schema, **kwargs)
+
+    def _flush(self, *, final: bool = False) -> None:
+        """Write the buffered rows as full row groups; *final* also writes the remainder."""
+        if not self._pending:
+            return
+        table = pa.Table.from_batches(self._pending, schema=self.schema)
+        size = self.row_group_size
+        n = table.num_rows if final else table.num_rows - table.num_rows % size
+        if n:
+            self._writer.write_table(table.slice(0, n), row_group_size=size)
+        rest = table.slice(n)
+        self._pending, self._pending_rows = rest.to_batches(), rest.num_rows
+
+    def write(self, data: Union[pa.Table, pa.RecordBatch]) -> None:
+        """Append *data*; later parts are cast to the schema of the first."""
+        if self._writer is None and data.num_rows == 0:
+            self._empty_schema = data.schema
+            return
+        self.open(data.schema)
+        schema = self.schema
+        if not data.schema.equals(schema):
+            data = pa.Table.from_batches([data]) if isinstance(data, pa.RecordBatch) else data
+            data = data.select(schema.names).cast(schema)
+        self.rows += data.num_rows
+        if self.is_csv or self.row_group_size is None:
+            if isinstance(data, pa.RecordBatch):
+                self._writer.write_batch(data)
+            else:
+                self._writer.write_table(data)
+            return
+        self._pending.extend(data.to_batches() if isinstance(data, pa.Table) else [data])
+        self._pending_rows += data.num_rows
+        if self._pending_rows >= self.row_group_size:
+            self._flush()
+
+    def close(self) -> None:
+        if self._writer is None and self._empty_schema is not None:
+            self.open(self._empty_schema)
+        if self._writer is not None:
+            self._flush(final=True)
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self) -> ResultSink:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def stream_query(
+    con: duckdb.DuckDBPyConnection,
+    sql: str,
+    params: Optional[dict[str, Any]],
+    sink: ResultSink,
+    *,
+    on_batch: Optional[Callable[[pa.RecordBatch], None]] = None,
+) -> int:
+    """Write the rows of *sql* to *sink* as DuckDB produces them; return the row count.
+
+    *on_batch* sees every batch before it is written (e.g. to gather
+    statistics for a manifest).
+    """
+    reader = con.execute(sql, params or {}).to_arrow_reader(BATCH_ROWS)
+    sink.open(reader.schema)
+    n = 0
+    for batch in reader:
+        if on_batch is not None:
+            on_batch(batch)
+        sink.write(batch)
+        n += batch.num_rows
+    return n
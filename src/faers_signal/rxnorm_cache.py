@@ -0,0 +1,179 @@
+"""Persistent RxNorm lookup cache in the ``rxnorm_cache`` table.
+
+``normalize_drug`` keeps an in-memory cache per process; this table makes the
+answers survive across CLI runs and UI sessions.  Rows are keyed by the
+lowercased, trimmed raw name and store positive results (``rxnorm_api``) as
+well as negative ones (``unmapped``, ``normalized`` NULL).  Lookups that
+failed because RxNav could not be reached are never stored.
+
+Policy (see ``configure``):
+  ttl_days      – entries older than this are ignored and looked up again
+  max_entries   – after each write the least recently used rows beyond this
+                  count are deleted
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from ._sqlutil import sql_path
+
+
+@dataclass
+class CachePolicy:
+    ttl_days: int = 90
+    max_entries: int = 500_000
+
+
+policy = CachePolicy()
+
+
+def configure(*, ttl_days: Optional[int] = None, max_entries: Optional[int] = None) -> None:
+    """Override the process-wide cache policy (``None`` keeps the current value)."""
+    if ttl_days is not None:
+        policy.ttl_days = int(ttl_days)
+    if max_entries is not None:
+        policy.max_entries = int(max_entries)
+
+
+def _fresh_cond() -> str:
+    return f"fetched_at >= now()::TIMESTAMP - INTERVAL {int(policy.ttl_days)} DAY"
+
+
+def lookup(
+    con: duckdb.DuckDBPyConnection, keys: Iterable[str]
+) -> dict[str, Tuple[Optional[str], str]]:
+    """Return fresh cached results for *keys* and mark them as recently used."""
+    frame = pd.DataFrame({"name_key": pd.unique(pd.Series(list(keys), dtype=object))})
+    if frame.empty:
+        return {}
+    con.register("_rxc_keys", frame)
+    try:
+        rows = con.execute(
+            "SELECT c.name_key, c.normalized, c.source FROM rxnorm_cache c "
+            f"JOIN _rxc_keys k USING (name_key) WHERE {_fresh_cond()}"
+        ).fetchall()
+        con.execute(
+            "UPDATE rxnorm_cache SET last_used = now()::TIMESTAMP "
+            f"WHERE name_key IN (SELECT name_key FROM _rxc_keys) AND {_fresh_cond()}"
+        )
+    finally:
+        con.unregister("_rxc_keys")
+    return {k: (n, s) for k, n, s in rows}
+
+
+def _upsert(con: duckdb.DuckDBPyConnection, relation: str) -> None:
+    con.execute(
+        "INSERT INTO rxnorm_cache (name_key, normalized, source, fetched_at, last_used) "
+        f"SELECT name_key, normalized, source, fetched_at, last_used FROM {relation} "
+        "ON CONFLICT (name_key) DO UPDATE SET normalized = excluded.normalized, "
+        "source = excluded.source, fetched_at = excluded.fetched_at, "
+        "last_used = excluded.last_used"
+    )
+
+
+def store(
+    con: duckdb.DuckDBPyConnection, results: dict[str, Tuple[Optional[str], str]]
+) -> None:
+    """Insert or refresh *results* (``{key: (normalized or None, source)}``), then evict."""
+    if not results:
+        return
+    frame = pd.DataFrame(
+        {
+            "name_key": list(results),
+            "normalized": [v[0] for v in results.values()],
+            "source": [v[1] for v in results.values()],
+        }
+    )
+    con.register("_rxc_new", frame)
+    try:
+        _upsert(
+            con,
+            "(SELECT name_key, normalized, source, now()::TIMESTAMP AS fetched_at, "
+            "now()::TIMESTAMP AS last_used FROM _rxc_new)",
+        )
+    finally:
+        con.unregister("_rxc_new")
+    evict(con)
+
+
+def evict(con: duckdb.DuckDBPyConnection, max_entries: Optional[int] = None) -> int:
+    """Delete the least recently used rows beyond *max_entries*; return how many."""
+    limit = policy.max_entries if max_entries is None else int(max_entries)
+    before = con.execute("SELECT COUNT(*) FROM rxnorm_cache").fetchone()[0]
+    if before <= limit:
+        return 0
+    con.execute(
+        "DELETE FROM rxnorm_cache WHERE name_key IN ("
+        "SELECT name_key FROM rxnorm_cache "
+        "ORDER BY last_used DESC, fetched_at DESC, name_key OFFSET $keep)",
+        {"keep": limit},
+    )
+    return before - limit
+
+
+def stats(con: duckdb.DuckDBPyConnection) -> dict[str, int]:
+    row = con.execute(
+        "SELECT COUNT(*), COUNT(normalized), "
+        f"COUNT(*) FILTER (WHERE NOT ({_fresh_cond()})) FROM rxnorm_cache"
+    ).fetchone()
+    return {"entries": row[0], "positive": row[1], "negative": row[0] - row[1], "expired": row[2]}
+
+
+def _reader(path: Path) -> str:
+    return "read_csv_auto" if path.suffix.lower() == ".csv" else "read_parquet"
+
+
+def export(con: duckdb.DuckDBPyConnection, out: Path) -> int:
+    """Write the cache to Parquet, or CSV when *out* ends in ``.csv``."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+    fmt = "(FORMAT CSV, HEADER)" if out.suffix.lower() == ".csv" else "(FORMAT PARQUET)"
+    con.execute(
+        f"COPY (SELECT * FROM rxnorm_cache ORDER BY name_key) TO '{sql_path(out)}' {fmt}"
+    )
+    return con.execute("SELECT COUNT(*) FROM rxnorm_cache").fetchone()[0]
+
+
+def preload(con: duckdb.DuckDBPyConnection, src: Path) -> int:
+    """Merge a Parquet/CSV file into the cache; return the number of rows read.
+
+    Only ``name_key`` and ``normalized`` are required.  Keys are lowercased and
+    trimmed; missing ``source`` is derived from ``normalized`` and missing
+    timestamps default to now.
+    """
+    rel = con.execute(f"SELECT * FROM {_reader(src)}($src) LIMIT 0", {"src": str(src)})
+    cols = {d[0] for d in rel.description}
+    if not {"name_key", "normalized"} <= cols:
+        raise ValueError(f"{src} needs at least name_key and normalized columns")
+    source = (
+        "COALESCE(source, CASE WHEN normalized IS NULL THEN 'unmapped' ELSE 'rxnorm_api' END)"
+        if "source" in cols
+        else "CASE WHEN normalized IS NULL THEN 'unmapped' ELSE 'rxnorm_api' END"
+    )
+    fetched = (
+        "COALESCE(CAST(fetched_at AS TIMESTAMP), now()::TIMESTAMP)"
+        if "fetched_at" in cols
+        else "now()::TIMESTAMP"
+    )
+    con.execute(
+        f"""
+CREATE OR REPLACE TEMP TABLE _rxc_load AS
+SELECT lower(trim(name_key)) AS name_key, lower(normalized) AS normalized,
+       {source} AS source, {fetched} AS fetched_at, now()::TIMESTAMP AS last_used
+FROM {_reader(src)}($src)
+WHERE COALESCE(trim(name_key), '') <> ''
+QUALIFY row_number() OVER (PARTITION BY lower(trim(name_key)) ORDER BY {fetched} DESC) = 1
+""",
+        {"src": str(src)},
+    )
+    try:
+        n = con.execute("SELECT COUNT(*) FROM _rxc_load").fetchone()[0]
+        _upsert(con, "_rxc_load")
+    finally:
+        con.execute("DROP TABLE IF EXISTS _rxc_load")
+    evict(con)
+    return n
@@ -0,0 +1,82 @@
+-- Ingredient resolution and name lookup for offline RxNorm (see rxnorm_local.py).
+-- Inputs: rxnorm_conso(rxcui, sab, tty, str, suppress), rxnorm_rel(rxcui1, rela, rxcui2).
+
+-- Level of each RxNorm concept in the drug hierarchy; relations are only
+-- followed towards a lower level, ending at the ingredient (IN, level 0).
+-- Branded concepts sit above their generic counterparts so that an SBD
+-- resolves through its SCD rather than through a brand shared by products.
+CREATE OR REPLACE TEMP TABLE _rxn_level AS
+SELECT rxcui,
+       min(CASE tty
+             WHEN 'IN' THEN 0
+             WHEN 'PIN' THEN 1 WHEN 'MIN' THEN 1 WHEN 'BN' THEN 1
+             WHEN 'SCDC' THEN 2 WHEN 'SCDF' THEN 2 WHEN 'SCDG' THEN 2
+             WHEN 'SBDC' THEN 3 WHEN 'SBDF' THEN 3 WHEN 'SBDG' THEN 3
+             WHEN 'SCD' THEN 4 WHEN 'SBD' THEN 5
+             WHEN 'GPCK' THEN 6 WHEN 'BPCK' THEN 7
+           END) AS lvl,
+       bool_or(tty = 'BN') AS is_brand
+FROM rxnorm_conso
+WHERE sab = 'RXNORM'
+GROUP BY rxcui
+HAVING lvl IS NOT NULL;
+
+-- RRF stores relations in both directions; keep the downward ones and never
+-- enter a brand name from another concept
+CREATE OR REPLACE TEMP TABLE _rxn_down AS
+SELECT DISTINCT e.src, e.dst
+FROM (
+  SELECT rxcui1 AS src, rxcui2 AS dst FROM rxnorm_rel
+  UNION ALL
+  SELECT rxcui2, rxcui1 FROM rxnorm_rel
+) e
+JOIN _rxn_level a ON a.rxcui = e.src
+JOIN _rxn_level b ON b.rxcui = e.dst
+WHERE b.lvl < a.lvl AND NOT b.is_brand;
+
+CREATE OR REPLACE TABLE rxnorm_ingredient AS
+WITH RECURSIVE walk(rxcui, node) AS (
+  SELECT rxcui, rxcui FROM _rxn_level
+  UNION
+  SELECT w.rxcui, d.dst FROM walk w JOIN _rxn_down d ON d.src = w.node
+),
+ing AS (
+  SELECT DISTINCT rxcui, lower(str) AS name
+  FROM rxnorm_conso
+  WHERE sab = 'RXNORM' AND tty = 'IN'
+)
+-- Multi-ingredient products are named like RxNorm MIN concepts: "a / b"
+SELECT w.rxcui, string_agg(DISTINCT i.name, ' / ' ORDER BY i.name) AS ingredient
+FROM walk w
+JOIN ing i ON i.rxcui = w.node
+GROUP BY w.rxcui;
+
+-- Every English name of a resolved concept (any source vocabulary); on key
+-- collisions RxNorm's own ingredient-level names win over products and
+-- synonyms, and current names over obsolete ones
+DELETE FROM rxnorm_lookup;
+INSERT INTO rxnorm_lookup (name_key, ingredient, priority)
+SELECT name_key, ingredient, priority
+FROM (
+  SELECT lower(trim(c.str)) AS name_key,
+         g.ingredient,
+         CASE
+           WHEN c.sab <> 'RXNORM' THEN 6
+           WHEN c.tty = 'IN' THEN 0
+           WHEN c.tty = 'PIN' THEN 1
+           WHEN c.tty = 'MIN' THEN 2
+           WHEN c.tty = 'BN' THEN 3
+           WHEN c.tty IN ('SY', 'TMSY') THEN 4
+           ELSE 5
+         END + CASE WHEN COALESCE(c.suppress, 'N') = 'N' THEN 0 ELSE 10 END AS priority
+  FROM rxnorm_conso c
+  JOIN rxnorm_ingredient g USING (rxcui)
+  WHERE trim(c.str) <> ''
+)
+QUALIFY row_number() OVER (PARTITION BY name_key ORDER BY priority, ingredient) = 1;
+
+DELETE FROM rxnorm_lookup_meta;
+INSERT INTO rxnorm_lookup_meta VALUES (now());
+
+DROP TABLE _rxn_level;
+DROP TABLE _rxn_down;
@@ -0,0 +1,286 @@
+"""Offline RxNorm normalization from the RxNorm RRF release files.
+
+``load_rrf`` imports ``RXNCONSO.RRF`` / ``RXNREL.RRF`` (from a directory or
+the release zip) into ``rxnorm_conso`` / ``rxnorm_rel`` and precomputes, in
+SQL (``rxnorm_index.sql``), the ingredient (TTY=IN) of every concept and a
+``rxnorm_lookup(name_key, ingredient, priority)`` table of all English names.
+
+``RxNormIndex`` is the in-memory lookup built from that table:
+  1. exact match on ``lower(trim(name))``
+  2. token key – dose numbers, units and dose-form words dropped, remaining
+     tokens sorted (``"TYLENOL 500MG TABLETS"`` -> ``"tylenol"``)
+  3. approximate match on the token key with a trigram inverted index (Dice
+     similarity >= ``min_similarity``), standing in for RxNav's
+     ``approximateTerm``
+
+While an index is active, ``normalize_drug`` uses it instead of the RxNav
+API (source ``rxnorm_local``), so no network access is needed.
+"""
+from __future__ import annotations
+
+import re
+import shutil
+import tempfile
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import duckdb
+import numpy as np
+
+from . import _resources
+from ._sqlutil import sql_path
+
+DEFAULT_MIN_SIMILARITY = 0.7
+
+# Approximate results remembered per index; cleared when full
+_MEMO_LIMIT = 1_000_000
+
+_CONSO_COLUMNS = (
+    "rxcui lat ts lui stt sui ispref rxaui saui scui sdui sab tty code str srl suppress cvf"
+).split()
+_REL_COLUMNS = (
+    "rxcui1 rxaui1 stype1 rel rxcui2 rxaui2 stype2 rela rui srui sab sl dg dir suppress cvf"
+).split()
+
+# Words that describe strength or dose form rather than the product
+_NOISE = frozenset(
+    """
+    mg mcg ug g kg ml l iu unit units meq mmol hr h
+    tab tabs tablet tablets cap caps capsule capsules oral solution soln susp suspension
+    inj injection injectable infusion syrup elixir drops cream ointment gel lotion patch
+    spray inhaler inhalation powder film coated chewable extended delayed release er xr
+    sr dr cr la odt topical nasal ophthalmic vial pen kit hcl hbr
+    """.split()
+)
+_TOKEN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+
+def token_key(name: str) -> str:
+    """Canonical token form of *name*: lowercase words minus strength/form noise, sorted."""
+    words = {
+        t for t in _TOKEN.findall(name.lower()) if not t[0].isdigit() and t not in _NOISE
+    }
+    return " ".join(sorted(words))
+
+
+def _trigrams(s: str) -> set[str]:
+    padded = f"  {s} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class RxNormIndex:
+    """Exact, token and trigram lookup from drug names to ingredient names.
+
+    *rows* are ``(name_key, ingredient)`` pairs in priority order; the first
+    ingredient seen for a key (or token key) wins.
+    """
+
+    def __init__(
+        self,
+        rows: Iterable[tuple[str, str]],
+        *,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    ) -> None:
+        self.min_similarity = float(min_similarity)
+        self.exact: dict[str, str] = {}
+        by_tokens: dict[str, str] = {}
+        for key, ingredient in rows:
+            self.exact.setdefault(key, ingredient)
+            tk = token_key(key)
+            if tk:
+                by_tokens.setdefault(tk, ingredient)
+        self._by_tokens = by_tokens
+        self._keys = list(by_tokens)
+        postings: dict[str, list[int]] = defaultdict(list)
+        sizes = np.empty(len(self._keys), dtype=np.int32)
+        for i, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            sizes[i] = len(grams)
+            for gram in grams:
+                postings[gram].append(i)
+        self._sizes = sizes
+        self._postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._memo: dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Return the ingredient for *name*, or ``None`` when nothing is close enough."""
+        key = name.lower().strip()
+        hit = self.exact.get(key)
+        if hit is not None or not key:
+            return hit
+        if key in self._memo:
+            return self._memo[key]
+        tk = token_key(key)
+        hit = (self._by_tokens.get(tk) or self._approximate(tk)) if tk else None
+        if len(self._memo) >= _MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = hit
+        return hit
+
+    def _approximate(self, tk: str) -> Optional[str]:
+        query = _trigrams(tk)
+        lists = [self._postings[g] for g in query if g in self._postings]
+        if not lists:
+            return None
+        # Shared trigrams per candidate key, counted over the query's postings
+        ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        score = 2 * shared / (len(query) + self._sizes[ids])
+        best = score.max()
+        if best < self.min_similarity:
+            return None
+        top = min((self._keys[i] for i in ids[score == best]), key=lambda k: (len(k), k))
+        return self._by_tokens[top]
+
+
+_active: Optional[RxNormIndex] = None
+_pinned = False
+# (database path, lookup version) that _active was built from
+_loaded_from: Optional[tuple[Any, ...]] = None
+
+
+def active() -> Optional[RxNormIndex]:
+    """The index currently used by ``normalize_drug``, if any."""
+    return _active
+
+
+def activate(index: Optional[RxNormIndex]) -> None:
+    """Use *index* for offline normalization (``None`` switches back to RxNav).
+
+    The choice sticks until ``reset``: ``ensure_loaded`` no longer reads the
+    database.
+    """
+    global _active, _pinned, _loaded_from
+    _active = index
+    _pinned = True
+    _loaded_from = None
+
+
+def reset() -> None:
+    """Forget the active index; the next ``ensure_loaded`` reads the database again."""
+    global _active, _pinned, _loaded_from
+    _active = None
+    _pinned = False
+    _loaded_from = None
+
+
+def load_index(
+    con: duckdb.DuckDBPyConnection, *, min_similarity: float = DEFAULT_MIN_SIMILARITY
+) -> Optional[RxNormIndex]:
+    """Build an index from ``rxnorm_lookup``; ``None`` when it is missing or empty."""
+    try:
+        rows = con.execute(
+            "SELECT name_key, ingredient FROM rxnorm_lookup ORDER BY priority, name_key"
+        ).fetchall()
+    except duckdb.CatalogException:
+        return None
+    return RxNormIndex(rows, min_similarity=min_similarity) if rows else None
+
+
+def _lookup_source(con: duckdb.DuckDBPyConnection) -> tuple[Any, ...]:
+    """Database path and ``(row count, load time)`` of its ``rxnorm_lookup``."""
+    (path,) = con.execute(
+        "SELECT COALESCE(path, database_name) FROM duckdb_databases() "
+        "WHERE database_name = current_database()"
+    ).fetchone()
+    try:
+        version = con.execute(
+            "SELECT (SELECT COUNT(*) FROM rxnorm_lookup), "
+            "(SELECT max(loaded_at) FROM rxnorm_lookup_meta)"
+        ).fetchone()
+    except duckdb.CatalogException:
+        version = None
+    return path, version
+
+
+def ensure_loaded(con: duckdb.DuckDBPyConnection) -> Optional[RxNormIndex]:
+    """The index of *con*'s database, rebuilt when the database or its lookup changed.
+
+    The check costs two metadata queries, so a long-running process (the UI)
+    picks up an ``rxnorm-load`` done by another process, and a second
+    database never reuses the first one's index.
+    """
+    global _active, _loaded_from
+    if _pinned:
+        return _active
+    source = _lookup_source(con)
+    if source != _loaded_from:
+        _active = load_index(con)
+        _loaded_from = source
+    return _active
+
+
+def _find_rrf(root: Path, name: str) -> Optional[Path]:
+    for p in root.rglob("*"):
+        if p.is_file() and p.name.upper() == name:
+            return p
+    return None
+
+
+def _extract_rrf(archive: Path, tmp: Path) -> None:
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            base = Path(info.filename).name.upper()
+            if base in ("RXNCONSO.RRF", "RXNREL.RRF"):
+                with zf.open(info) as src, (tmp / base).open("wb") as dst:
+                    shutil.copyfileobj(src, dst)
+
+
+def _read_rrf(path: Path, columns: list[str]) -> str:
+    cols = ", ".join(f"'{c}': 'VARCHAR'" for c in [*columns, "_end"])
+    return (
+        f"read_csv('{sql_path(path)}', delim='|', header=false, quote='', escape='', "
+        f"auto_detect=false, null_padding=true, columns={{{cols}}})"
+    )
+
+
+def load_rrf(con: duckdb.DuckDBPyConnection, input: Path) -> dict[str, int]:
+    """Import RXNCONSO/RXNREL from a directory or release zip and rebuild the lookup.
+
+    Returns counts of imported names, relations, concepts with an ingredient
+    and lookup keys.  The active in-process index is reset.
+    """
+    with tempfile.TemporaryDirectory(prefix="faers_rxnorm_") as tmp:
+        root = Path(tmp)
+        if input.is_dir():
+            root = input
+        else:
+            _extract_rrf(input, root)
+        conso = _find_rrf(root, "RXNCONSO.RRF")
+        rel = _find_rrf(root, "RXNREL.RRF")
+        if conso is None or rel is None:
+            raise FileNotFoundError(f"RXNCONSO.RRF and RXNREL.RRF not found in {input}")
+
+        con.execute("BEGIN TRANSACTION")
+        try:
+            con.execute(
+                "CREATE OR REPLACE TABLE rxnorm_conso AS "
+                "SELECT rxcui, sab, tty, str, suppress "
+                f"FROM {_read_rrf(conso, _CONSO_COLUMNS)} "
+                "WHERE lat = 'ENG' AND COALESCE(suppress, '') <> 'E' AND rxcui <> ''"
+            )
+            con.execute(
+                "CREATE OR REPLACE TABLE rxnorm_rel AS "
+                "SELECT DISTINCT rxcui1, rela, rxcui2 "
+                f"FROM {_read_rrf(rel, _REL_COLUMNS)} "
+                "WHERE sab = 'RXNORM' AND rxcui1 <> '' AND rxcui2 <> ''"
+            )
+            con.execute(_resources.get_sql("rxnorm_index.sql"))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    reset()
+    counts = {}
+    for label, table in (
+        ("names", "rxnorm_conso"),
+        ("relations", "rxnorm_rel"),
+        ("concepts", "rxnorm_ingredient"),
+        ("lookup_keys", "rxnorm_lookup"),
+    ):
+        counts[label] = con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return counts
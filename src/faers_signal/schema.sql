@@ -8,7 +8,7 @@ CREATE TABLE IF NOT EXISTS drugs (
   safetyreportid VARCHAR,
   drug_name VARCHAR,
   drug_name_normalized VARCHAR,  -- ingredient-level name (lowercase)
-  drug_norm_source VARCHAR,      -- openfda_harmonized | rxnorm_api | unmapped
+  drug_norm_source VARCHAR,      -- openfda_harmonized | rxnorm_api | rxnorm_local | unmapped
   role INTEGER, -- 1: suspect, 2: concomitant, 3: interacting
   FOREIGN KEY (safetyreportid) REFERENCES reports(safetyreportid)
 );
@@ -23,3 +23,167 @@ CREATE TABLE IF NOT EXISTS reactions (
   FOREIGN KEY (safetyreportid) REFERENCES reports(safetyreportid)
 );
 
+
+-- Dictionary-encoded dimensions (see dims.py). ABCD aggregation joins and
+-- groups on these integer IDs; names are only joined back for output.
+CREATE SEQUENCE IF NOT EXISTS report_key_seq;
+CREATE SEQUENCE IF NOT EXISTS drug_id_seq;
+CREATE SEQUENCE IF NOT EXISTS pt_id_seq;
+
+CREATE TABLE IF NOT EXISTS drug_dim (
+  drug_id INTEGER PRIMARY KEY,
+  drug VARCHAR UNIQUE            -- COALESCE(drug_name_normalized, lower(drug_name))
+);
+
+CREATE TABLE IF NOT EXISTS pt_dim (
+  pt_id INTEGER PRIMARY KEY,
+  pt VARCHAR UNIQUE              -- lower(meddra_pt)
+);
+
+ALTER TABLE drugs ADD COLUMN IF NOT EXISTS report_key BIGINT;
+ALTER TABLE drugs ADD COLUMN IF NOT EXISTS drug_id INTEGER;
+
+-- Report and reaction keys live in side tables, so reports/reactions keep
+-- their original columns (positional INSERT ... VALUES keeps working)
+CREATE TABLE IF NOT EXISTS report_keys (
+  safetyreportid VARCHAR PRIMARY KEY,
+  report_key BIGINT              -- surrogate key; kept when the report is replaced
+);
+
+CREATE TABLE IF NOT EXISTS reaction_keys (
+  safetyreportid VARCHAR,
+  report_key BIGINT,
+  pt_id INTEGER                  -- one row per distinct PT of the report
+);
+
+-- Persistent ABCD aggregates ("cube"), maintained incrementally by ingest.
+-- scope: 'suspect' (role = 1) | 'all' (role in 1,2,3). See cube.py.
+CREATE TABLE IF NOT EXISTS cube_drug (
+  scope VARCHAR,
+  drug_id INTEGER,
+  n_reports BIGINT    -- distinct reports with the drug in scope
+);
+
+CREATE TABLE IF NOT EXISTS cube_pt (
+  pt_id INTEGER,
+  n_reports BIGINT    -- distinct reports with the PT
+);
+
+CREATE TABLE IF NOT EXISTS cube_pair (
+  scope VARCHAR,
+  drug_id INTEGER,
+  pt_id INTEGER,
+  a BIGINT            -- A: reports with both the drug (in scope) and the PT
+);
+
+-- One row (N) once the cube has been built; empty means "not built yet"
+CREATE TABLE IF NOT EXISTS cube_total (
+  n_reports BIGINT
+);
+
+-- Persistent RxNorm lookup results (positive and negative). See rxnorm_cache.py.
+CREATE TABLE IF NOT EXISTS rxnorm_cache (
+  name_key VARCHAR PRIMARY KEY,  -- lower(trim(raw drug name))
+  normalized VARCHAR,            -- ingredient name; NULL = no match
+  source VARCHAR,                -- rxnorm_api | unmapped
+  fetched_at TIMESTAMP,          -- when RxNav answered (TTL reference)
+  last_used TIMESTAMP            -- LRU eviction order
+);
+
+-- Offline RxNorm name -> ingredient lookup, rebuilt by `faers-signal rxnorm-load`
+-- (rxnorm_index.sql). Empty means "use the RxNav API".
+CREATE TABLE IF NOT EXISTS rxnorm_lookup (
+  name_key VARCHAR PRIMARY KEY,  -- lower(trim(RXNCONSO.STR))
+  ingredient VARCHAR,            -- TTY=IN name(s), "a / b" for combinations
+  priority INTEGER               -- lower wins when names collide
+);
+
+-- When rxnorm_lookup was last rebuilt; processes holding an in-memory index
+-- compare it to notice a reload (rxnorm_local.ensure_loaded)
+CREATE TABLE IF NOT EXISTS rxnorm_lookup_meta (
+  loaded_at TIMESTAMP
+);
+
+-- Inputs already ingested and the report IDs each produced. See ledger.py.
+CREATE TABLE IF NOT EXISTS ingest_ledger (
+  source_key VARCHAR PRIMARY KEY,  -- absolute path, "zip!member", or a quarterly group
+  kind VARCHAR,                    -- openfda | qfiles
+  size BIGINT,                     -- bytes (uncompressed size for zip members)
+  mtime DOUBLE,                    -- epoch seconds
+  content_hash VARCHAR,            -- sha256 of the file, or crc32 of the zip member
+  n_reports BIGINT,
+  loaded_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ingest_ledger_reports (
+  source_key VARCHAR,
+  safetyreportid VARCHAR
+);
+
+-- Stale reports whose drugs/reactions are gone but whose report row still has
+-- to be deleted; a failed delete is retried by the next Ledger (see ledger.py)
+CREATE TABLE IF NOT EXISTS ingest_ledger_pending (
+  safetyreportid VARCHAR PRIMARY KEY
+);
+
+-- FAERS case versions: PRIMARYID -> CASEID. The latest version of each case
+-- stays in the fact tables; the others are removed. See dedup.py.
+CREATE TABLE IF NOT EXISTS case_versions (
+  -- No key: a load rewrites the rows of the cases it touches (see dedup.py)
+  primaryid VARCHAR,               -- = reports.safetyreportid of quarterly data
+  caseid VARCHAR,
+  caseversion INTEGER,
+  fda_dt DATE,
+  superseded_by VARCHAR            -- winning PRIMARYID; NULL for the current version
+);
+
+-- One row: database ID and a counter bumped by every write to the fact
+-- tables. Cached and stored results are checked against it. See generation.py.
+CREATE TABLE IF NOT EXISTS db_generation (
+  db_id VARCHAR,                   -- random, set once
+  generation BIGINT
+);
+INSERT INTO db_generation
+SELECT uuid()::VARCHAR, 0 WHERE NOT EXISTS (SELECT 1 FROM db_generation);
+
+-- Precomputed build results, one block of rows per spec ("signal store").
+-- Written by `build --store`; read while the fingerprint matches. See signal_store.py.
+CREATE TABLE IF NOT EXISTS signal_results_meta (
+  spec_key VARCHAR PRIMARY KEY,    -- roles=1;min_a=3;mode=balanced
+  role_set VARCHAR,
+  min_a INTEGER,
+  signal_mode VARCHAR,
+  snapshot VARCHAR,                -- generation.fingerprint at build time
+  n_rows BIGINT,
+  n_signals BIGINT,
+  built_at TIMESTAMP
+);
+
+-- Rows of each spec are inserted ordered by (drug, pt). No index: DuckDB does
+-- not use ART indexes for these filters (spec_key = ? with a drug/PT prefix or
+-- a top-N), while every rebuild of a spec would have to maintain them. The
+-- insert order lets row-group statistics skip the other specs instead.
+CREATE TABLE IF NOT EXISTS signal_results (
+  spec_key VARCHAR,
+  drug VARCHAR,
+  pt VARCHAR,
+  A BIGINT,
+  B BIGINT,
+  C BIGINT,
+  D BIGINT,
+  drug_reports BIGINT,
+  pt_reports BIGINT,
+  total_reports BIGINT,
+  PRR DOUBLE,
+  Chi2_1df DOUBLE,
+  ROR DOUBLE,
+  ROR_CI_L DOUBLE,
+  ROR_CI_U DOUBLE,
+  IC DOUBLE,
+  IC_CI_L DOUBLE,
+  IC_CI_U DOUBLE,
+  flag_evans BOOLEAN,
+  flag_ror025 BOOLEAN,
+  flag_ic025 BOOLEAN,
+  Signal BOOLEAN
+);
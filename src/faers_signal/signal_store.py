@@ -0,0 +1,211 @@
+"""Precomputed build results kept in the database ("signal store").
+
+``build --store`` writes its scored rows to ``signal_results`` under a key
+made of the role set, ``min_a`` and signal mode (``spec_key``), and records
+the data generation (``generation.fingerprint``) next to them in
+``signal_results_meta``.  Until the next write to the fact tables
+(``is_fresh``), readers such as
+the UI query the stored rows instead of recomputing A/B/C/D and the
+metrics: drug/PT prefixes, the signal-only toggle, ranking and TopN all
+become SQL over one spec's rows (``select``, ``top_items``).
+
+Each spec's rows are written in one insert ordered by ``(spec_key, drug,
+pt)``, so DuckDB's row-group min/max statistics skip the other specs and,
+for a drug prefix, the other drugs.  Ranking by IC025 is a top-N over the
+remaining rows.
+"""
+from __future__ import annotations
+
+from typing import Any, Optional, Union
+
+import duckdb
+import pyarrow as pa
+
+from . import generation
+from .analysis_spec import AnalysisSpec
+
+# Stored columns after spec_key, in build output order
+ABCD_COLUMNS = (
+    "drug",
+    "pt",
+    "A",
+    "B",
+    "C",
+    "D",
+    "drug_reports",
+    "pt_reports",
+    "total_reports",
+)
+METRIC_COLUMNS = (
+    "PRR",
+    "Chi2_1df",
+    "ROR",
+    "ROR_CI_L",
+    "ROR_CI_U",
+    "IC",
+    "IC_CI_L",
+    "IC_CI_U",
+    "flag_evans",
+    "flag_ror025",
+    "flag_ic025",
+    "Signal",
+)
+COLUMNS = ABCD_COLUMNS + METRIC_COLUMNS
+
+# Ranking criteria of AnalysisSpec.ranking_criterion (higher ranks first)
+RANK_SQL = {
+    "ic025": "COALESCE(IC_CI_L, -999)",
+    "a_desc": "A::DOUBLE",
+    "balance_score": "GREATEST(COALESCE(IC_CI_L, 0), 0) * ln(1 + A)",
+}
+
+_STAGE = "_signal_stage"
+_COLS = ", ".join(COLUMNS)
+
+
+def spec_key(spec: AnalysisSpec) -> str:
+    """Store key of *spec*: role set, ``min_a`` and signal mode."""
+    roles = ",".join(str(r) for r in spec.roles())
+    return f"roles={roles};min_a={int(spec.min_a)};mode={spec.signal_mode}"
+
+
+def storable(spec: AnalysisSpec) -> bool:
+    """Whether *spec* covers every pair (no date window, no prefix filter)."""
+    return not (spec.since or spec.until or spec.drug_filter or spec.pt_filter)
+
+
+def is_fresh(con: duckdb.DuckDBPyConnection, spec: AnalysisSpec) -> bool:
+    """Whether stored rows exist for *spec*'s key and were built from the current data."""
+    row = con.execute(
+        "SELECT snapshot FROM signal_results_meta WHERE spec_key = ?", [spec_key(spec)]
+    ).fetchone()
+    return bool(row) and row[0] == generation.fingerprint(con)
+
+
+class Writer:
+    """Collect a build's scored batches and replace the stored rows of its spec.
+
+    Batches are staged in a temp table on a cursor of *con*, so they can be
+    written while a result is still being streamed from *con*; ``commit``
+    swaps them in, sorted, in one transaction.
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, spec: AnalysisSpec) -> None:
+        if not storable(spec):
+            raise ValueError(
+                "Only full results can be stored; drop --since/--until/--drug-filter/--pt-filter"
+            )
+        self.spec = spec
+        self.key = spec_key(spec)
+        self._cur = con.cursor()
+        self._cur.execute(
+            f"CREATE OR REPLACE TEMP TABLE {_STAGE} AS "
+            f"SELECT {_COLS} FROM signal_results WHERE false"
+        )
+
+    def write(self, data: Union[pa.Table, pa.RecordBatch]) -> None:
+        if data.num_rows == 0:
+            return
+        self._cur.register("_signal_batch", data)
+        try:
+            self._cur.execute(f"INSERT INTO {_STAGE} SELECT {_COLS} FROM _signal_batch")
+        finally:
+            self._cur.unregister("_signal_batch")
+
+    def commit(self) -> int:
+        """Replace the stored rows of the spec with the staged ones; return the row count."""
+        cur = self._cur
+        n_rows, n_signals = cur.execute(
+            f"SELECT COUNT(*), COUNT(*) FILTER (WHERE Signal) FROM {_STAGE}"
+        ).fetchone()
+        cur.execute("BEGIN TRANSACTION")
+        try:
+            cur.execute("DELETE FROM signal_results WHERE spec_key = ?", [self.key])
+            cur.execute(
+                f"INSERT INTO signal_results SELECT ?, {_COLS} FROM {_STAGE} ORDER BY drug, pt",
+                [self.key],
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO signal_results_meta VALUES "
+                "(?, ?, ?, ?, ?, ?, ?, now())",
+                [
+                    self.key,
+                    ",".join(str(r) for r in self.spec.roles()),
+                    int(self.spec.min_a),
+                    self.spec.signal_mode,
+                    generation.fingerprint(cur),
+                    n_rows,
+                    n_signals,
+                ],
+            )
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.execute(f"DROP TABLE IF EXISTS {_STAGE}")
+        return int(n_rows)
+
+
+def _where(spec: AnalysisSpec, signal_only: bool, params: dict[str, Any]) -> str:
+    params["spec_key"] = spec_key(spec)
+    conds = ["spec_key = $spec_key"]
+    if spec.drug_filter:
+        params["drug_prefix"] = spec.drug_filter.strip().lower()
+        conds.append("starts_with(drug, $drug_prefix)")
+    if spec.pt_filter:
+        params["pt_prefix"] = spec.pt_filter.strip().lower()
+        conds.append("starts_with(pt, $pt_prefix)")
+    if signal_only:
+        conds.append("Signal")
+    return " AND ".join(conds)
+
+
+def _rank(spec: AnalysisSpec) -> str:
+    return RANK_SQL.get(spec.ranking_criterion, RANK_SQL["ic025"])
+
+
+def select(
+    spec: AnalysisSpec,
+    *,
+    signal_only: bool = False,
+    limit: Optional[int] = None,
+) -> tuple[str, dict[str, Any]]:
+    """Stored rows of *spec* filtered by its prefixes, best-ranked first.
+
+    Returns ``(sql, params)``; rows are ordered by ``spec.ranking_criterion``
+    with A, drug and PT as tie breakers.
+    """
+    params: dict[str, Any] = {}
+    sql = (
+        f"SELECT {_COLS} FROM signal_results WHERE {_where(spec, signal_only, params)} "
+        f"ORDER BY {_rank(spec)} DESC, A DESC, drug, pt"
+    )
+    if limit is not None:
+        params["limit"] = int(limit)
+        sql += " LIMIT $limit"
+    return sql, params
+
+
+def top_items(
+    con: duckdb.DuckDBPyConnection,
+    spec: AnalysisSpec,
+    column: str,
+    n: int,
+    *,
+    signal_only: bool = False,
+) -> list[str]:
+    """The *n* drugs or PTs with the best-ranked pair among the chartable stored rows.
+
+    Chartable rows have a finite, positive PRR below 1e6 and a finite chi-square.
+    """
+    if column not in ("drug", "pt"):
+        raise ValueError(f"column must be 'drug' or 'pt', not {column!r}")
+    params: dict[str, Any] = {"n": int(n)}
+    rows = con.execute(
+        f"SELECT {column} FROM signal_results WHERE {_where(spec, signal_only, params)} "
+        "AND isfinite(PRR) AND isfinite(Chi2_1df) AND PRR > 0 AND PRR < 1e6 "
+        f"GROUP BY {column} ORDER BY max({_rank(spec)}) DESC, {column} LIMIT $n",
+        params,
+    ).fetchall()
+    return [r[0] for r in rows]
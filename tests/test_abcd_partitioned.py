@@ -0,0 +1,126 @@
+"""Drug-bucketed ABCD passes and DuckDB resource settings."""
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from faers_signal import lake
+from faers_signal.abcd_query import build_abcd_query, prepare_abcd_parts, prepare_partitioned
+from faers_signal.analysis_spec import AnalysisSpec
+from faers_signal.db_resources import Resources
+from faers_signal.ingest_openfda import _apply, _to_tables
+from faers_signal.result_sink import ResultSink
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+_COLS = ["drug", "pt", "A", "B", "C", "D", "drug_reports", "pt_reports", "total_reports"]
+_DRUGS = ["aspirin", "metformin", "ibuprofen", "warfarin", "statin", "insulin", "heparin"]
+_PTS = ["nausea", "headache", "rash", "bleeding", "dizziness"]
+
+
+def _events(n: int = 60) -> list[dict]:
+    return [
+        {
+            "safetyreportid": f"r{i}",
+            "receivedate": f"202{i % 4}0{1 + i % 9}15",
+            "patient": {
+                "drug": [
+                    {
+                        "medicinalproduct": d,
+                        "drugcharacterization": 1 + (i + k) % 3,
+                        "openfda": {"substance_name": [d]},
+                    }
+                    for k, d in enumerate(_DRUGS[i % 5 : i % 5 + 1 + i % 3])
+                ],
+                "reaction": [{"reactionmeddrapt": p} for p in _PTS[i % 4 : i % 4 + 1 + i % 2]],
+            },
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    c = duckdb.connect(str(tmp_path / "parts.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    _apply(c, _to_tables(_events(), since=None, until=None))
+    return c
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df[_COLS].sort_values(["drug", "pt"]).reset_index(drop=True)
+
+
+def _concat(con, parts) -> pd.DataFrame:
+    return _sorted(pd.concat([con.execute(sql, p).fetch_df() for sql, p in parts]))
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        AnalysisSpec(min_a=1, role_set=[1, 3]),
+        AnalysisSpec(min_a=0, since="2021-03-01"),
+        AnalysisSpec(min_a=0, role_set=[1, 2], pt_filter="h", until="2022-12-31"),
+    ],
+)
+def test_buckets_reassemble_the_full_result(con, spec: AnalysisSpec):
+    parts = prepare_abcd_parts(con, spec, buckets=3)
+    assert len(parts) == 3
+    sql, params = build_abcd_query(spec)
+    full = _sorted(con.execute(sql, params).fetch_df())
+    assert len(full) > 0
+    pd.testing.assert_frame_equal(_concat(con, parts), full, check_dtype=False)
+
+
+def test_cube_specs_stay_one_query(con):
+    assert len(prepare_abcd_parts(con, AnalysisSpec(), buckets=4)) == 1
+    with pytest.raises(ValueError):
+        prepare_partitioned(con, AnalysisSpec(), 0)
+
+
+def test_buckets_over_lake(con, tmp_path: Path):
+    root = tmp_path / "lake"
+    lake.export(con, root)
+    spec = AnalysisSpec(min_a=0, until="2022-06-30")
+    lake_con = lake.connect(root)
+    parts = prepare_partitioned(lake_con, spec, 4, lake_root=root)
+    sql, params = build_abcd_query(spec)
+    pd.testing.assert_frame_equal(
+        _concat(lake_con, parts),
+        _sorted(con.execute(sql, params).fetch_df()),
+        check_dtype=False,
+    )
+
+
+def test_resources_apply(tmp_path: Path):
+    c = duckdb.connect()
+    Resources(
+        memory_limit="512MB",
+        threads=2,
+        temp_directory=tmp_path / "spill",
+        preserve_insertion_order=False,
+    ).apply(c)
+    threads, temp, order = c.execute(
+        "SELECT current_setting('threads'), current_setting('temp_directory'), "
+        "current_setting('preserve_insertion_order')"
+    ).fetchone()
+    assert (threads, order) == (2, False)
+    assert Path(temp) == tmp_path / "spill" and Path(temp).is_dir()
+    with pytest.raises(duckdb.Error):
+        Resources(memory_limit="lots").apply(c)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv"])
+def test_result_sink_appends_parts(tmp_path: Path, suffix: str):
+    out = tmp_path / f"out{suffix}"
+    with ResultSink(out) as sink:
+        # An empty first part (null-typed, as from an empty frame) does not fix the schema
+        sink.write(pa.table({"a": pa.array([], pa.null()), "s": pa.array([], pa.null())}))
+        sink.write(pa.table({"a": pa.array([1, 2], pa.int64()), "s": ["x", "y"]}))
+        sink.write(pa.table({"a": pa.array([], pa.int64()), "s": pa.array([], pa.string())}))
+        sink.write(pa.table({"s": ["z"], "a": pa.array([3], pa.int32())}).to_batches()[0])
+    assert sink.rows == 3
+    got = pd.read_csv(out) if suffix == ".csv" else pq.read_table(out).to_pandas()
+    assert got.to_dict("list") == {"a": [1, 2, 3], "s": ["x", "y", "z"]}
@@ -0,0 +1,100 @@
+"""Parameterized ABCD builder: push-down filters must not change the numbers."""
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pytest
+
+from faers_signal.abcd_query import build_abcd_query, cube_eligible, prepare_abcd
+from faers_signal.analysis_spec import AnalysisSpec
+from faers_signal.ingest_openfda import _apply, _to_tables
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+_COLS = ["drug", "pt", "A", "B", "C", "D", "drug_reports", "pt_reports", "total_reports"]
+
+
+def _event(sid: str, date: str, drugs: list[tuple[str, int]], pts: list[str]) -> dict:
+    return {
+        "safetyreportid": sid,
+        "receivedate": date,
+        "patient": {
+            "drug": [
+                {"medicinalproduct": n, "drugcharacterization": r, "openfda": {"substance_name": [n]}}
+                for n, r in drugs
+            ],
+            "reaction": [{"reactionmeddrapt": p} for p in pts],
+        },
+    }
+
+
+_EVENTS = [
+    _event("r1", "20230105", [("aspirin", 1), ("metformin", 2)], ["nausea"]),
+    _event("r2", "20230601", [("aspirin", 1)], ["headache", "nausea"]),
+    _event("r3", "20240110", [("ibuprofen", 1), ("aspirin", 3)], ["nausea"]),
+    _event("r4", "20240220", [("aspirin", 1), ("ibuprofen", 2)], ["nausea", "rash"]),
+    _event("r5", "20240301", [("metformin", 1)], ["headache"]),
+]
+
+
+def _db(path: Path, events=_EVENTS) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(str(path))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    _apply(con, _to_tables(events, since=None, until=None))
+    return con
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df[_COLS].sort_values(["drug", "pt"]).reset_index(drop=True)
+
+
+def _run(con, spec, **kw) -> pd.DataFrame:
+    sql, params = build_abcd_query(spec, **kw)
+    return _sorted(con.execute(sql, params).fetch_df())
+
+
+def _reference(con) -> pd.DataFrame:
+    return _sorted(con.execute((_SRC / "abcd.sql").read_text(encoding="utf-8")).fetch_df())
+
+
+def test_unfiltered_matches_abcd_sql(tmp_path: Path):
+    con = _db(tmp_path / "q.duckdb")
+    spec = AnalysisSpec(min_a=0)
+    ref = _reference(con)
+    pd.testing.assert_frame_equal(_run(con, spec), ref, check_dtype=False)
+    sql, params = prepare_abcd(con, spec)  # builds the cube
+    pd.testing.assert_frame_equal(_sorted(con.execute(sql, params).fetch_df()), ref,
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize("use_cube", [False, True])
+def test_prefix_filters_and_min_a(tmp_path: Path, use_cube: bool):
+    con = _db(tmp_path / "q.duckdb")
+    if use_cube:
+        prepare_abcd(con, AnalysisSpec())
+    ref = _reference(con)
+    spec = AnalysisSpec(min_a=2, drug_filter="ASP", pt_filter="nau")
+    got = _run(con, spec, use_cube=use_cube)
+    exp = ref[(ref["A"] >= 2) & ref["drug"].str.startswith("asp") & ref["pt"].str.startswith("nau")]
+    pd.testing.assert_frame_equal(got, exp.reset_index(drop=True), check_dtype=False)
+
+
+def test_role_set(tmp_path: Path):
+    con = _db(tmp_path / "q.duckdb")
+    got = _run(con, AnalysisSpec(role_set=[1, 3], min_a=0))
+    row = got[(got["drug"] == "aspirin") & (got["pt"] == "nausea")].iloc[0]
+    # r1, r2, r4 (suspect) + r3 (interacting)
+    assert int(row.A) == 4
+    assert not cube_eligible(AnalysisSpec(role_set=[1, 3]))
+    assert cube_eligible(AnalysisSpec(suspect_only=False))
+
+
+def test_date_window_matches_windowed_db(tmp_path: Path):
+    con = _db(tmp_path / "q.duckdb")
+    spec = AnalysisSpec(since="2024-01-01", until="2024-12-31", min_a=0)
+    assert not cube_eligible(spec)
+    got = _run(con, spec)
+
+    windowed = [e for e in _EVENTS if e["receivedate"] >= "20240101"]
+    ref = _reference(_db(tmp_path / "w.duckdb", windowed))
+    pd.testing.assert_frame_equal(got, ref, check_dtype=False)
+    assert int(got["total_reports"].iloc[0]) == 3
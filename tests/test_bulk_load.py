@@ -0,0 +1,99 @@
+"""Batched set-based ingest keeps the row-by-row upsert semantics."""
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pytest
+
+from faers_signal import bulk_load
+from faers_signal.ingest_openfda import _apply, _to_tables
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _event(sid: str, date: str, drugs: list[str], pts: list[str]) -> dict:
+    return {
+        "safetyreportid": sid,
+        "receivedate": date,
+        "primarysource": {"qualifier": "1"},
+        "patient": {
+            "drug": [
+                {"medicinalproduct": n, "drugcharacterization": "1", "openfda": {"substance_name": [n]}}
+                for n in drugs
+            ],
+            "reaction": [{"reactionmeddrapt": p} for p in pts],
+        },
+    }
+
+
+def _connect(tmp_path: Path, name: str = "b.duckdb") -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(str(tmp_path / name))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return con
+
+
+def _snapshot(con: duckdb.DuckDBPyConnection) -> tuple:
+    return (
+        con.execute("SELECT safetyreportid, receivedate FROM reports ORDER BY 1").fetchall(),
+        con.execute("SELECT safetyreportid, drug_name FROM drugs ORDER BY 1, 2").fetchall(),
+        con.execute("SELECT safetyreportid, meddra_pt FROM reactions ORDER BY 1, 2").fetchall(),
+    )
+
+
+def test_last_duplicate_wins_and_reingest_is_idempotent(tmp_path: Path):
+    con = _connect(tmp_path)
+    events = [
+        _event("r1", "20240101", ["aspirin"], ["nausea"]),
+        _event("r2", "20240102", ["ibuprofen"], ["rash"]),
+        _event("r1", "20240103", ["metformin"], ["headache", "nausea"]),
+    ]
+    # Reports written: the duplicate r1 is loaded once
+    assert _apply(con, _to_tables(events, since=None, until=None)) == 2
+    first = _snapshot(con)
+    reports, drugs, reactions = first
+    assert [r[0] for r in reports] == ["r1", "r2"]
+    assert str(reports[0][1]) == "2024-01-03"
+    assert drugs == [("r1", "metformin"), ("r2", "ibuprofen")]
+    assert reactions == [("r1", "headache"), ("r1", "nausea"), ("r2", "rash")]
+
+    key = con.execute("SELECT report_key FROM report_keys WHERE safetyreportid = 'r1'").fetchone()
+    _apply(con, _to_tables(events, since=None, until=None))
+    assert _snapshot(con) == first
+    # Replaced reports keep their surrogate key
+    assert con.execute(
+        "SELECT report_key FROM report_keys WHERE safetyreportid = 'r1'"
+    ).fetchone() == key
+
+
+def test_small_batches_match_single_batch(tmp_path: Path):
+    events = [
+        _event(f"r{i % 7}", f"202401{i % 28 + 1:02d}", [f"drug{i % 3}"], [f"pt{i % 4}"])
+        for i in range(20)
+    ]
+    one = _connect(tmp_path, "one.duckdb")
+    _apply(one, _to_tables(events, since=None, until=None))
+    many = _connect(tmp_path, "many.duckdb")
+    for i in range(0, len(events), 3):
+        _apply(many, _to_tables(events[i : i + 3], since=None, until=None))
+    assert _snapshot(one) == _snapshot(many)
+
+
+def test_failed_batch_is_rolled_back(tmp_path: Path):
+    con = _connect(tmp_path)
+    events = [_event("r1", "20240101", ["aspirin"], ["nausea"])]
+    _apply(con, _to_tables(events, since=None, until=None))
+    before = _snapshot(con)
+
+    batch = bulk_load.ReportBatch()
+    seq = batch.add_report("r1", "not-a-date", 1)
+    batch.add_drug(seq, "metformin", None, None, 1)
+    with pytest.raises(duckdb.Error):
+        bulk_load.apply_batch(con, batch)
+    assert _snapshot(con) == before
+
+
+def test_empty_batch_is_noop(tmp_path: Path):
+    con = _connect(tmp_path)
+    empty = bulk_load.ReportBatch().to_arrow()
+    assert all(isinstance(t, pa.Table) and t.num_rows == 0 for t in empty)
+    assert bulk_load.apply_batch(con, bulk_load.ReportBatch()) == 0
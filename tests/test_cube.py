@@ -0,0 +1,66 @@
+"""Incremental cube maintenance must match a full recomputation."""
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+from faers_signal import cube
+from faers_signal.ingest_openfda import _apply, _to_tables
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+_COLS = ["drug", "pt", "A", "B", "C", "D", "drug_reports", "pt_reports", "total_reports"]
+
+
+def _event(sid: str, drugs: list[tuple[str, int]], pts: list[str]) -> dict:
+    return {
+        "safetyreportid": sid,
+        "receivedate": "20240101",
+        "patient": {
+            "drug": [
+                {"medicinalproduct": n, "drugcharacterization": r, "openfda": {"substance_name": [n]}}
+                for n, r in drugs
+            ],
+            "reaction": [{"reactionmeddrapt": p} for p in pts],
+        },
+    }
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df[_COLS].sort_values(["drug", "pt"]).reset_index(drop=True)
+
+
+def _reference(con: duckdb.DuckDBPyConnection, scope: str) -> pd.DataFrame:
+    sql = (_SRC / "abcd.sql").read_text(encoding="utf-8")
+    if scope == "all":
+        sql = sql.replace("WHERE role = 1", "WHERE role IN (1, 2, 3)")
+    return _sorted(con.execute(sql).fetch_df())
+
+
+def test_cube_incremental_matches_full(tmp_path: Path):
+    con = duckdb.connect(str(tmp_path / "c.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+
+    first = [
+        _event("r1", [("aspirin", 1), ("metformin", 2)], ["nausea"]),
+        _event("r2", [("aspirin", 1)], ["headache", "nausea"]),
+        _event("r3", [("ibuprofen", 1)], ["nausea"]),
+    ]
+    _apply(con, _to_tables(first, since=None, until=None))
+    assert not cube.is_built(con)
+    cube.ensure(con)
+    assert cube.is_built(con)
+
+    # Replace r2 (upsert) and add r4; the cube is updated incrementally
+    second = [
+        _event("r2", [("ibuprofen", 1)], ["rash"]),
+        _event("r4", [("aspirin", 1), ("ibuprofen", 3)], ["nausea", "rash"]),
+    ]
+    _apply(con, _to_tables(second, since=None, until=None))
+
+    for scope in cube.SCOPES:
+        got = _sorted(con.execute(cube.abcd_select(scope)).fetch_df())
+        pd.testing.assert_frame_equal(got, _reference(con, scope), check_dtype=False)
+
+    # Aspirin/headache disappeared with the old version of r2
+    got = con.execute(cube.abcd_select("suspect")).fetch_df()
+    assert got[(got["drug"] == "aspirin") & (got["pt"] == "headache")].empty
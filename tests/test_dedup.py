@@ -0,0 +1,129 @@
+"""Case-version deduplication of quarterly files."""
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import cube, dedup
+from faers_signal.ingest_duckdb import ingest_qfiles_sql
+from faers_signal.ingest_qfiles import ingest_qfiles
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _quarter(root: Path, tag: str, rows: list[tuple[int, str, int, str]]) -> None:
+    """rows: (PRIMARYID, CASEID, CASEVERSION, FDA_DT)"""
+    (root / f"DEMO{tag}.txt").write_text(
+        "PRIMARYID|CASEID|CASEVERSION|FDA_DT\n"
+        + "".join(f"{p}|{c}|{v}|{d}\n" for p, c, v, d in rows)
+    )
+    (root / f"DRUG{tag}.txt").write_text(
+        "PRIMARYID|DRUGNAME|ROLE_COD\n" + "".join(f"{p}|ASPIRIN|PS\n" for p, *_ in rows)
+    )
+    (root / f"REAC{tag}.txt").write_text(
+        "PRIMARYID|PT\n" + "".join(f"{p}|NAUSEA\n" for p, *_ in rows)
+    )
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    c = duckdb.connect(str(tmp_path / "dedup.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return c
+
+
+def _ids(con) -> list[str]:
+    return [s for (s,) in con.execute("SELECT safetyreportid FROM reports ORDER BY 1").fetchall()]
+
+
+def test_later_quarter_supersedes_earlier_versions(con, tmp_path: Path):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [(101, "C1", 1, "20240105"), (102, "C2", 1, "20240106")])
+    ingest_qfiles(con, input=src)
+    cube.ensure(con)
+    assert _ids(con) == ["101", "102"]
+
+    # The next quarter brings a follow-up of C1 and a new case
+    _quarter(src, "24Q2", [(201, "C1", 2, "20240402"), (203, "C3", 1, "20240403")])
+    ingest_qfiles(con, input=src)
+    assert _ids(con) == ["102", "201", "203"]
+    assert con.execute(
+        "SELECT superseded_by FROM case_versions WHERE primaryid = '101'"
+    ).fetchone() == ("201",)
+    assert con.execute("SELECT COUNT(*) FROM drugs WHERE safetyreportid = '101'").fetchone()[0] == 0
+    assert con.execute("SELECT n_reports FROM cube_total").fetchone()[0] == 3
+    assert con.execute("SELECT SUM(a) FROM cube_pair WHERE scope = 'suspect'").fetchone()[0] == 3
+
+
+@pytest.mark.parametrize(
+    "rule, expected",
+    [("caseversion", ["11"]), ("fda", ["12"]), (None, ["11", "12", "13"])],
+)
+def test_rules(con, tmp_path: Path, rule, expected):
+    src = tmp_path / "q"
+    src.mkdir()
+    # Version 3 was received before version 2 was corrected on a later FDA_DT
+    _quarter(
+        src,
+        "24Q1",
+        [(11, "C", 3, "20240110"), (12, "C", 2, "20240120"), (13, "C", 1, "20240101")],
+    )
+    ingest_qfiles(con, input=src, dedup_rule=rule)
+    assert _ids(con) == expected
+    # Losing versions are still mapped, to their winner
+    assert con.execute(
+        "SELECT COUNT(*), COUNT(superseded_by) FROM case_versions"
+    ).fetchone() == (3, 0 if rule is None else 2)
+
+
+def test_fda_rule_breaks_date_ties_on_primaryid(con, tmp_path: Path):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [(9, "C", 1, "20240110"), (10, "C", 1, "20240110")])
+    ingest_qfiles(con, input=src, dedup_rule="fda")
+    assert _ids(con) == ["10"]  # numeric, not lexical, order
+
+
+def test_duckdb_engine_matches(con, tmp_path: Path):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [(101, "C1", 1, "20240105"), (102, "C2", 1, "20240106")])
+    _quarter(src, "24Q2", [(201, "C1", 2, "20240402")])
+    assert ingest_qfiles_sql(con, input=src) == 2  # the superseded 101 is not counted
+    assert _ids(con) == ["102", "201"]
+
+
+def test_failed_load_records_no_versions(con, tmp_path: Path, monkeypatch):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [(101, "C1", 1, "20240105")])
+    ingest_qfiles(con, input=src)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("load failed")
+
+    _quarter(src, "24Q2", [(201, "C1", 2, "20240402")])
+    monkeypatch.setattr(cube, "apply", fail)
+    with pytest.raises(RuntimeError):
+        ingest_qfiles(con, input=src)
+    # Version 2 never reached the fact tables, so it must not outrank 101 later
+    assert con.execute(
+        "SELECT primaryid, superseded_by FROM case_versions ORDER BY 1"
+    ).fetchall() == [("101", None)]
+    assert _ids(con) == ["101"]
+
+
+def test_full_pass_over_loaded_versions(con, tmp_path: Path):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(
+        src,
+        "24Q1",
+        [(1, "A", 1, "20240101"), (2, "A", 2, "20240102"), (3, "B", 1, "20240103")],
+    )
+    ingest_qfiles(con, input=src, dedup_rule=None)
+    assert dedup.supersede(con) == {"cases": 2, "superseded": 1}
+    assert _ids(con) == ["2", "3"]
+    with pytest.raises(ValueError):
+        dedup.supersede(con, rule="newest")
@@ -0,0 +1,72 @@
+"""Dictionary encoding of drug / PT dimensions and report keys."""
+from pathlib import Path
+
+import duckdb
+
+from faers_signal import dims
+from faers_signal.ingest_demo import ingest_demo
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def test_ingest_encodes_every_fact_row(tmp_path: Path):
+    con = duckdb.connect(str(tmp_path / "d.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    ingest_demo(con, reset=True)
+
+    assert con.execute(
+        "SELECT COUNT(*) FROM reports ANTI JOIN report_keys USING (safetyreportid)"
+    ).fetchone()[0] == 0
+    assert con.execute(
+        "SELECT COUNT(*) FROM drugs WHERE drug_id IS NULL OR report_key IS NULL"
+    ).fetchone()[0] == 0
+    assert con.execute(
+        "SELECT COUNT(*) FROM reactions ANTI JOIN reaction_keys USING (safetyreportid)"
+    ).fetchone()[0] == 0
+
+    # One dimension row per distinct key
+    assert con.execute("SELECT COUNT(*) FROM drug_dim").fetchone()[0] == 2
+    assert con.execute("SELECT COUNT(*) FROM pt_dim").fetchone()[0] == 2
+
+    # Fact keys resolve to the original (lower-cased) names
+    mismatches = con.execute(
+        "SELECT COUNT(*) FROM reaction_keys k JOIN pt_dim p USING (pt_id) "
+        "WHERE NOT EXISTS (SELECT 1 FROM reactions r "
+        "WHERE r.safetyreportid = k.safetyreportid AND lower(r.meddra_pt) = p.pt)"
+    ).fetchone()[0]
+    assert mismatches == 0
+
+
+def test_positional_inserts_are_encoded(tmp_path: Path):
+    con = duckdb.connect(str(tmp_path / "d.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    ingest_demo(con, reset=True)
+
+    # reports/reactions keep their original columns
+    con.execute("INSERT INTO reports VALUES ('r5', DATE '2024-01-05', 1)")
+    con.execute("INSERT INTO reactions VALUES ('r5', 'Rash'), ('r5', 'rash')")
+    dims.encode(con)
+    assert con.execute(
+        "SELECT p.pt FROM reaction_keys k JOIN pt_dim p USING (pt_id) "
+        "WHERE k.safetyreportid = 'r5'"
+    ).fetchall() == [("rash",)]
+
+
+def test_reencode_after_normalized_name_change(tmp_path: Path):
+    con = duckdb.connect(str(tmp_path / "d.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    ingest_demo(con, reset=True)
+
+    con.execute("UPDATE drugs SET drug_name_normalized = 'acetylsalicylic acid' "
+                "WHERE drug_name = 'aspirin'")
+    dims.reset_drug_keys(con, "drug_name = 'aspirin'")
+    dims.encode(con)
+
+    names = {r[0] for r in con.execute(
+        "SELECT DISTINCT d.drug FROM drugs JOIN drug_dim d USING (drug_id)"
+    ).fetchall()}
+    assert names == {"acetylsalicylic acid", "ibuprofen"}
+    # Encoding is idempotent
+    before = con.execute("SELECT COUNT(*) FROM drug_dim").fetchone()[0]
+    dims.encode(con)
+    assert con.execute("SELECT COUNT(*) FROM drug_dim").fetchone()[0] == before
@@ -0,0 +1,274 @@
+"""Concurrent openFDA pagination against a local stand-in for the API."""
+import json
+import re
+import threading
+import time
+import urllib.parse
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import download_openfda
+from faers_signal.ingest_openfda import ingest_openfda
+from faers_signal.ratelimit import TokenBucket
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _event(i: int, day: str = "20240101") -> dict:
+    return {
+        "safetyreportid": f"r{i:05d}",
+        "receivedate": day,
+        "patient": {
+            "drug": [{"medicinalproduct": "aspirin", "drugcharacterization": 1}],
+            "reaction": [{"reactionmeddrapt": "nausea"}],
+        },
+    }
+
+
+class _OpenFDA(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    available = 0
+    # Receive date per event; default: everything on one day
+    days: list = []
+    lock = threading.Lock()
+    queries: list = []
+    connections = 0
+    in_flight = 0
+    max_in_flight = 0
+    fail_once: set = set()
+    fail_always: set = set()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            type(self).connections += 1
+
+    def do_GET(self):  # noqa: N802
+        cls = type(self)
+        q = {k: v[0] for k, v in urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).items()}
+        with cls.lock:
+            cls.queries.append(q)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(0.05)
+            days = cls.days or ["20240101"] * cls.available
+            ids = range(len(days))
+            m = re.search(r"receivedate:\[(\d{8}) TO (\d{8})\]", q.get("search", ""))
+            if m:
+                ids = [i for i in ids if m.group(1) <= days[i] <= m.group(2)]
+            limit = int(q["limit"])
+            if "count" in q:
+                per_day: dict = {}
+                for i in ids:
+                    per_day[days[i]] = per_day.get(days[i], 0) + 1
+                rows = [{"time": d, "count": n} for d, n in sorted(per_day.items())][:limit]
+                if rows:
+                    self._send(200, {"results": rows})
+                else:
+                    self._send(404, {"error": {"code": "NOT_FOUND"}})
+                return
+            skip = int(q["skip"])
+            if skip in cls.fail_always:
+                self._send(400, {"error": {"code": "BAD_REQUEST"}})
+            elif skip in cls.fail_once:
+                cls.fail_once.discard(skip)
+                self._send(429, {"error": {"code": "TOO_MANY"}}, {"Retry-After": "0"})
+            elif skip >= len(ids):
+                self._send(404, {"error": {"code": "NOT_FOUND"}})
+            else:
+                results = [_event(i, days[i]) for i in list(ids)[skip : skip + limit]]
+                meta = {"results": {"skip": skip, "limit": limit, "total": len(ids)}}
+                self._send(200, {"meta": meta, "results": results})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api(monkeypatch: pytest.MonkeyPatch):
+    _OpenFDA.queries = []
+    _OpenFDA.connections = _OpenFDA.in_flight = _OpenFDA.max_in_flight = 0
+    _OpenFDA.available = 7000
+    _OpenFDA.days = []
+    _OpenFDA.fail_once = set()
+    _OpenFDA.fail_always = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OpenFDA)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}/drug/event.json"
+    monkeypatch.setattr(download_openfda, "_BASE_URL", base)
+    monkeypatch.delenv("OPENFDA_API_KEY", raising=False)
+    yield _OpenFDA
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    c = duckdb.connect(str(tmp_path / "api.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return c
+
+
+def test_pages_fetched_concurrently_over_kept_alive_connections(api, con):
+    progress = []
+    total = download_openfda.fetch_and_ingest(
+        con,
+        drug="aspirin",
+        max_records=26000,
+        concurrency=4,
+        requests_per_minute=60_000,
+        progress_callback=lambda done, target: progress.append(done),
+    )
+    assert total == 7000
+    assert con.execute("SELECT COUNT(DISTINCT safetyreportid) FROM reports").fetchone()[0] == 7000
+    # One request per existing page: the first reports the total
+    assert sorted(int(q["skip"]) for q in api.queries) == list(range(0, 7000, 1000))
+    assert all("medicinalproduct" in q["search"] for q in api.queries)
+    assert api.max_in_flight > 1
+    assert api.connections <= 4
+    assert progress == list(range(1000, 7001, 1000))
+
+
+def test_partial_last_page_and_api_key(api, con):
+    api.available = 2300
+    total = download_openfda.fetch_and_ingest(
+        con, max_records=5000, api_key="k123", requests_per_minute=60_000
+    )
+    assert total == 2300
+    assert {q["api_key"] for q in api.queries} == {"k123"}
+    assert "search" not in api.queries[0]
+
+
+def test_request_budget_is_respected(api, con):
+    api.available = 8000
+    start = time.monotonic()
+    download_openfda.fetch_and_ingest(
+        con, max_records=8000, concurrency=2, requests_per_minute=600
+    )
+    # 8 requests at 10/s with a burst of 2 need at least 6 intervals of 100 ms
+    assert time.monotonic() - start >= 0.55
+
+
+def test_fetch_page_retries_rate_limited_requests(api):
+    api.fail_once = {0}
+    pool = download_openfda._ConnectionPool(download_openfda._BASE_URL)
+    try:
+        page = download_openfda._fetch_page(
+            pool, "/drug/event.json?limit=10&skip=0", TokenBucket(1000), backoff=0.01
+        )
+        assert len(page["results"]) == 10
+        assert len(api.queries) == 2
+        # Beyond the end: openFDA answers 404, which is an empty page
+        assert download_openfda._fetch_page(
+            pool, "/drug/event.json?limit=10&skip=9000", TokenBucket(1000), backoff=0.01
+        ) == {"results": []}
+    finally:
+        pool.close()
+    assert api.connections == 1
+
+
+def test_plan_windows_bisects_dense_ranges():
+    counts = {date(2024, 1, d): n for d, n in [(1, 10), (2, 10), (3, 10), (4, 45), (5, 10)]}
+    windows = download_openfda.plan_windows(counts, cap=30)
+    assert [(w.since, w.until, w.count) for w in windows] == [
+        ("2024-01-01", "2024-01-03", 30),
+        ("2024-01-04", "2024-01-04", 45),  # one day cannot be split further
+        ("2024-01-05", "2024-01-05", 10),
+    ]
+    assert download_openfda.plan_windows({}) == []
+
+
+def test_sharded_download_beyond_skip_limit(api, con, monkeypatch: pytest.MonkeyPatch):
+    # Scale the API limits down: pages of 100, skip <= 400 -> 500 records per query
+    monkeypatch.setattr(download_openfda, "_MAX_LIMIT", 100)
+    monkeypatch.setattr(download_openfda, "_MAX_SKIP", 400)
+    monkeypatch.setattr(download_openfda, "_MAX_COUNT_BUCKETS", 8)
+    days = []
+    for d in range(1, 21):
+        days += [f"202403{d:02d}"] * (600 if d == 7 else 90)  # one day is too dense
+    api.days = days
+    progress = []
+
+    total = download_openfda.fetch_and_ingest(
+        con, since="2024-03-01", until="2024-03-31", max_records=None,
+        requests_per_minute=60_000, progress_callback=lambda a, b: progress.append((a, b)),
+    )
+
+    planned = 19 * 90 + 500
+    assert total == planned
+    assert progress[-1] == (planned, planned)
+    assert con.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == planned
+    counts = [q for q in api.queries if "count" in q]
+    assert len(counts) > 1  # the 20-day answer hit the bucket limit and was bisected
+    # No query pages past the skip limit
+    assert max(int(q["skip"]) for q in api.queries if "skip" in q) <= 400
+    assert api.max_in_flight > 1
+
+    # max_records still bounds a sharded run
+    again = download_openfda.fetch_and_ingest(
+        con, since="2024-03-01", until="2024-03-31", max_records=1000,
+        requests_per_minute=60_000,
+    )
+    assert again == 1000
+
+
+def _new_db(path: Path) -> duckdb.DuckDBPyConnection:
+    c = duckdb.connect(str(path))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return c
+
+
+def test_interrupted_download_resumes_from_page_cache(api, tmp_path: Path):
+    cache = tmp_path / "pages"
+    api.fail_always = {3000}
+    first = download_openfda.fetch_and_ingest(
+        _new_db(tmp_path / "a.duckdb"), max_records=7000, requests_per_minute=60_000,
+        cache_dir=cache,
+    )
+    assert first == 3000
+
+    api.fail_always = set()
+    api.queries = []
+    resumed = _new_db(tmp_path / "b.duckdb")
+    total = download_openfda.fetch_and_ingest(
+        resumed, max_records=7000, requests_per_minute=60_000, cache_dir=cache
+    )
+    assert total == 7000
+    assert resumed.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 7000
+    # Pages cached by the first run are replayed from disk
+    fetched = {int(q["skip"]) for q in api.queries}
+    assert fetched and not fetched & {0, 1000, 2000}
+
+    # A complete rerun needs no network at all; --refresh fetches everything
+    api.queries = []
+    download_openfda.fetch_and_ingest(
+        resumed, max_records=7000, requests_per_minute=60_000, cache_dir=cache
+    )
+    assert api.queries == []
+    download_openfda.fetch_and_ingest(
+        resumed, max_records=7000, requests_per_minute=60_000, cache_dir=cache, refresh=True
+    )
+    assert len(api.queries) == 7
+
+    # The cache is a plain NDJSON.gz tree for offline ETL
+    offline = _new_db(tmp_path / "c.duckdb")
+    ingest_openfda(offline, input=cache)
+    assert offline.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 7000
@@ -0,0 +1,152 @@
+"""SQL-native ingest engine must load the same rows as the Python engine."""
+import gzip
+import json
+import zipfile
+from pathlib import Path
+
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+from faers_signal import cli, cube, ingest_duckdb, normalize_drug
+from faers_signal.ingest_duckdb import ingest_openfda_sql, ingest_qfiles_sql
+from faers_signal.ingest_openfda import ingest_openfda
+from faers_signal.ingest_qfiles import ingest_qfiles
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _connect(path: Path) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(str(path))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return con
+
+
+def _snapshot(con: duckdb.DuckDBPyConnection) -> tuple:
+    return (
+        con.execute(
+            "SELECT safetyreportid, receivedate, primarysource_qualifier FROM reports ORDER BY 1"
+        ).fetchall(),
+        con.execute(
+            "SELECT safetyreportid, drug_name, drug_name_normalized, drug_norm_source, role "
+            "FROM drugs ORDER BY ALL"
+        ).fetchall(),
+        con.execute("SELECT safetyreportid, meddra_pt FROM reactions ORDER BY ALL").fetchall(),
+    )
+
+
+def _event(i: int) -> dict:
+    drugs = [
+        {
+            "medicinalproduct": f"Drug{i % 3} ",
+            "drugcharacterization": (i % 3) + 1,
+            "openfda": {"substance_name": [f"Substance{i % 3}"]},
+        }
+    ]
+    if i % 4 == 0:
+        drugs.append({"medicinalproduct": "Mystery", "drugcharacterization": "1"})
+    if i % 5 == 0:
+        drugs.append({"drugcharacterization": "1"})  # no name: skipped
+    ev = {
+        "safetyreportid": f"r{i % 9}",
+        "primarysource": {"qualifier": i % 2 + 1},
+        "patient": {
+            "drug": drugs,
+            "reaction": [{"reactionmeddrapt": f"PT{i % 4}"}, {"reactionmeddrapt": ""}],
+        },
+        "ignored": {"nested": [1, 2, 3]},
+    }
+    if i % 7:
+        ev["receivedate"] = f"2024{i % 12 + 1:02d}15"
+    else:
+        ev["receiptdate"] = "2023-12-31T00:00:00"
+    return ev
+
+
+def _openfda_inputs(root: Path) -> Path:
+    src = root / "openfda"
+    src.mkdir()
+    evs = [_event(i) for i in range(30)]
+    (src / "a.json").write_text(json.dumps({"meta": {}, "results": evs[:10]}))
+    with gzip.open(src / "b.ndjson.gz", "wt") as f:
+        f.write("\n".join(json.dumps(e) for e in evs[10:20]))
+    with zipfile.ZipFile(src / "c.zip", "w") as zf:
+        zf.writestr("c.json", json.dumps({"results": evs[20:]}))
+    return src
+
+
+@pytest.fixture(autouse=True)
+def _offline(monkeypatch: pytest.MonkeyPatch):
+    # The Python engine would ask RxNorm about "Mystery"; the SQL engine never does
+    monkeypatch.setattr(
+        normalize_drug, "_normalize_via_rxnorm", lambda name: (None, "unmapped")
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{}, {"limit": 11}, {"since": "2024-03-01", "until": "2024-09-30"}]
+)
+def test_openfda_engines_agree(tmp_path: Path, kwargs: dict):
+    src = _openfda_inputs(tmp_path)
+    py = _connect(tmp_path / "py.duckdb")
+    sql = _connect(tmp_path / "sql.duckdb")
+    # Files are visited in the same order by both engines
+    ingest_openfda(py, input=src, **kwargs)
+    total = ingest_openfda_sql(sql, input=src, **kwargs)
+    assert _snapshot(py) == _snapshot(sql)
+    assert total > 0
+
+
+def _qfiles_zip(path: Path) -> Path:
+    demo = "PRIMARYID|FDA_DT\n1|20240101\n2|2024/02/01\n3|20240301\n1|20240405\n4|\n"
+    drug = (
+        "primaryid|drugname|role_cod\n1|ASPIRIN|PS\n1|METFORMIN|C\n2|IBUPROFEN|SS\n"
+        "3|ASPIRIN|I\n3||PS\n4|X|OTHER\n9|ORPHAN|PS\n"
+    )
+    reac = "PRIMARYID\tPT\n1\tNAUSEA\n2\tHEADACHE\n3\tNAUSEA\n4\tRASH\n"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("DEMO24Q1.txt", demo)
+        zf.writestr("DRUG24Q1.txt", drug)
+        zf.writestr("REAC24Q1.txt", reac)
+    return path
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"limit": 2}, {"since": "2024-02-01"}])
+def test_qfiles_engines_agree(tmp_path: Path, kwargs: dict):
+    src = _qfiles_zip(tmp_path / "q.zip")
+    py = _connect(tmp_path / "py.duckdb")
+    sql = _connect(tmp_path / "sql.duckdb")
+    ingest_qfiles(py, input=src, **kwargs)
+    ingest_qfiles_sql(sql, input=src, **kwargs)
+    assert _snapshot(py) == _snapshot(sql)
+
+
+def test_sql_engine_keeps_cube_current(tmp_path: Path):
+    src = _openfda_inputs(tmp_path)
+    con = _connect(tmp_path / "c.duckdb")
+    ingest_openfda_sql(con, input=src, limit=10)
+    cube.ensure(con)
+    ingest_openfda_sql(con, input=src)
+    got = con.execute(cube.abcd_select("suspect") + " ORDER BY drug, pt").fetchall()
+    cube.rebuild(con)
+    assert con.execute(cube.abcd_select("suspect") + " ORDER BY drug, pt").fetchall() == got
+
+
+def test_gzip_size_counted_when_trailer_may_wrap(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    path = tmp_path / "a.json.gz"
+    data = b'{"results": []}' * 1000
+    with gzip.open(path, "wb") as f:
+        f.write(data)
+    assert ingest_duckdb._uncompressed_size(str(path)) == len(data)  # ISIZE
+    monkeypatch.setattr(ingest_duckdb, "_ISIZE_EXACT_BELOW", 0)
+    assert ingest_duckdb._uncompressed_size(str(path)) == len(data)  # counted
+
+
+def test_workers_rejected_with_sql_engine(tmp_path: Path):
+    result = CliRunner().invoke(
+        cli.app,
+        ["etl", "--engine", "duckdb", "--workers", "4", "--db", str(tmp_path / "x.duckdb"),
+         "--input", str(tmp_path)],
+    )
+    assert result.exit_code == 2
+    assert not (tmp_path / "x.duckdb").exists()
@@ -0,0 +1,63 @@
+"""Multi-process openFDA ingest must match the sequential path."""
+import json
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal.ingest_openfda import ingest_openfda
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _event(i: int) -> dict:
+    name = f"drug{i % 4}"
+    return {
+        "safetyreportid": f"r{i % 40}",
+        "receivedate": f"2024{i % 12 + 1:02d}01",
+        "patient": {
+            "drug": [
+                {
+                    "medicinalproduct": name,
+                    "drugcharacterization": 1,
+                    "openfda": {"substance_name": [name]},
+                }
+            ],
+            "reaction": [{"reactionmeddrapt": f"pt{i % 5}"}],
+        },
+    }
+
+
+def _write_inputs(root: Path) -> Path:
+    src = root / "in"
+    src.mkdir()
+    for f in range(6):
+        events = [_event(f * 10 + k) for k in range(10)]
+        if f % 2:
+            (src / f"part{f}.json").write_text(json.dumps({"results": events}))
+        else:
+            (src / f"part{f}.jsonl").write_text("\n".join(json.dumps(e) for e in events))
+    return src
+
+
+def _ingest(root: Path, name: str, **kwargs) -> tuple:
+    con = duckdb.connect(str(root / name))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    ingest_openfda(con, input=root / "in", **kwargs)
+    return (
+        con.execute("SELECT safetyreportid, receivedate FROM reports ORDER BY 1").fetchall(),
+        con.execute("SELECT safetyreportid, drug_name, role FROM drugs ORDER BY 1").fetchall(),
+        con.execute("SELECT safetyreportid, meddra_pt FROM reactions ORDER BY 1").fetchall(),
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{}, {"limit": 23}, {"since": "2024-03-01", "until": "2024-08-31", "limit": 12}],
+)
+def test_workers_match_sequential(tmp_path: Path, kwargs: dict):
+    _write_inputs(tmp_path)
+    seq = _ingest(tmp_path, "seq.duckdb", **kwargs)
+    par = _ingest(tmp_path, "par.duckdb", workers=2, **kwargs)
+    assert seq == par
+    assert seq[0]
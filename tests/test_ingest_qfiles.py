@@ -46,3 +46,36 @@ def test_qfiles_zip_ingest_and_abcd(tmp_path: Path):
     df2 = con.execute(sql).fetch_df()
     row2 = df2[(df2["drug"].str.lower() == "aspirin") & (df2["pt"].str.lower() == "nausea")]
     assert int(row2.iloc[0].A) == 1
+
+
+def test_qfiles_chunked_matches_single_chunk(tmp_path: Path):
+    src = tmp_path / "in"
+    src.mkdir()
+    demo = ["PRIMARYID|FDA_DT"] + [f"{i % 9}|202401{i % 28 + 1:02d}" for i in range(25)]
+    drug = ["PRIMARYID|DRUGNAME|ROLE_COD"] + [
+        f"{i % 11}|DRUG{i % 4}|{('PS', 'SS', 'C', 'I', '')[i % 5]}" for i in range(40)
+    ]
+    reac = ["PRIMARYID|PT"] + [f"{i % 10}|PT{i % 3}" for i in range(30)]
+    (src / "DEMO.txt").write_text("\n".join(demo) + "\n")
+    (src / "DRUG.txt").write_text("\n".join(drug) + "\n")
+    (src / "REAC.txt").write_text("\n".join(reac) + "\n")
+    schema_sql = (Path(__file__).parents[1] / "src" / "faers_signal" / "schema.sql").read_text(encoding="utf-8")
+
+    snapshots = []
+    for name, chunk_rows in (("one.duckdb", 1000), ("many.duckdb", 3)):
+        con = duckdb.connect(str(tmp_path / name))
+        con.execute(schema_sql)
+        ingest_qfiles(con, input=src, since="2024-01-05", limit=6, chunk_rows=chunk_rows)
+        snapshots.append(
+            (
+                con.execute("SELECT * FROM reports ORDER BY ALL").fetchall(),
+                con.execute(
+                    "SELECT safetyreportid, drug_name, role FROM drugs ORDER BY ALL"
+                ).fetchall(),
+                con.execute(
+                    "SELECT safetyreportid, meddra_pt FROM reactions ORDER BY ALL"
+                ).fetchall(),
+            )
+        )
+    assert snapshots[0] == snapshots[1]
+    assert len(snapshots[0][0]) == 6
@@ -0,0 +1,122 @@
+"""Incremental openFDA JSON reader."""
+import gzip
+import io
+import json
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from faers_signal import json_stream
+from faers_signal.ingest_openfda import _open_source, _pending_sources
+
+
+def _events(n: int) -> list[dict]:
+    return [
+        {
+            "safetyreportid": f"r{i}",
+            "receivedate": "20240101",
+            "patient": {"reaction": [{"reactionmeddrapt": "nausea " * (i % 5)}]},
+        }
+        for i in range(n)
+    ]
+
+
+def _read(data: bytes) -> list[dict]:
+    return list(json_stream.iter_events(io.BytesIO(data)))
+
+
+@pytest.mark.parametrize(
+    "layout",
+    ["envelope", "array", "ndjson", "ndjson_envelopes", "bom"],
+)
+def test_layouts(layout: str):
+    evs = _events(5)
+    if layout == "envelope":
+        data = json.dumps({"meta": {"results": {"total": 5}}, "results": evs}).encode()
+    elif layout == "array":
+        data = json.dumps(evs).encode()
+    elif layout == "ndjson":
+        data = "\n".join(json.dumps(e) for e in evs).encode()
+    elif layout == "ndjson_envelopes":
+        data = (
+            json.dumps({"results": evs[:2]}) + "\n" + json.dumps({"results": evs[2:]})
+        ).encode()
+    else:
+        data = b"\xef\xbb\xbf" + json.dumps({"results": evs}).encode()
+    assert _read(data) == evs
+
+
+def test_single_object_and_broken_ndjson_line():
+    ev = {"safetyreportid": "x", "results": "not-a-list"}
+    assert _read(json.dumps(ev).encode()) == [ev]
+
+    data = b'{"safetyreportid": "a"}\n{"safetyreportid": tru\n{"safetyreportid": "b"}\n'
+    assert [e["safetyreportid"] for e in _read(data)] == ["a", "b"]
+
+
+def test_values_spanning_chunk_boundaries(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(json_stream, "_CHUNK_CHARS", 7)
+    evs = _events(30)
+    evs[3]["n"] = 123456789012345
+    data = json.dumps({"results": evs, "meta": {"n": 9876543210}}).encode()
+    assert _read(data) == evs
+
+
+def test_number_split_at_every_boundary(monkeypatch: pytest.MonkeyPatch):
+    data = b'{"safetyreportid": "a", "n": 2.5, "e": -1.25e+10}\n{"safetyreportid": "b", "m": 30}\n'
+    want = [
+        {"safetyreportid": "a", "n": 2.5, "e": -1.25e10},
+        {"safetyreportid": "b", "m": 30},
+    ]
+    for size in range(1, len(data) + 1):
+        monkeypatch.setattr(json_stream, "_CHUNK_CHARS", size)
+        assert _read(data) == want, size
+
+
+def test_invalid_utf8_raises():
+    with pytest.raises(ValueError):
+        _read(b'{"results": [{"a": "\xff\xfe"}]}')
+
+
+def test_memory_stays_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(json_stream, "_CHUNK_CHARS", 1 << 16)
+    path = tmp_path / "big.json.gz"
+    n = 20_000
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('{"meta": {}, "results": [')
+        for i, ev in enumerate(_events(n)):
+            if i:
+                f.write(",")
+            f.write(json.dumps(ev))
+        f.write("]}")
+    uncompressed = sum(len(json.dumps(e)) for e in _events(n))
+
+    tracemalloc.start()
+    count = 0
+    for src in _pending_sources(path, None):
+        with _open_source(*src) as stream:
+            for _ in json_stream.iter_events(stream):
+                count += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert count == n
+    assert uncompressed > 2_000_000
+    assert peak < uncompressed / 4
+
+
+def test_gz_member_inside_zip(tmp_path: Path):
+    evs = _events(3)
+    path = tmp_path / "dump.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("a.json.gz", gzip.compress(json.dumps({"results": evs}).encode()))
+        # Claims to be gzip but is plain JSON: read as-is
+        zf.writestr("b.json.gz", json.dumps({"results": evs}).encode())
+        zf.writestr("readme.txt", b"ignored")
+    got = []
+    for _, member in _pending_sources(path, None):
+        with _open_source(path, member) as stream:
+            got.append((member, list(json_stream.iter_events(stream))))
+    assert got == [("a.json.gz", evs), ("b.json.gz", evs)]
@@ -0,0 +1,186 @@
+"""Incremental ingest: unchanged inputs are skipped, changed ones replace their reports."""
+import json
+import os
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import cube, generation
+from faers_signal.ingest_openfda import ingest_openfda
+from faers_signal.ingest_qfiles import ingest_qfiles
+from faers_signal.ledger import Ledger, source_key
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _event(sid: str, drug: str = "aspirin", pt: str = "nausea") -> dict:
+    return {
+        "safetyreportid": sid,
+        "receivedate": "20240101",
+        "patient": {
+            "drug": [
+                {
+                    "medicinalproduct": drug,
+                    "drugcharacterization": 1,
+                    "openfda": {"substance_name": [drug]},
+                }
+            ],
+            "reaction": [{"reactionmeddrapt": pt}],
+        },
+    }
+
+
+def _write(path: Path, events: list[dict]) -> None:
+    path.write_text("\n".join(json.dumps(e) for e in events))
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    c = duckdb.connect(str(tmp_path / "ledger.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return c
+
+
+def _ids(con) -> list[str]:
+    return [s for (s,) in con.execute("SELECT safetyreportid FROM reports ORDER BY 1").fetchall()]
+
+
+def _cube_matches_rebuild(con) -> bool:
+    tables = ("cube_drug", "cube_pt", "cube_pair", "cube_total")
+    before = [sorted(con.execute(f"SELECT * FROM {t}").fetchall()) for t in tables]
+    cube.rebuild(con)
+    return before == [sorted(con.execute(f"SELECT * FROM {t}").fetchall()) for t in tables]
+
+
+def test_openfda_sources_skipped_or_replaced(con, tmp_path: Path, capsys):
+    src = tmp_path / "in"
+    src.mkdir()
+    _write(src / "a.jsonl", [_event("a1"), _event("a2")])
+    _write(src / "b.jsonl", [_event("b1"), _event("b2", "ibuprofen")])
+    ingest_openfda(con, input=src)
+    cube.ensure(con)
+    assert _ids(con) == ["a1", "a2", "b1", "b2"]
+    assert con.execute("SELECT COUNT(*) FROM ingest_ledger").fetchone()[0] == 2
+
+    capsys.readouterr()
+    ingest_openfda(con, input=src)
+    assert "Ingested 0 reports" in capsys.readouterr().out
+
+    # Touched but identical content is still skipped
+    os.utime(src / "a.jsonl", (1e9, 1e9))
+    ingest_openfda(con, input=src)
+    assert "Ingested 0 reports" in capsys.readouterr().out
+
+    # b2 disappears from b's new version, b1 changes, b3 is new
+    _write(src / "b.jsonl", [_event("b1", pt="rash"), _event("b3")])
+    ingest_openfda(con, input=src)
+    out = capsys.readouterr().out
+    assert "Ingested 2 reports" in out and "1 unchanged sources skipped" in out
+    assert _ids(con) == ["a1", "a2", "b1", "b3"]
+    assert con.execute(
+        "SELECT meddra_pt FROM reactions WHERE safetyreportid = 'b1'"
+    ).fetchall() == [("rash",)]
+    assert con.execute("SELECT COUNT(*) FROM drugs WHERE safetyreportid = 'b2'").fetchone()[0] == 0
+    assert _cube_matches_rebuild(con)
+
+
+def test_report_claimed_by_another_source_is_kept(con, tmp_path: Path):
+    src = tmp_path / "in"
+    src.mkdir()
+    _write(src / "a.jsonl", [_event("x")])
+    _write(src / "b.jsonl", [_event("x"), _event("y")])
+    ingest_openfda(con, input=src, workers=2)
+    _write(src / "b.jsonl", [_event("y"), _event("z")])
+    ingest_openfda(con, input=src, workers=2)
+    assert _ids(con) == ["x", "y", "z"]
+
+
+class _FailingReportDelete:
+    """A connection whose ``DELETE FROM reports`` fails, as on a full disk."""
+
+    def __init__(self, con: duckdb.DuckDBPyConnection) -> None:
+        self._con = con
+
+    def __getattr__(self, name: str):
+        return getattr(self._con, name)
+
+    def execute(self, sql: str, *args):
+        if sql.startswith("DELETE FROM reports"):
+            raise duckdb.IOException("disk full")
+        return self._con.execute(sql, *args)
+
+
+def test_failed_stale_delete_is_retried(con, tmp_path: Path):
+    src = tmp_path / "a.jsonl"
+    _write(src, [_event("a1"), _event("a2")])
+    ingest_openfda(con, input=src)
+    cube.ensure(con)
+
+    _write(src, [_event("a1")])
+    with pytest.raises(duckdb.IOException):
+        Ledger(_FailingReportDelete(con), "openfda").record(source_key(src), [(src, None)], ["a1"])
+    assert _ids(con) == ["a1", "a2"]
+    assert con.execute("SELECT * FROM ingest_ledger_pending").fetchall() == [("a2",)]
+
+    # The next ledger finishes the delete as a new data generation
+    before = generation.fingerprint(con)
+    Ledger(con, "openfda")
+    assert generation.fingerprint(con) != before
+    assert _ids(con) == ["a1"]
+    assert con.execute("SELECT COUNT(*) FROM ingest_ledger_pending").fetchone()[0] == 0
+    assert _cube_matches_rebuild(con)
+
+
+def _quarter(root: Path, tag: str, ids: list[int]) -> None:
+    (root / f"DEMO{tag}.txt").write_text(
+        "PRIMARYID|FDA_DT\n" + "".join(f"{i}|20240101\n" for i in ids)
+    )
+    (root / f"DRUG{tag}.txt").write_text(
+        "PRIMARYID|DRUGNAME|ROLE_COD\n" + "".join(f"{i}|ASPIRIN|PS\n" for i in ids)
+    )
+    (root / f"REAC{tag}.txt").write_text(
+        "PRIMARYID|PT\n" + "".join(f"{i}|NAUSEA\n" for i in ids)
+    )
+
+
+def test_qfiles_quarters_skipped_or_replaced(con, tmp_path: Path, capsys):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [1, 2])
+    _quarter(src, "24Q2", [3, 4])
+    ingest_qfiles(con, input=src)
+    cube.ensure(con)
+    assert con.execute("SELECT COUNT(*) FROM ingest_ledger").fetchone()[0] == 2
+
+    capsys.readouterr()
+    ingest_qfiles(con, input=src)
+    assert "Ingested 0 reports" in capsys.readouterr().out
+
+    _quarter(src, "24Q2", [3, 5])
+    ingest_qfiles(con, input=src)
+    assert "1 unchanged quarters skipped" in capsys.readouterr().out
+    assert _ids(con) == ["1", "2", "3", "5"]
+    assert _cube_matches_rebuild(con)
+
+    # --full reprocesses everything
+    ingest_qfiles(con, input=src, incremental=False)
+    assert "Ingested 4 reports" in capsys.readouterr().out
+
+
+def test_incomplete_quarter_is_not_loaded(con, tmp_path: Path, capsys):
+    src = tmp_path / "q"
+    src.mkdir()
+    _quarter(src, "24Q1", [1, 2])
+    _quarter(src, "24Q2", [3])
+    (src / "DRUG24Q2.txt").rename(src / "drug24q2.txt")  # still the same quarter
+    _quarter(src, "24Q3", [1, 4])
+    (src / "REAC24Q3.txt").unlink()
+    ingest_qfiles(con, input=src)
+    err = capsys.readouterr().err
+    assert "Skipping quarter" in err and "24Q3" in err and "no REAC file" in err
+    # 24Q3 neither replaced report 1 (its reactions survive) nor added 4
+    assert _ids(con) == ["1", "2", "3"]
+    assert con.execute("SELECT COUNT(*) FROM reactions").fetchone()[0] == 3
+    assert con.execute("SELECT COUNT(*) FROM drugs").fetchone()[0] == 3
+    assert con.execute("SELECT COUNT(*) FROM ingest_ledger").fetchone()[0] == 2
@@ -0,0 +1,69 @@
+"""SQL push-down metrics must agree with the NumPy engine."""
+from pathlib import Path
+
+import duckdb
+import numpy as np
+import pytest
+
+from faers_signal.metrics import compute_metrics_frame
+from faers_signal.metrics_sql import metrics_script
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _seed_random(con: duckdb.DuckDBPyConnection, seed: int = 1, n_reports: int = 400) -> None:
+    rng = np.random.default_rng(seed)
+    drugs = [f"drug{i}" for i in range(12)]
+    pts = [f"pt{i}" for i in range(15)]
+    reports, drug_rows, reac_rows = [], [], []
+    for i in range(n_reports):
+        sid = f"r{i}"
+        reports.append((sid, "2024-01-01", 1))
+        for d in rng.choice(drugs, size=rng.integers(1, 4), replace=False):
+            drug_rows.append((sid, str(d), int(rng.integers(1, 4))))
+        for p in rng.choice(pts, size=rng.integers(1, 4), replace=False):
+            reac_rows.append((sid, str(p)))
+    con.executemany(
+        "INSERT INTO reports (safetyreportid, receivedate, primarysource_qualifier) "
+        "VALUES (?, ?, ?)",
+        reports,
+    )
+    con.executemany(
+        "INSERT INTO drugs (safetyreportid, drug_name, role) VALUES (?, ?, ?)", drug_rows
+    )
+    con.executemany(
+        "INSERT INTO reactions (safetyreportid, meddra_pt) VALUES (?, ?)", reac_rows
+    )
+
+
+@pytest.mark.parametrize("mode", ["sensitive", "balanced", "specific"])
+def test_sql_metrics_match_numpy(tmp_path: Path, mode: str):
+    con = duckdb.connect(str(tmp_path / "m.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    _seed_random(con)
+    abcd_sql = (_SRC / "abcd.sql").read_text(encoding="utf-8")
+
+    setup, query = metrics_script(con, abcd_sql, min_a=2, mode=mode)
+    for stmt in setup:
+        con.execute(stmt)
+    sdf = con.execute(query + " ORDER BY drug, pt").fetch_df()
+
+    adf = con.execute(abcd_sql).fetch_df()
+    adf = adf[adf["A"] >= 2].sort_values(["drug", "pt"]).reset_index(drop=True)
+    ref = compute_metrics_frame(
+        adf["A"], adf["B"], adf["C"], adf["D"], adf["total_reports"], min_a=2, mode=mode
+    )
+
+    assert len(sdf) == len(ref) > 0
+    for col in ["PRR", "Chi2_1df", "ROR", "ROR_CI_L", "ROR_CI_U", "IC", "IC_CI_L", "IC_CI_U"]:
+        got = sdf[col].to_numpy(dtype=float)
+        exp = ref[col].to_numpy(dtype=float)
+        assert np.allclose(got, exp, rtol=1e-12, equal_nan=True), col
+    for col in ["flag_evans", "flag_ror025", "flag_ic025", "Signal"]:
+        assert (sdf[col].to_numpy(dtype=bool) == ref[col].to_numpy(dtype=bool)).all(), col
+
+
+def test_sql_metrics_rejects_unknown_mode(tmp_path: Path):
+    con = duckdb.connect()
+    with pytest.raises(ValueError):
+        metrics_script(con, "SELECT 1", mode="loose")
@@ -0,0 +1,119 @@
+"""Ordering, backpressure and error handling of the staged thread pipeline."""
+import random
+import threading
+import time
+
+import pytest
+
+from faers_signal import bulk_load
+from faers_signal.pipeline import Stage, run_pipeline
+
+
+def _jitter(x: int) -> int:
+    time.sleep(random.random() / 500)
+    return x
+
+
+def test_items_reach_sink_in_source_order():
+    got = []
+    run_pipeline(
+        range(200),
+        [Stage(_jitter, workers=8), Stage(lambda x: x * 2, workers=3)],
+        got.append,
+    )
+    assert got == [2 * i for i in range(200)]
+
+
+def test_window_bounds_items_in_flight():
+    lock = threading.Lock()
+    produced = 0
+    consumed = 0
+    peak = 0
+
+    def source():
+        nonlocal produced, peak
+        for i in range(100):
+            with lock:
+                produced += 1
+                peak = max(peak, produced - consumed)
+            yield i
+
+    def slow_sink(_):
+        nonlocal consumed
+        time.sleep(0.002)
+        with lock:
+            consumed += 1
+
+    run_pipeline(source(), [Stage(_jitter, workers=4)], slow_sink, window=5)
+    assert consumed == 100
+    # The generator may have produced one item that waits for a ticket
+    assert peak <= 6
+
+
+def test_stage_error_raised_after_earlier_items():
+    got = []
+
+    def fail_at_7(x):
+        if x == 7:
+            raise KeyError(x)
+        return x
+
+    with pytest.raises(KeyError):
+        run_pipeline(range(50), [Stage(fail_at_7, workers=4)], got.append)
+    assert got == list(range(7))
+    assert not [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
+
+
+def test_source_error_propagates():
+    def source():
+        yield 1
+        raise OSError("disk")
+
+    got = []
+    with pytest.raises(OSError):
+        run_pipeline(source(), [Stage(_jitter)], got.append)
+    assert got == [1]
+
+
+def test_sink_can_stop_early():
+    pulled = []
+
+    def source():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    got = []
+
+    def sink(x):
+        got.append(x)
+        return x < 4
+
+    run_pipeline(source(), [Stage(_jitter, workers=2)], sink, window=4)
+    assert got == [0, 1, 2, 3, 4]
+    assert len(pulled) < 20
+
+
+def test_stages_overlap():
+    def io(x):
+        time.sleep(0.02)
+        return x
+
+    start = time.perf_counter()
+    run_pipeline(range(10), [Stage(io), Stage(io)], lambda x: time.sleep(0.02))
+    # Sequential would take 10 * 3 * 20ms
+    assert time.perf_counter() - start < 0.45
+
+
+def test_concat_renumbers_seq():
+    batches = []
+    for sids in (["a", "b"], ["a"]):
+        batch = bulk_load.ReportBatch()
+        for sid in sids:
+            seq = batch.add_report(sid, "2024-01-01", None)
+            batch.add_reaction(seq, f"pt-{sid}-{len(batches)}")
+        batches.append(batch.to_arrow())
+    reports, _, reactions = bulk_load.concat(batches)
+    assert reports["seq"].to_pylist() == [0, 1, 2]
+    assert reactions["seq"].to_pylist() == [0, 1, 2]
+    assert reactions["meddra_pt"].to_pylist()[2] == "pt-a-1"
@@ -0,0 +1,112 @@
+"""Bulk re-normalization of stored drug rows with cube maintenance."""
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import cube, normalize_drug, rxnorm_cache, rxnorm_local
+from faers_signal.renormalize import renormalize
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+@pytest.fixture
+def con(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(rxnorm_local, "_active", None)
+    monkeypatch.setattr(rxnorm_local, "_pinned", True)
+    monkeypatch.setattr(normalize_drug, "_rxnorm_cache", {})
+    monkeypatch.setattr(normalize_drug, "_rxnorm_failed", set())
+
+    def no_network(raw):
+        raise AssertionError(f"RxNav called for {raw!r}")
+
+    monkeypatch.setattr(normalize_drug, "_normalize_via_rxnorm", no_network)
+    c = duckdb.connect(str(tmp_path / "n.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    c.execute(
+        "INSERT INTO reports (safetyreportid, receivedate) VALUES "
+        "('r1', DATE '2024-01-01'), ('r2', DATE '2024-01-02'), ('r3', DATE '2024-01-03')"
+    )
+    c.execute(
+        "INSERT INTO drugs (safetyreportid, drug_name, drug_name_normalized, drug_norm_source, role) "
+        "VALUES ('r1', 'Tylenol', 'tylenol', 'unmapped', 1), "
+        "('r2', 'TYLENOL ', 'tylenol', 'unmapped', 1), "
+        "('r2', 'Aspirin', 'aspirin', 'openfda_harmonized', 2), "
+        "('r3', 'acetaminophen', 'acetaminophen', 'unmapped', 1), "
+        "('r3', 'Zyrtec', 'zyrtec', 'rxnorm_api', 1)"
+    )
+    c.execute(
+        "INSERT INTO reactions (safetyreportid, meddra_pt) VALUES "
+        "('r1', 'nausea'), ('r2', 'nausea'), ('r3', 'headache')"
+    )
+    cube.rebuild(c)
+    return c
+
+
+def _cube(con):
+    return sorted(con.execute(cube.abcd_select("suspect")).fetchall())
+
+
+def _rebuilt(con):
+    before = _cube(con)
+    cube.rebuild(con)
+    return before == _cube(con)
+
+
+def test_cache_improvement_is_applied_in_place(con):
+    rxnorm_cache.store(con, {"tylenol": ("acetaminophen", "rxnorm_api")})
+    st = renormalize(con, use_api=False)
+
+    assert st == {"names": 3, "rows": 2, "reports": 2}
+    rows = con.execute(
+        "SELECT safetyreportid, drug_name_normalized, drug_norm_source FROM drugs ORDER BY 1, 2"
+    ).fetchall()
+    assert rows == [
+        ("r1", "acetaminophen", "rxnorm_api"),
+        ("r2", "acetaminophen", "rxnorm_api"),
+        ("r2", "aspirin", "openfda_harmonized"),
+        ("r3", "acetaminophen", "unmapped"),
+        # No cached answer: the existing mapping is kept
+        ("r3", "zyrtec", "rxnorm_api"),
+    ]
+    # Incrementally maintained cube equals a full rebuild
+    assert _rebuilt(con)
+    pairs = {(d, p): a for d, p, a, *_ in _cube(con)}
+    assert pairs[("acetaminophen", "nausea")] == 2
+    assert ("tylenol", "nausea") not in pairs
+
+    # Nothing left to change
+    assert renormalize(con, use_api=False)["rows"] == 0
+
+
+def test_only_unmapped_and_overrides(con, tmp_path: Path):
+    rxnorm_cache.store(con, {"zyrtec": ("cetirizine", "rxnorm_api")})
+    overrides = tmp_path / "overrides.csv"
+    overrides.write_text("drug_name,normalized\nTylenol,Paracetamol\nASPIRIN,acetylsalicylic acid\n")
+
+    st = renormalize(con, only_unmapped=True, overrides=overrides, use_api=False)
+    rows = dict(
+        con.execute(
+            "SELECT drug_name || '@' || safetyreportid, drug_name_normalized || '/' || drug_norm_source "
+            "FROM drugs"
+        ).fetchall()
+    )
+    assert rows == {
+        "Tylenol@r1": "paracetamol/manual",
+        "TYLENOL @r2": "paracetamol/manual",
+        "Aspirin@r2": "aspirin/openfda_harmonized",  # not unmapped: untouched
+        "acetaminophen@r3": "acetaminophen/unmapped",
+        "Zyrtec@r3": "zyrtec/rxnorm_api",  # not unmapped: untouched
+    }
+    assert st["rows"] == 2
+    assert _rebuilt(con)
+
+    # A full pass re-resolves rxnorm_api rows and keeps manual ones
+    renormalize(con, use_api=False)
+    assert con.execute(
+        "SELECT drug_name_normalized, drug_norm_source FROM drugs WHERE drug_name = 'Zyrtec'"
+    ).fetchone() == ("cetirizine", "rxnorm_api")
+    assert con.execute(
+        "SELECT COUNT(*) FROM drugs WHERE drug_norm_source = 'manual'"
+    ).fetchone()[0] == 2
+    assert _rebuilt(con)
@@ -0,0 +1,143 @@
+"""Result cache: content-addressed keys, data generation, LRU eviction and stats."""
+import os
+from pathlib import Path
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from faers_signal import dedup, generation
+from faers_signal.analysis_spec import AnalysisSpec
+from faers_signal.ingest_openfda import _apply, _to_tables
+from faers_signal.result_cache import ResultCache, cache_key
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+
+def _db(path: Path) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(str(path))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return con
+
+
+def _event(sid: str) -> dict:
+    return {
+        "safetyreportid": sid,
+        "receivedate": "20240101",
+        "patient": {
+            "drug": [{"medicinalproduct": "aspirin", "drugcharacterization": 1}],
+            "reaction": [{"reactionmeddrapt": "nausea"}],
+        },
+    }
+
+
+def _rows(n: int) -> pa.Table:
+    return pa.table(
+        {
+            "drug": [f"d{i}" for i in range(n)],
+            "A": list(range(n)),
+            "Signal": [i % 2 == 0 for i in range(n)],
+        }
+    )
+
+
+def test_key_ignores_presentation_settings():
+    spec = AnalysisSpec(min_a=2)
+    same = AnalysisSpec(min_a=2, role_set=[1], ranking_criterion="a_desc", top_n=30)
+    assert cache_key(spec, "db:1") == cache_key(same, "db:1")
+    assert cache_key(spec, "db:1") != cache_key(spec, "db:2")
+    assert cache_key(spec, "db:1") != cache_key(AnalysisSpec(min_a=3), "db:1")
+    assert cache_key(spec, "db:1") != cache_key(AnalysisSpec(min_a=2, role_set=[1, 3]), "db:1")
+
+
+def test_writes_bump_the_generation(tmp_path: Path):
+    con = _db(tmp_path / "a.duckdb")
+    first = generation.fingerprint(con)
+    _apply(con, _to_tables([_event("r1")], since=None, until=None))
+    second = generation.fingerprint(con)
+    assert second != first
+    # Re-applying the schema keeps the ID and the counter
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    assert generation.fingerprint(con) == second
+    dedup.supersede(con, rule="caseversion")  # nothing superseded, nothing written
+    assert generation.fingerprint(con) == second
+    # Another database never shares a fingerprint
+    assert generation.fingerprint(_db(tmp_path / "b.duckdb")).split(":")[0] != first.split(":")[0]
+
+
+def test_hits_misses_and_persisted_stats(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache")
+    spec = AnalysisSpec()
+    assert cache.get(spec, "db:1") is None
+    path = cache.put(spec, "db:1", _rows(5))
+    assert cache.get(spec, "db:1") == path
+    assert pq.read_table(path).num_rows == 5
+    assert cache.info(path)["signals"] == 3
+    assert cache.get(spec, "db:2") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    st = ResultCache(tmp_path / "cache").stats()
+    assert (st["entries"], st["hits"], st["misses"]) == (1, 1, 2)
+    assert ResultCache(tmp_path / "cache").clear() == 1
+    assert cache.get(spec, "db:1") is None
+
+
+def test_lru_eviction(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache")
+    specs = [AnalysisSpec(min_a=i) for i in range(3)]
+    paths = [cache.put(s, "db:1", _rows(200)) for s in specs[:2]]
+    # Entry 0 is older, but a hit makes entry 1 the least recently used
+    os.utime(paths[0], (1, 1))
+    os.utime(paths[1], (2, 2))
+    assert cache.get(specs[0], "db:1") is not None
+    cache.max_bytes = paths[0].stat().st_size * 2
+    cache.put(specs[2], "db:1", _rows(200))
+    assert cache.get(specs[1], "db:1") is None
+    assert cache.get(specs[0], "db:1") and cache.get(specs[2], "db:1")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_result_larger_than_the_cache_is_not_cached(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache")
+    kept = cache.put(AnalysisSpec(min_a=1), "db:1", _rows(5))
+    cache.max_bytes = kept.stat().st_size * 2
+    assert cache.put(AnalysisSpec(min_a=2), "db:1", _rows(5000)) is None
+    # Nothing was evicted to make room, and no partial file is left
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == sorted(
+        [kept.name, kept.with_suffix(".json").name]
+    )
+    assert cache.stats()["evictions"] == 0
+
+
+def test_discarded_writer_leaves_nothing(tmp_path: Path):
+    cache = ResultCache(tmp_path / "cache")
+    sink = cache.writer(AnalysisSpec(), "db:1")
+    sink.write(_rows(3))
+    cache.discard(sink)
+    assert list((tmp_path / "cache").iterdir()) == []
+    with pytest.raises(ValueError):
+        ResultCache(tmp_path, max_bytes=-1)
+
+
+def test_unknown_engine_is_rejected_before_a_cache_hit(tmp_path: Path):
+    from typer.testing import CliRunner
+
+    from faers_signal import cli
+
+    db = tmp_path / "c.duckdb"
+    con = _db(db)
+    _apply(con, _to_tables([_event("r1"), _event("r2")], since=None, until=None))
+    con.close()
+    args = ["build", "--db", str(db), "--min-a", "1", "--cache"]
+    runner = CliRunner()
+    assert runner.invoke(cli.app, args + ["--out", str(tmp_path / "a.parquet")]).exit_code == 0
+
+    result = runner.invoke(
+        cli.app, args + ["--out", str(tmp_path / "b.parquet"), "--engine", "spark"]
+    )
+    assert result.exit_code == 2
+    assert "Unknown engine" in result.output
+    # Rejected before the lookup: no hit is reported or counted
+    assert "Result cache hit" not in result.output
+    assert not (tmp_path / "b.parquet").exists()
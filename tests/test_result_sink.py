@@ -0,0 +1,46 @@
+"""Streaming Arrow output: row groups, compression and row counts."""
+from pathlib import Path
+
+import duckdb
+import pyarrow.parquet as pq
+import pytest
+
+from faers_signal import result_sink
+from faers_signal.result_sink import ResultSink, stream_query
+
+
+def test_stream_query_counts_and_buffers_row_groups(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(result_sink, "BATCH_ROWS", 100)
+    out = tmp_path / "out.parquet"
+    seen = []
+    con = duckdb.connect()
+    with ResultSink(out, row_group_size=250, compression="zstd") as sink:
+        n = stream_query(
+            con,
+            "SELECT i, i % 7 AS k FROM range($n) t(i)",
+            {"n": 1000},
+            sink,
+            on_batch=lambda b: seen.append(b.num_rows),
+        )
+    assert n == sink.rows == sum(seen) == 1000
+    meta = pq.ParquetFile(out).metadata
+    assert meta.num_rows == 1000
+    assert [meta.row_group(i).num_rows for i in range(meta.num_row_groups)] == [250] * 4
+    assert meta.row_group(0).column(0).compression == "ZSTD"
+
+
+def test_stream_query_empty_result_keeps_schema(tmp_path: Path):
+    out = tmp_path / "empty.parquet"
+    with ResultSink(out) as sink:
+        assert stream_query(duckdb.connect(), "SELECT 1 AS a, 'x' AS s WHERE false", None, sink) == 0
+    table = pq.read_table(out)
+    assert table.num_rows == 0 and table.column_names == ["a", "s"]
+
+
+def test_invalid_options(tmp_path: Path):
+    with pytest.raises(ValueError):
+        ResultSink(tmp_path / "out.csv", compression="zstd")
+    with pytest.raises(ValueError):
+        ResultSink(tmp_path / "out.parquet", compression="bogus")
+    with pytest.raises(ValueError):
+        ResultSink(tmp_path / "out.parquet", row_group_size=0)
@@ -0,0 +1,113 @@
+"""Persistent RxNorm cache: reuse across runs, TTL, LRU eviction, export/preload."""
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import normalize_drug, rxnorm_cache
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+_ANSWERS = {"zyrtec": "cetirizine", "tylenol": "acetaminophen"}
+
+
+@pytest.fixture
+def fake_rxnav(monkeypatch: pytest.MonkeyPatch):
+    calls: list[str] = []
+
+    def lookup(raw: str):
+        key = raw.lower().strip()
+        calls.append(key)
+        if key == "offline":
+            normalize_drug._rxnorm_failed.add(key)
+            return (None, "unmapped")
+        return (_ANSWERS[key], "rxnorm_api") if key in _ANSWERS else (None, "unmapped")
+
+    monkeypatch.setattr(normalize_drug, "_normalize_via_rxnorm", lookup)
+    monkeypatch.setattr(normalize_drug, "_rxnorm_cache", {})
+    monkeypatch.setattr(normalize_drug, "_rxnorm_failed", set())
+    monkeypatch.setattr(rxnorm_cache, "policy", rxnorm_cache.CachePolicy())
+    return calls
+
+
+def _connect(tmp_path: Path) -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(str(tmp_path / "c.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    return con
+
+
+def _new_process():
+    normalize_drug._rxnorm_cache.clear()
+    normalize_drug._rxnorm_failed.clear()
+
+
+def test_results_survive_across_runs(tmp_path: Path, fake_rxnav):
+    con = _connect(tmp_path)
+    names = ["Zyrtec", "TYLENOL", "mystery", "offline"]
+    first = normalize_drug.resolve_rxnorm(names, con=con)
+    assert first["zyrtec"] == ("cetirizine", "rxnorm_api")
+    assert len(fake_rxnav) == 4
+
+    _new_process()
+    second = normalize_drug.resolve_rxnorm(names, con=con)
+    assert second == first
+    # Positive and negative answers come from the table; the failed lookup is retried
+    assert fake_rxnav[4:] == ["offline"]
+    assert rxnorm_cache.stats(con) == {
+        "entries": 3, "positive": 2, "negative": 1, "expired": 0
+    }
+
+
+def test_expired_entries_are_refetched(tmp_path: Path, fake_rxnav):
+    con = _connect(tmp_path)
+    normalize_drug.resolve_rxnorm(["zyrtec", "tylenol"], con=con)
+    con.execute(
+        "UPDATE rxnorm_cache SET fetched_at = now()::TIMESTAMP - INTERVAL 10 DAY "
+        "WHERE name_key = 'zyrtec'"
+    )
+    rxnorm_cache.configure(ttl_days=7)
+    assert rxnorm_cache.stats(con)["expired"] == 1
+
+    _new_process()
+    normalize_drug.resolve_rxnorm(["zyrtec", "tylenol"], con=con)
+    assert fake_rxnav[2:] == ["zyrtec"]
+    assert rxnorm_cache.stats(con)["expired"] == 0
+
+
+def test_lru_eviction(tmp_path: Path, fake_rxnav):
+    con = _connect(tmp_path)
+    rxnorm_cache.configure(max_entries=3)
+    for i, name in enumerate(["a", "b", "c"]):
+        normalize_drug.resolve_rxnorm([name], con=con)
+        con.execute(
+            f"UPDATE rxnorm_cache SET last_used = TIMESTAMP '2024-01-0{i + 1}' "
+            f"WHERE name_key = '{name}'"
+        )
+    _new_process()
+    normalize_drug.resolve_rxnorm(["a"], con=con)  # touch "a"
+    normalize_drug.resolve_rxnorm(["d"], con=con)  # evicts the least recently used ("b")
+    keys = [k for (k,) in con.execute("SELECT name_key FROM rxnorm_cache ORDER BY 1").fetchall()]
+    assert keys == ["a", "c", "d"]
+
+
+def test_export_and_preload(tmp_path: Path, fake_rxnav):
+    con = _connect(tmp_path)
+    normalize_drug.resolve_rxnorm(["zyrtec", "mystery"], con=con)
+    out = tmp_path / "o'brien" / "cache.parquet"  # quote in the COPY target
+    assert rxnorm_cache.export(con, out) == 2
+
+    other = duckdb.connect(str(tmp_path / "other.duckdb"))
+    other.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    assert rxnorm_cache.preload(other, out) == 2
+
+    manual = tmp_path / "manual.csv"
+    manual.write_text("name_key,normalized\n  Advil ,IBUPROFEN\n")
+    assert rxnorm_cache.preload(other, manual) == 1
+
+    _new_process()
+    got = normalize_drug.resolve_rxnorm(["zyrtec", "mystery", "advil"], con=other)
+    assert got == {
+        "zyrtec": ("cetirizine", "rxnorm_api"),
+        "mystery": (None, "unmapped"),
+        "advil": ("ibuprofen", "rxnorm_api"),
+    }
+    assert len(fake_rxnav) == 2  # only the first connection ever asked RxNav
@@ -0,0 +1,165 @@
+"""Offline RxNorm: RRF import, ingredient resolution and the in-memory index."""
+import zipfile
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import normalize_drug, rxnorm_local
+from faers_signal.ingest_openfda import _apply, _to_tables
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+# (rxcui, sab, tty, str)
+_CONSO = [
+    ("161", "RXNORM", "IN", "acetaminophen"),
+    ("1191", "RXNORM", "IN", "aspirin"),
+    ("1886", "RXNORM", "IN", "caffeine"),
+    ("5489", "RXNORM", "IN", "hydrocodone"),
+    ("6809", "RXNORM", "IN", "metformin"),
+    ("235743", "RXNORM", "PIN", "metformin hydrochloride"),
+    ("214182", "RXNORM", "MIN", "acetaminophen / hydrocodone"),
+    ("202433", "RXNORM", "BN", "Tylenol"),
+    ("217020", "RXNORM", "BN", "Excedrin"),
+    ("315266", "RXNORM", "SCDC", "acetaminophen 500 MG"),
+    ("315267", "RXNORM", "SCDC", "caffeine 65 MG"),
+    ("313782", "RXNORM", "SCD", "acetaminophen 500 MG Oral Tablet"),
+    ("900001", "RXNORM", "SCD", "acetaminophen 500 MG / caffeine 65 MG Oral Tablet"),
+    ("900002", "RXNORM", "SBD", "acetaminophen 500 MG / caffeine 65 MG Oral Tablet [Excedrin Tension]"),
+    ("209387", "RXNORM", "SBD", "acetaminophen 500 MG Oral Tablet [Tylenol]"),
+    ("209387", "MTHSPL", "DP", "TYLENOL EXTRA STRENGTH"),
+]
+# (rxcui1, rela, rxcui2) as listed in RXNREL; the inverse row is added too
+_REL = [
+    ("161", "tradename_of", "202433"),
+    ("161", "ingredient_of", "315266"),
+    ("1886", "ingredient_of", "315267"),
+    ("161", "part_of", "214182"),
+    ("5489", "part_of", "214182"),
+    ("6809", "form_of", "235743"),
+    ("161", "tradename_of", "217020"),
+    ("1191", "tradename_of", "217020"),
+    ("1886", "tradename_of", "217020"),
+    ("315266", "constitutes", "313782"),
+    ("315266", "constitutes", "900001"),
+    ("315267", "constitutes", "900001"),
+    ("900001", "tradename_of", "900002"),
+    ("217020", "ingredient_of", "900002"),
+    ("313782", "tradename_of", "209387"),
+    ("202433", "ingredient_of", "209387"),
+]
+_INVERSE = {
+    "tradename_of": "has_tradename",
+    "ingredient_of": "has_ingredient",
+    "part_of": "has_part",
+    "form_of": "has_form",
+    "constitutes": "consists_of",
+}
+
+
+def _write_release(path: Path) -> None:
+    conso = "".join(
+        f"{cui}|ENG|P|L1|PF|S1|Y|A{i}||||{sab}|{tty}|{cui}|{name}|0|N||\n"
+        for i, (cui, sab, tty, name) in enumerate(_CONSO)
+    )
+    rows = [(a, r, b) for a, r, b in _REL] + [(b, _INVERSE[r], a) for a, r, b in _REL]
+    rel = "".join(f"{a}||CUI|RO|{b}||CUI|{r}|R{i}||RXNORM||||N||\n" for i, (a, r, b) in enumerate(rows))
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("rrf/RXNCONSO.RRF", conso)
+        zf.writestr("rrf/RXNREL.RRF", rel)
+
+
+@pytest.fixture
+def con(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(rxnorm_local, "_active", None)
+    monkeypatch.setattr(rxnorm_local, "_pinned", False)
+    monkeypatch.setattr(rxnorm_local, "_loaded_from", None)
+    monkeypatch.setattr(normalize_drug, "_rxnorm_cache", {})
+
+    def no_network(raw):
+        raise AssertionError(f"RxNav called for {raw!r}")
+
+    monkeypatch.setattr(normalize_drug, "_normalize_via_rxnorm", no_network)
+    c = duckdb.connect(str(tmp_path / "rx.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    release = tmp_path / "RxNorm_full.zip"
+    _write_release(release)
+    counts = rxnorm_local.load_rrf(c, release)
+    assert counts["names"] == len(_CONSO)
+    return c
+
+
+def test_ingredient_resolution(con):
+    got = dict(con.execute("SELECT rxcui, ingredient FROM rxnorm_ingredient").fetchall())
+    assert got["202433"] == "acetaminophen"  # BN
+    assert got["235743"] == "metformin"  # PIN
+    assert got["214182"] == "acetaminophen / hydrocodone"  # MIN
+    assert got["209387"] == "acetaminophen"  # SBD
+    # Resolved through its SCD, not through the brand shared with aspirin products
+    assert got["900002"] == "acetaminophen / caffeine"
+    assert got["217020"] == "acetaminophen / aspirin / caffeine"
+
+
+def test_index_exact_token_and_approximate(con):
+    index = rxnorm_local.load_index(con)
+    assert index.lookup("TYLENOL") == "acetaminophen"
+    assert index.lookup("Tylenol Extra Strength") == "acetaminophen"  # other vocabulary
+    assert index.lookup("TYLENOL 500MG TABLETS") == "acetaminophen"  # token key
+    assert index.lookup("metformin hcl 850 mg") == "metformin"
+    assert index.lookup("ACETAMINOPHENE") == "acetaminophen"  # trigram
+    assert index.lookup("acetaminophen and hydrocodone") == "acetaminophen / hydrocodone"
+    assert index.lookup("xyzzy") is None
+    assert index.lookup("500 MG") is None
+
+
+def test_normalize_drug_name_uses_active_index(con):
+    assert rxnorm_local.ensure_loaded(con) is not None
+    assert normalize_drug.normalize_drug_name("Excedrin") == (
+        "acetaminophen / aspirin / caffeine", "rxnorm_local"
+    )
+    assert normalize_drug.normalize_drug_name("Mystery") == ("mystery", "unmapped")
+
+
+def test_index_follows_database_and_reloads(con, tmp_path: Path):
+    first = rxnorm_local.ensure_loaded(con)
+    assert first is not None and rxnorm_local.ensure_loaded(con) is first
+
+    # Another database without a lookup gets no index, then its own after a load
+    other = duckdb.connect(str(tmp_path / "other.duckdb"))
+    other.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    assert rxnorm_local.ensure_loaded(other) is None
+    rrf = tmp_path / "o'brien"
+    _write_release(tmp_path / "release.zip")
+    with zipfile.ZipFile(tmp_path / "release.zip") as zf:
+        zf.extractall(rrf)
+    rxnorm_local.load_rrf(other, rrf)  # quoted path, read from the directory
+    assert rxnorm_local.ensure_loaded(other) not in (None, first)
+
+    # A reload by another process (which does not reset this one's state) is picked up
+    before = rxnorm_local.ensure_loaded(con)
+    state = (rxnorm_local._active, rxnorm_local._loaded_from)
+    rxnorm_local.load_rrf(con, tmp_path / "release.zip")
+    rxnorm_local._active, rxnorm_local._loaded_from = state
+    assert rxnorm_local.ensure_loaded(con) is not before
+
+
+def test_ingest_resolves_offline(con):
+    event = {
+        "safetyreportid": "r1",
+        "receivedate": "20240101",
+        "patient": {
+            "drug": [
+                {"medicinalproduct": "TYLENOL 500MG", "drugcharacterization": 1},
+                {"medicinalproduct": "Unknown pill", "drugcharacterization": 2},
+            ],
+            "reaction": [{"reactionmeddrapt": "nausea"}],
+        },
+    }
+    _apply(con, _to_tables([event], since=None, until=None))
+    rows = con.execute(
+        "SELECT drug_name, drug_name_normalized, drug_norm_source FROM drugs ORDER BY 1"
+    ).fetchall()
+    assert rows == [
+        ("TYLENOL 500MG", "acetaminophen", "rxnorm_local"),
+        ("Unknown pill", "unknown pill", "unmapped"),
+    ]
@@ -0,0 +1,138 @@
+"""Batched RxNorm stage against a local stand-in for RxNav."""
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from faers_signal import normalize_drug
+from faers_signal.ingest_openfda import _apply, _to_tables
+from faers_signal.ratelimit import TokenBucket
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+
+# raw name -> ingredient; anything else has no candidate
+_INGREDIENTS = {"zyrtec": "cetirizine", "tylenol": "acetaminophen", "advil": "ibuprofen"}
+
+
+class _RxNav(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    calls: list = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):  # noqa: N802
+        cls = type(self)
+        with cls.lock:
+            cls.calls.append(self.path)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(0.05)
+            url = urllib.parse.urlparse(self.path)
+            if url.path.endswith("/approximateTerm.json"):
+                term = urllib.parse.parse_qs(url.query)["term"][0]
+                cands = [{"rxcui": term}] if term in _INGREDIENTS else []
+                body = {"approximateGroup": {"candidate": cands}}
+            else:  # /rxcui/<term>/related.json
+                term = url.path.split("/")[-2]
+                props = [{"name": _INGREDIENTS[term].upper()}]
+                body = {"relatedGroup": {"conceptGroup": [{"conceptProperties": props}]}}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def rxnav(monkeypatch: pytest.MonkeyPatch):
+    _RxNav.calls = []
+    _RxNav.in_flight = _RxNav.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RxNav)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(normalize_drug, "_RXNAV_BASE", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(normalize_drug, "_limiter", TokenBucket(1000))
+    monkeypatch.setattr(normalize_drug, "_rxnorm_cache", {})
+    monkeypatch.setattr(normalize_drug, "_rxnorm_failed", set())
+    yield _RxNav
+    server.shutdown()
+    server.server_close()
+
+
+def test_resolve_distinct_names_concurrently(rxnav):
+    names = ["Zyrtec", "zyrtec ", "TYLENOL", "advil", "unknown1", "unknown2"] * 3
+    got = normalize_drug.resolve_rxnorm(names, max_workers=4)
+
+    assert got == {
+        "zyrtec": ("cetirizine", "rxnorm_api"),
+        "tylenol": ("acetaminophen", "rxnorm_api"),
+        "advil": ("ibuprofen", "rxnorm_api"),
+        "unknown1": (None, "unmapped"),
+        "unknown2": (None, "unmapped"),
+    }
+    # One approximateTerm per distinct name, one related lookup per hit
+    assert sum("approximateTerm" in c for c in rxnav.calls) == 5
+    assert sum("related" in c for c in rxnav.calls) == 3
+    assert rxnav.max_in_flight > 1
+
+    # Cached: no further requests
+    normalize_drug.resolve_rxnorm(names)
+    assert len(rxnav.calls) == 8
+
+
+def test_rate_limit_is_respected(rxnav, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(normalize_drug, "_limiter", TokenBucket(20, burst=1))
+    start = time.monotonic()
+    normalize_drug.resolve_rxnorm([f"unknown{i}" for i in range(10)], max_workers=8)
+    # 10 requests at 20/s with no burst need at least 9 intervals of 50 ms
+    assert time.monotonic() - start >= 0.44
+
+
+def test_ingest_applies_rxnorm_in_bulk(rxnav, tmp_path: Path):
+    con = duckdb.connect(str(tmp_path / "r.duckdb"))
+    con.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+
+    def event(sid, names):
+        return {
+            "safetyreportid": sid,
+            "receivedate": "20240101",
+            "patient": {
+                "drug": [{"medicinalproduct": n, "drugcharacterization": 1} for n in names],
+                "reaction": [{"reactionmeddrapt": "nausea"}],
+            },
+        }
+
+    events = [
+        event("r1", ["ZYRTEC", "Mystery"]),
+        event("r2", ["zyrtec", "Tylenol"]),
+        event("r3", ["ZYRTEC"]),
+    ]
+    events[2]["patient"]["drug"][0]["openfda"] = {"substance_name": ["CETIRIZINE HCL"]}
+    _apply(con, _to_tables(events, since=None, until=None))
+
+    rows = con.execute(
+        "SELECT safetyreportid, drug_name, drug_name_normalized, drug_norm_source "
+        "FROM drugs ORDER BY 1, 2"
+    ).fetchall()
+    assert rows == [
+        ("r1", "Mystery", "mystery", "unmapped"),
+        ("r1", "ZYRTEC", "cetirizine", "rxnorm_api"),
+        ("r2", "Tylenol", "acetaminophen", "rxnorm_api"),
+        ("r2", "zyrtec", "cetirizine", "rxnorm_api"),
+        ("r3", "ZYRTEC", "cetirizine hcl", "openfda_harmonized"),
+    ]
+    # Harmonized names never reach RxNav; each unmapped name is asked once
+    assert sum("approximateTerm" in c for c in rxnav.calls) == 3
@@ -1,4 +1,8 @@
 """Tests for signal detection modes (sensitive / balanced / specific)."""
+import pytest
+from typer.testing import CliRunner
+
+from faers_signal import cli
 from faers_signal.metrics import ABCD, signal_flags, classify_signal
 
 
@@ -70,3 +74,26 @@ def test_min_a_gate():
     flags_1 = signal_flags(ab, min_a=1)
     assert flags_3["flag_evans"] is False  # A=2 < min_a=3
     # With min_a=1, Evans might fire if PRR/chi2 criteria are met
+
+
+@pytest.mark.parametrize("engine", ["python", "duckdb"])
+def test_unknown_mode_rejected_by_build(tmp_path, engine: str):
+    result = CliRunner().invoke(
+        cli.app,
+        ["build", "--db", str(tmp_path / "x.duckdb"), "--out", str(tmp_path / "m.parquet"),
+         "--engine", engine, "--signal-mode", "loose"],
+    )
+    assert result.exit_code == 2
+    assert not (tmp_path / "x.duckdb").exists()
+
+
+@pytest.mark.parametrize("roles", ["1,x", "0", "1,4"])
+def test_invalid_roles_rejected_by_build(tmp_path, roles: str):
+    result = CliRunner().invoke(
+        cli.app,
+        ["build", "--db", str(tmp_path / "x.duckdb"), "--out", str(tmp_path / "m.parquet"),
+         "--roles", roles],
+    )
+    assert result.exit_code == 2
+    assert "Invalid --roles" in result.output
+    assert not (tmp_path / "x.duckdb").exists()
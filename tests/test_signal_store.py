@@ -0,0 +1,118 @@
+"""Signal store: stored build results, freshness and SQL filtering/ranking."""
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pytest
+
+from faers_signal import signal_store
+from faers_signal.abcd_query import prepare_abcd
+from faers_signal.analysis_spec import AnalysisSpec
+from faers_signal.ingest_openfda import _apply, _to_tables
+from faers_signal.metrics_sql import metrics_select
+from faers_signal.result_sink import ResultSink, stream_query
+
+_SRC = Path(__file__).parents[1] / "src" / "faers_signal"
+_DRUGS = ["aspirin", "metformin", "ibuprofen", "warfarin", "statin"]
+_PTS = ["nausea", "headache", "rash", "bleeding", "dizziness"]
+
+
+def _events(start: int, n: int) -> list[dict]:
+    return [
+        {
+            "safetyreportid": f"r{i}",
+            "receivedate": "20240115",
+            "patient": {
+                "drug": [
+                    {
+                        "medicinalproduct": d,
+                        "drugcharacterization": 1,
+                        "openfda": {"substance_name": [d]},
+                    }
+                    for d in _DRUGS[i % 5 : i % 5 + 1 + i % 2]
+                ],
+                "reaction": [{"reactionmeddrapt": p} for p in _PTS[i % 3 : i % 3 + 1 + i % 2]],
+            },
+        }
+        for i in range(start, start + n)
+    ]
+
+
+@pytest.fixture
+def con(tmp_path: Path):
+    c = duckdb.connect(str(tmp_path / "store.duckdb"))
+    c.execute((_SRC / "schema.sql").read_text(encoding="utf-8"))
+    _apply(c, _to_tables(_events(0, 80), since=None, until=None))
+    return c
+
+
+def _metrics(con, spec: AnalysisSpec) -> tuple[str, dict]:
+    sql, params = prepare_abcd(con, spec)
+    return metrics_select(f"({sql})", min_a=spec.min_a, mode=spec.signal_mode), params
+
+
+def _store(con, spec: AnalysisSpec, out: Path) -> pd.DataFrame:
+    """Write *spec*'s metrics to *out* and the store in one pass, as `build --store` does."""
+    writer = signal_store.Writer(con, spec)
+    with ResultSink(out) as sink:
+        stream_query(con, *_metrics(con, spec), sink, on_batch=writer.write)
+    assert writer.commit() == sink.rows > 0
+    return pd.read_parquet(out)
+
+
+def _key(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(["drug", "pt"]).reset_index(drop=True)
+
+
+def test_stored_rows_match_the_build(con, tmp_path: Path):
+    spec = AnalysisSpec(min_a=1)
+    built = _store(con, spec, tmp_path / "m.parquet")
+    assert signal_store.is_fresh(con, spec)
+    assert not signal_store.is_fresh(con, AnalysisSpec(min_a=1, signal_mode="specific"))
+
+    sql, params = signal_store.select(spec)
+    stored = con.execute(sql, params).fetch_df()
+    pd.testing.assert_frame_equal(_key(stored), _key(built), check_dtype=False)
+    # Ranked by IC025, best first
+    ic025 = stored["IC_CI_L"].fillna(-999).tolist()
+    assert ic025 == sorted(ic025, reverse=True)
+
+    # A rebuild replaces the spec's rows instead of adding to them
+    _store(con, spec, tmp_path / "m2.parquet")
+    assert con.execute("SELECT COUNT(*) FROM signal_results").fetchone()[0] == len(built)
+
+
+def test_filters_and_top_items_in_sql(con, tmp_path: Path):
+    built = _store(con, AnalysisSpec(min_a=1), tmp_path / "m.parquet")
+    spec = AnalysisSpec(min_a=1, drug_filter="Met", pt_filter="n", ranking_criterion="a_desc")
+    sql, params = signal_store.select(spec, limit=2)
+    got = con.execute(sql, params).fetch_df()
+    expected = built[built["drug"].str.startswith("met") & built["pt"].str.startswith("n")]
+    assert got["A"].tolist() == sorted(expected["A"], reverse=True)[:2]
+
+    sql, params = signal_store.select(AnalysisSpec(min_a=1), signal_only=True)
+    assert len(con.execute(sql, params).fetch_df()) == int(built["Signal"].sum())
+
+    top = signal_store.top_items(con, AnalysisSpec(min_a=1, ranking_criterion="a_desc"), "pt", 2)
+    best = built.groupby("pt")["A"].max().sort_values(ascending=False)
+    assert [best[p] for p in top] == best.iloc[:2].tolist()
+    with pytest.raises(ValueError):
+        signal_store.top_items(con, AnalysisSpec(min_a=1), "A", 2)
+
+
+def test_new_data_makes_results_stale(con, tmp_path: Path):
+    spec = AnalysisSpec(min_a=1)
+    _store(con, spec, tmp_path / "m.parquet")
+    # Re-ingesting an existing report leaves every row count unchanged
+    _apply(con, _to_tables(_events(3, 1), since=None, until=None))
+    assert not signal_store.is_fresh(con, spec)
+
+    _store(con, spec, tmp_path / "m.parquet")
+    assert signal_store.is_fresh(con, spec)
+
+
+def test_only_full_results_are_stored(con):
+    with pytest.raises(ValueError):
+        signal_store.Writer(con, AnalysisSpec(drug_filter="asp"))
+    with pytest.raises(ValueError):
+        signal_store.Writer(con, AnalysisSpec(since="2024-01-01"))